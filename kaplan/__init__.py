@@ -2,16 +2,31 @@
 Here is a list of all of the functions and objects in kaplan
 This list is imported when the user writes "from kaplan import *"
 """
-from kaplan.energy import run_energy_calc, prep_psi4_geom, check_psi4_inputs
-from kaplan.fitg import sum_energies, sum_rmsds, all_pairs_gen, calc_fitness
-from kaplan.gac import run_kaplan
+from kaplan.cache import EnergyCache, EnergyStore, get_store_file
+from kaplan.checkpoint import save_checkpoint, load_checkpoint, get_checkpoint_file,\
+                              Checkpointer
+from kaplan.energy import run_energy_calc, prep_psi4_geom, check_psi4_inputs,\
+                          init_worker, make_pool, get_molecule, orbital_name,\
+                          orbital_path, prune_orbitals
+from kaplan.fitg import sum_energies, sum_rmsds, all_pairs_gen, calc_fitness,\
+                        calc_energies, calc_energy, submit_energies, calc_rmsds,\
+                        failed_to_penalty
+from kaplan.gac import run_kaplan, run_mevs, run_async_mevs, run_batch_mevs, record_phase,\
+                       finish_mev, make_seeds
 from kaplan.ga_input import read_ga_input, verify_ga_input
 from kaplan.geometry import GeometryError, generate_parser,\
-                            get_zmatrix_template, update_zmatrix, zmatrix_to_xyz
+                            get_zmatrix_template, update_zmatrix, zmatrix_to_xyz,\
+                            parse_zmatrix, zmatrix_to_coords, coords_to_xyz,\
+                            ZMatrixTemplate, coords_to_dihedrals, get_rotatable_bonds,\
+                            find_rotor_dihedrals, find_clashes
 from kaplan.mol_input import read_mol_input, verify_mol_input
 from kaplan.mutations import generate_children, mutate, swap
-from kaplan.output import run_output
-from kaplan.pmem import Pmem
+from kaplan.output import run_output, read_conformers
+from kaplan.pmem import Pmem, PmemView
+from kaplan.prescreen import ForceFieldScreen
 from kaplan.ring import RingEmptyError, RingOverflowError, Ring
-from kaplan.rmsd import calc_rmsd
-from kaplan.tournament import run_tournament, select_pmems, select_parents
+from kaplan.rmsd import calc_rmsd, calc_rmsd_matrix
+from kaplan.stopping import StoppingCriteria, calc_diversity
+from kaplan.surrogate import EnergySurrogate, make_features
+from kaplan.tournament import run_tournament, select_pmems, select_parents,\
+                              make_children, run_batch_tournaments
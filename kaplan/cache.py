@@ -0,0 +1,315 @@
+"""This module keeps a record of energy calculations
+that have already been done. Since the dihedral
+angles are integers (degrees) and the swap operator
+moves whole geometries between pmems, the same
+geometry is often seen many times during a run.
+The EnergyCache remembers the most recently used
+energies so that psi4 is only run once for each
+geometry (as long as it stays in the cache).
+
+The EnergyStore keeps energies in a SQLite database
+file, so that they can be shared between runs (and
+between Kaplan processes running at the same time
+on one machine)."""
+
+import os
+import sqlite3
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+# default maximum number of energies to remember
+CACHE_SIZE = 100000
+# name of the energy store file (in kaplan_output)
+STORE_FILE = "energies.sqlite"
+# seconds to wait for another process to finish writing
+STORE_TIMEOUT = 60
+
+
+class EnergyCache:
+    """Least-recently-used (LRU) cache of energies."""
+
+    def __init__(self, max_size=CACHE_SIZE, store=None):
+        """Constructor for the energy cache.
+
+        Parameters
+        ----------
+        max_size : int
+            The maximum number of energies to keep. Once
+            the cache is full, the energy that was used
+            longest ago is forgotten.
+        store : object
+            An EnergyStore to look in when an energy is
+            not in the cache, and to save new energies to.
+            Defaults to None.
+
+        Attributes
+        ----------
+        hits : int
+            Number of times an energy was found.
+        misses : int
+            Number of times an energy was not found.
+
+        Notes
+        -----
+        The cache can be used from more than one thread
+        (energies from a pool are added by callbacks).
+
+        """
+        if max_size <= 0:
+            raise ValueError("The energy cache needs a positive max_size.")
+        self.max_size = max_size
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._energies = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        """Number of energies in the cache."""
+        return len(self._energies)
+
+    def __contains__(self, key):
+        """Check for a key without changing the statistics."""
+        return key in self._energies
+
+    @staticmethod
+    def make_key(dihedrals, method, basis, charge, multip):
+        """Make the key for one geometry.
+
+        Parameters
+        ----------
+        dihedrals : list(int)
+            The num_atoms-3 dihedral angles (degrees)
+            of the geometry.
+        method : str
+            The quantum chemical method.
+        basis : str
+            The basis set.
+        charge : int
+            The charge of the molecule.
+        multip : int
+            The multiplicity of the molecule.
+
+        Returns
+        -------
+        key : tuple
+            The dihedral angles are rounded to whole
+            degrees (from 0 to 359) so that equivalent
+            geometries have the same key.
+
+        """
+        dihedrals = np.rint(dihedrals).astype(int) % 360
+        return (tuple(dihedrals.tolist()), method, basis, charge, multip)
+
+    def get(self, key):
+        """Look up an energy.
+
+        Parameters
+        ----------
+        key : tuple
+            Made by make_key.
+
+        Returns
+        -------
+        energy : float
+            None if the key is not in the cache.
+
+        """
+        with self._lock:
+            try:
+                energy = self._energies[key]
+            except KeyError:
+                energy = None
+            else:
+                self._energies.move_to_end(key)
+                self.hits += 1
+                return energy
+        if self.store is not None:
+            energy = self.store.get(key)
+        if energy is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        self._remember(key, energy)
+        with self._lock:
+            self.hits += 1
+        return energy
+
+    def put(self, key, energy):
+        """Add an energy to the cache.
+
+        Parameters
+        ----------
+        key : tuple
+            Made by make_key.
+        energy : float
+            The energy for the key.
+
+        Returns
+        -------
+        None
+
+        """
+        self._remember(key, energy)
+        if self.store is not None:
+            self.store.put(key, energy)
+
+    def _remember(self, key, energy):
+        """Add an energy to the cache only (not the store)."""
+        with self._lock:
+            self._energies[key] = energy
+            self._energies.move_to_end(key)
+            while len(self._energies) > self.max_size:
+                self._energies.popitem(last=False)
+
+    def hit_rate(self):
+        """Fraction of look ups that found an energy."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_state(self):
+        """The energies (least recently used first) and counters (see set_state).
+
+        The store is not included, since its energies are
+        already saved in its file.
+
+        """
+        with self._lock:
+            keys = list(self._energies)
+            energies = np.fromiter(self._energies.values(), float, len(keys))
+        dihedrals = np.array([key[0] for key in keys], np.int16).reshape(len(keys), -1) \
+            if keys else np.empty((0, 0), np.int16)
+        return {"cache_dihedrals": dihedrals,
+                "cache_methods": np.array([key[1] for key in keys], str),
+                "cache_bases": np.array([key[2] for key in keys], str),
+                "cache_charges": np.array([key[3] for key in keys], int),
+                "cache_multips": np.array([key[4] for key in keys], int),
+                "cache_energies": energies,
+                "cache_counters": np.array([self.hits, self.misses])}
+
+    def set_state(self, state):
+        """Restore the output of get_state."""
+        with self._lock:
+            self._energies = OrderedDict()
+            for dihedrals, method, basis, charge, multip, energy in zip(
+                    state["cache_dihedrals"], state["cache_methods"], state["cache_bases"],
+                    state["cache_charges"], state["cache_multips"], state["cache_energies"]):
+                key = (tuple(dihedrals.tolist()), str(method), str(basis), int(charge),
+                       int(multip))
+                self._energies[key] = float(energy)
+            while len(self._energies) > self.max_size:
+                self._energies.popitem(last=False)
+            self.hits, self.misses = (int(c) for c in state["cache_counters"])
+
+
+class EnergyStore:
+    """Energies saved in a SQLite database file."""
+
+    def __init__(self, filename, molecule=""):
+        """Constructor for the energy store.
+
+        Parameters
+        ----------
+        filename : str
+            The database file. It is made if it does
+            not exist yet.
+        molecule : str
+            Identifies the molecule (for example, a hash
+            of the zmatrix template), since the same
+            dihedral angles give different energies for
+            different molecules.
+
+        Attributes
+        ----------
+        hits : int
+            Number of times an energy was found.
+        misses : int
+            Number of times an energy was not found.
+
+        Notes
+        -----
+        The database uses write-ahead logging, so several
+        Kaplan processes can read from and write to the
+        same file at once. Each energy is committed as
+        soon as it is added.
+
+        """
+        self.filename = filename
+        self.molecule = molecule
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._connection = sqlite3.connect(filename, timeout=STORE_TIMEOUT,
+                                           check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS energies (
+                                        molecule TEXT, dihedrals TEXT,
+                                        method TEXT, basis TEXT,
+                                        charge INTEGER, multip INTEGER,
+                                        energy REAL,
+                                        PRIMARY KEY (molecule, dihedrals, method,
+                                                     basis, charge, multip))""")
+
+    def __len__(self):
+        """Number of energies in the store for this molecule."""
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM energies WHERE molecule = ?",
+                                            (self.molecule,)).fetchone()[0]
+
+    make_key = staticmethod(EnergyCache.make_key)
+
+    def _row(self, key):
+        """Turn a key from make_key into database values."""
+        dihedrals, method, basis, charge, multip = key
+        return (self.molecule, ",".join(str(dihedral) for dihedral in dihedrals),
+                method, basis, charge, multip)
+
+    def get(self, key):
+        """Look up an energy (see EnergyCache.get)."""
+        with self._lock:
+            row = self._connection.execute("""SELECT energy FROM energies
+                                              WHERE molecule = ? AND dihedrals = ?
+                                              AND method = ? AND basis = ?
+                                              AND charge = ? AND multip = ?""",
+                                           self._row(key)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, energy):
+        """Save an energy (see EnergyCache.put)."""
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO energies VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     self._row(key) + (float(energy),))
+
+    def close(self):
+        """Close the database file."""
+        with self._lock:
+            self._connection.close()
+
+
+def get_store_file(loc="pwd"):
+    """Determine the name of the energy store file.
+
+    Parameters
+    ----------
+    loc : str
+        See output.get_output_dir. Only "pwd" is
+        available at the moment.
+
+    Returns
+    -------
+    filename : str
+        The STORE_FILE in the kaplan_output directory
+        (which is made if it does not exist).
+
+    """
+    assert loc == "pwd"
+    output_dir = os.path.join(os.getcwd(), "kaplan_output")
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, STORE_FILE)
@@ -0,0 +1,188 @@
+"""This module saves the state of a run (a checkpoint)
+so that it can be carried on after a crash, or in a
+later batch job (see the resume option in the
+ga input file).
+
+A checkpoint has the ring arrays (see Ring.get_state,
+which includes the energies in the ring's cache),
+the state of the random number generators and the
+last mating event that was done. It is a compressed
+numpy file (.npz) that is written to a temporary file
+first and then renamed, so a crash while writing
+never leaves a broken checkpoint behind."""
+
+import os
+import json
+import time
+import random
+from ast import literal_eval
+
+import numpy as np
+
+from kaplan import mutations
+
+# name of the checkpoint file (in kaplan_output)
+CHECKPOINT_FILE = "checkpoint.npz"
+# names of the arrays from Ring.get_state
+RING_ARRAYS = {"dihedrals", "fitness", "birthdays", "energies", "coords", "rmsds",
+               "ff_energies", "filled_slots", "counters", "genotype_keys",
+               "genotype_fitness", "genotype_energies", "genotype_rmsds", "rejected_keys",
+               "surrogate_features", "surrogate_energies", "surrogate_fit_features",
+               "surrogate_fit_energies", "surrogate_counters",
+               "refined_dihedrals", "refined_birthdays", "refined_energies", "refined_coords",
+               "refined_rmsds", "refined_fitness", "refiner_counters", "cache_dihedrals",
+               "cache_methods", "cache_bases", "cache_charges", "cache_multips",
+               "cache_energies", "cache_counters"}
+
+
+def get_checkpoint_file(loc="pwd"):
+    """Determine the name of the checkpoint file.
+
+    Parameters
+    ----------
+    loc : str
+        See output.get_output_dir. Only "pwd" is
+        available at the moment.
+
+    Returns
+    -------
+    filename : str
+        The CHECKPOINT_FILE in the kaplan_output
+        directory (which is made if it does not exist).
+
+    """
+    assert loc == "pwd"
+    output_dir = os.path.join(os.getcwd(), "kaplan_output")
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, CHECKPOINT_FILE)
+
+
+def save_checkpoint(filename, ring, mev, stopping=None):
+    """Save the state of a run.
+
+    Parameters
+    ----------
+    filename : str
+        The checkpoint file (overwritten if it exists).
+    ring : object
+        The Ring object.
+    mev : int
+        The last mating event that was done.
+    stopping : object
+        The StoppingCriteria, if there is one (its
+        stagnation history is saved).
+
+    Returns
+    -------
+    None
+
+    """
+    arrays = {"ckpt_" + name: value for name, value in ring.get_state().items()}
+    arrays["ckpt_mev"] = np.array(mev)
+    # the legacy numpy generator (used to fill and sample
+    # the ring), the mutations generator, and the random
+    # module (used to place pmems)
+    _, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    arrays["ckpt_np_keys"] = keys
+    arrays["ckpt_np_extra"] = np.array([pos, has_gauss, cached_gaussian], float)
+    arrays["ckpt_rng"] = np.array(json.dumps(mutations.RNG.bit_generator.state))
+    arrays["ckpt_random"] = np.array(repr(random.getstate()))
+    if stopping is not None:
+        arrays["ckpt_history"] = stopping.get_history()
+    temp_file = filename + ".tmp"
+    with open(temp_file, "wb") as fout:
+        np.savez_compressed(fout, **arrays)
+    os.replace(temp_file, filename)
+
+
+def load_checkpoint(filename, ring, stopping=None):
+    """Restore the state of a run.
+
+    Parameters
+    ----------
+    filename : str
+        A file written by save_checkpoint.
+    ring : object
+        The Ring to restore (it must have the same
+        number of slots, geometries and atoms).
+    stopping : object
+        StoppingCriteria to restore (if given).
+
+    Raises
+    ------
+    ValueError
+        The checkpoint does not match the ring.
+
+    Returns
+    -------
+    mev : int
+        The last mating event that was done before
+        the checkpoint was saved.
+
+    """
+    with np.load(filename) as data:
+        ring.set_state({name[5:]: data[name] for name in data.files
+                        if name.startswith("ckpt_") and name[5:] in RING_ARRAYS})
+        pos, has_gauss, cached_gaussian = data["ckpt_np_extra"]
+        np.random.set_state(("MT19937", data["ckpt_np_keys"], int(pos), int(has_gauss),
+                             cached_gaussian))
+        mutations.RNG.bit_generator.state = json.loads(str(data["ckpt_rng"]))
+        random.setstate(literal_eval(str(data["ckpt_random"])))
+        if stopping is not None and "ckpt_history" in data.files:
+            stopping.set_history(data["ckpt_history"])
+        return int(data["ckpt_mev"])
+
+
+class Checkpointer:
+    """Saves checkpoints every so many mating events or seconds."""
+
+    def __init__(self, filename, every_mevs=0, every_seconds=0.0):
+        """Constructor for the checkpointer.
+
+        Parameters
+        ----------
+        filename : str
+            The checkpoint file.
+        every_mevs : int
+            Save a checkpoint after this many mating
+            events (0 for never).
+        every_seconds : float
+            Save a checkpoint once this many seconds have
+            passed since the last one (0 for never).
+
+        """
+        self.filename = filename
+        self.every_mevs = every_mevs
+        self.every_seconds = every_seconds
+        self.last_mev = None
+        self.last_time = time.monotonic()
+
+    def update(self, ring, mev, stopping=None):
+        """Save a checkpoint if one is due.
+
+        Parameters
+        ----------
+        ring, mev, stopping
+            See save_checkpoint.
+
+        Returns
+        -------
+        bool
+            True if a checkpoint was saved.
+
+        """
+        if self.last_mev is None:
+            self.last_mev = mev - 1
+        due_mevs = self.every_mevs and mev - self.last_mev >= self.every_mevs
+        due_time = self.every_seconds and \
+            time.monotonic() - self.last_time >= self.every_seconds
+        if not (due_mevs or due_time):
+            return False
+        self.save(ring, mev, stopping)
+        return True
+
+    def save(self, ring, mev, stopping=None):
+        """Save a checkpoint now (see save_checkpoint)."""
+        save_checkpoint(self.filename, ring, mev, stopping)
+        self.last_mev = mev
+        self.last_time = time.monotonic()
@@ -1,7 +1,23 @@
 """This module uses psi4 to run energy calculations
-for a given geometry."""
+for a given geometry. It can also make a pool of
+worker processes so that several energy calculations
+run at the same time.
+
+Each process keeps one psi4 Molecule for the molecule
+being searched (see get_molecule), and only changes its
+coordinates for each new geometry. The converged orbitals
+of each geometry can be kept in a directory (see
+init_worker), so that a similar geometry (for example, a
+child's geometry that differs from its parent's by a few
+dihedral angles) can start its SCF from them."""
 
 import os
+import glob
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import psi4
 
 # TODO: make these functions callable from a function
@@ -11,10 +27,21 @@ import psi4
 # how much RAM to use for psi4 calculations
 # should be less than what your computer has available
 RAM = "4 GB"
+# how many threads psi4 uses for each calculation
+NUM_THREADS = 1
+# directory where the orbitals of each geometry are saved
+# (None to not save them)
+ORBITAL_DIR = None
+# maximum number of orbital files to keep in ORBITAL_DIR
+# (the oldest ones are deleted)
+MAX_ORBITAL_FILES = 1000
+# the psi4 Molecule used by this process for each set of
+# atoms, charge and multiplicity (see get_molecule)
+_MOLECULES = {}
 
 
 def run_energy_calc(geom, method="hf", basis="sto-3g",
-                    restricted=False):
+                    restricted=False, orbitals=None, guess=None):
     """Run an energy calculation using psi4.
 
     Parameters
@@ -23,7 +50,7 @@ def run_energy_calc(geom, method="hf", basis="sto-3g",
         The string representing the molecular
         geometry for which to evaluate the energy.
         Note: this string should be generated using
-        the prep_psi4_geom() function.
+        the prep_psi4_geom() or get_molecule() function.
 
     method : str
         The quantum mechanical method to use.
@@ -36,6 +63,16 @@ def run_energy_calc(geom, method="hf", basis="sto-3g",
         calculation). If set to True, runs a
         restricted calculation.
 
+    orbitals : str
+        File (.npy) to save the converged orbitals
+        to. Defaults to None (do not save them).
+
+    guess : str
+        File (.npy) with orbitals (saved with the
+        orbitals option) to start the SCF from. The
+        geometry must be for the same atoms and basis
+        set. Defaults to None (psi4's usual guess).
+
     Raises
     ------
     AssertionError
@@ -54,17 +91,27 @@ def run_energy_calc(geom, method="hf", basis="sto-3g",
 
     """
     psi4.set_memory(RAM)
+    psi4.set_num_threads(NUM_THREADS)
     psi4.core.be_quiet()
     assert isinstance(method, str)
     assert isinstance(basis, str)
     if restricted:
         psi4.set_options({"reference": "uhf"})
+    kwargs = {"molecule": geom}
+    if orbitals is not None:
+        kwargs["write_orbitals"] = orbitals
+    if guess is not None:
+        psi4.core.set_local_option("SCF", "GUESS", "READ")
+        kwargs["restart_file"] = guess
     try:
-        energy = psi4.energy(method+'/'+basis, return_wfn=False)
+        energy = psi4.energy(method+'/'+basis, return_wfn=False, **kwargs)
     except psi4.driver.p4util.exceptions.ValidationError:
         raise psi4.driver.p4util.exceptions.ValidationError(f"Invalid method: {method}")
     except psi4.driver.qcdb.exceptions.BasisSetNotFound:
         raise psi4.driver.qcdb.exceptions.BasisSetNotFound(f"Invalid basis set: {basis}")
+    finally:
+        if guess is not None:
+            psi4.core.revoke_local_option_changed("SCF", "GUESS")
     return energy
 
 
@@ -113,7 +160,7 @@ def check_psi4_inputs(qcm, basis):
         raise ValueError(f"Invalid basis: {basis}")
 
 
-def prep_psi4_geom(coords, charge, multip):
+def prep_psi4_geom(coords, charge, multip, fixed=False):
     """Make a psi4 compliant geometry string.
 
     Parameters
@@ -126,6 +173,12 @@ def prep_psi4_geom(coords, charge, multip):
         The charge of the molecule.
     multip : int
         The multiplicity of the molecule.
+    fixed : bool
+        If True, psi4 does not move the molecule to
+        its center of mass or rotate it, and does not
+        use symmetry, so that new coordinates can be
+        set (see get_molecule) and orbitals can be
+        reused between geometries. Defaults to False.
 
     Returns
     -------
@@ -135,4 +188,178 @@ def prep_psi4_geom(coords, charge, multip):
     psi4_str = f"\n{charge} {multip}\n"
     for atom in coords:
         psi4_str += f"{atom[0]} {atom[1]} {atom[2]} {atom[3]}\n"
+    if fixed:
+        psi4_str += "symmetry c1\nno_com\nno_reorient\n"
     return psi4.geometry(psi4_str)
+
+
+def get_molecule(atoms, coords, charge, multip):
+    """Get this process's psi4 Molecule for a geometry.
+
+    Parameters
+    ----------
+    atoms : list(str)
+        The atom types, in order.
+    coords : np.ndarray(shape=(num_atoms, 3))
+        The cartesian coordinates (Angstroms).
+    charge : int
+        The charge of the molecule.
+    multip : int
+        The multiplicity of the molecule.
+
+    Notes
+    -----
+    The Molecule is made (with prep_psi4_geom) the first
+    time these atoms, charge and multiplicity are seen.
+    After that, its coordinates are changed in place,
+    which is much faster than parsing a geometry string.
+
+    Returns
+    -------
+    molecule : psi4.core.Molecule
+        The Molecule, with the given coordinates.
+
+    """
+    coords = np.asarray(coords, float)
+    key = (tuple(atoms), charge, multip)
+    molecule = _MOLECULES.get(key)
+    if molecule is None:
+        molecule = prep_psi4_geom([[atom, *xyz] for atom, xyz in zip(atoms, coords.tolist())],
+                                  charge, multip, fixed=True)
+        _MOLECULES[key] = molecule
+    else:
+        molecule.set_geometry(psi4.core.Matrix.from_array(
+            coords / psi4.constants.bohr2angstroms))
+    molecule.update_geometry()
+    return molecule
+
+
+def orbital_name(dihedrals, method, basis, charge, multip):
+    """Name the orbital file of a geometry.
+
+    Parameters
+    ----------
+    dihedrals : list(int)
+        The dihedral angles (genes) of the geometry.
+    method, basis, charge, multip
+        See cache.EnergyCache.make_key.
+
+    Returns
+    -------
+    name : str
+        The file name (in ORBITAL_DIR) for the orbitals.
+        The dihedral angles are rounded to whole degrees,
+        as for the energy cache.
+
+    """
+    dihedrals = np.rint(dihedrals).astype(int) % 360
+    key = dihedrals.astype(np.int16).tobytes() + f"{method}/{basis}/{charge}/{multip}".encode()
+    return hashlib.sha1(key).hexdigest() + ".npy"
+
+
+def orbital_path(name, exists=False):
+    """The path of an orbital file in ORBITAL_DIR.
+
+    Parameters
+    ----------
+    name : str
+        See orbital_name (can be None).
+    exists : bool
+        If True, the file must exist. Defaults to False.
+
+    Returns
+    -------
+    path : str
+        None if there is no ORBITAL_DIR, no name, or
+        (with exists) no such file.
+
+    """
+    if ORBITAL_DIR is None or name is None:
+        return None
+    path = os.path.join(ORBITAL_DIR, name)
+    if exists and not os.path.isfile(path):
+        return None
+    return path
+
+
+def prune_orbitals():
+    """Delete the oldest orbital files, so that at most MAX_ORBITAL_FILES are kept."""
+    if ORBITAL_DIR is None:
+        return None
+    paths = glob.glob(os.path.join(ORBITAL_DIR, "*.npy"))
+    if len(paths) <= MAX_ORBITAL_FILES:
+        return None
+    times = []
+    for path in paths:
+        try:
+            times.append((os.path.getmtime(path), path))
+        except OSError:
+            # deleted by another worker
+            pass
+    for _, path in sorted(times)[:len(times) - MAX_ORBITAL_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def init_worker(memory, num_threads, orbital_dir=None):
+    """Set up psi4 for a worker process.
+
+    Parameters
+    ----------
+    memory : str
+        How much RAM each psi4 calculation in this
+        worker can use (for example "2 GB").
+    num_threads : int
+        How many threads each psi4 calculation in
+        this worker can use.
+    orbital_dir : str
+        The directory (shared by all of the workers)
+        to save orbitals in, so that they can be used
+        as SCF guesses (see fitg.calc_energy). Defaults
+        to None (orbitals are not saved).
+
+    Returns
+    -------
+    None
+
+    """
+    global RAM, NUM_THREADS, ORBITAL_DIR
+    RAM = memory
+    NUM_THREADS = num_threads
+    ORBITAL_DIR = orbital_dir
+    psi4.core.be_quiet()
+
+
+def make_pool(num_workers, memory=RAM, num_threads=NUM_THREADS, orbital_dir=None):
+    """Make a pool of processes for energy calculations.
+
+    Parameters
+    ----------
+    num_workers : int
+        The number of worker processes.
+    memory : str
+        How much RAM each worker can use.
+    num_threads : int
+        How many threads each worker can use.
+    orbital_dir : str
+        See init_worker.
+
+    Notes
+    -----
+    The workers are spawned (not forked), since psi4
+    has usually been initialised in the main process
+    by the time the pool is made. The total resources
+    used are num_workers*memory and num_workers*num_threads.
+
+    Returns
+    -------
+    pool : concurrent.futures.ProcessPoolExecutor
+        Should be shut down once the calculations are done.
+
+    """
+    return ProcessPoolExecutor(max_workers=num_workers,
+                               mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_worker,
+                               initargs=(memory, num_threads, orbital_dir))
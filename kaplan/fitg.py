@@ -5,22 +5,35 @@ rmsd. The energy is calculated using a
 user-specified quantum chemical method
 and basis set for each geometry in the pmem.
 The rmsd is calculated as all the possible
-pairs of rmsd between geometries."""
+pairs of rmsd between geometries. The energy
+calculations can be shared out to a pool of
+worker processes (see energy.make_pool), and
+energies that are already known can be taken
+from a cache (see cache.EnergyCache)."""
 
-from math import factorial
+from itertools import repeat
+from concurrent.futures import Future
 
 import numpy as np
 
-from kaplan.energy import run_energy_calc, prep_psi4_geom
-from kaplan.rmsd import calc_rmsd
+from kaplan.energy import run_energy_calc, get_molecule, orbital_name, orbital_path,\
+                          prune_orbitals
+from kaplan.rmsd import calc_rmsd_matrix
 
 # TODO incorporate parser attribute "prog"
 # (program) such that a user could specify
 # another program (other than psi4) to
 # calculate energies
 
+# energy (hartrees) given to a geometry whose energy
+# calculation failed. It is only used for the fitness in
+# the current run: failures are not added to the cache or
+# store, so a later look up calculates the energy again
+FAILED_ENERGY = 0.0
 
-def sum_energies(xyz_coords, charge, multip, method, basis):
+
+def sum_energies(xyz_coords, charge, multip, method, basis, pool=None,
+                 cache=None, dihedrals=None):
     """Sum the energy calculations for a pmem.
 
     Parameters
@@ -45,18 +58,213 @@ def sum_energies(xyz_coords, charge, multip, method, basis):
     basis : str
         The basis set to use to calculate the
         energy.
+    pool : concurrent.futures.Executor
+        Runs the energy calculations for the geometries
+        at the same time. Defaults to None (run the
+        calculations one after the other).
+    cache : object
+        An EnergyCache to look up energies in, and
+        to add new energies to. Defaults to None
+        (calculate every energy).
+    dihedrals : list(list(int))
+        The dihedral angles for each geometry in
+        xyz_coords. Needed to use the cache.
+
+    """
+    energies = calc_energies(xyz_coords, charge, multip, method, basis, pool,
+                             cache, dihedrals)
+    return abs(sum(energies))
+
+
+def calc_energies(xyz_coords, charge, multip, method, basis, pool=None,
+                  cache=None, dihedrals=None, guesses=None):
+    """Calculate the energy of each geometry.
+
+    Parameters
+    ----------
+    Same as sum_energies. The geometries do not need
+    to come from the same pmem.
+    guesses : list(list(int))
+        For each geometry, the dihedral angles of a
+        similar geometry (for example, from a parent)
+        whose orbitals are used as the SCF guess, or None
+        for psi4's usual guess. The orbitals of every
+        geometry are saved so that they can be used as
+        guesses later (see energy.init_worker). Needs
+        dihedrals. Defaults to None (orbitals are not
+        saved or used).
+
+    Notes
+    -----
+    When a cache is used, geometries that appear more
+    than once in xyz_coords are only calculated once.
+    Only the energies of calculations that did not fail
+    are added to the cache.
+
+    Returns
+    -------
+    energies : np.ndarray(shape=len(xyz_coords), dtype=float)
+        Failed calculations have the FAILED_ENERGY.
+
+    """
+    if cache is None or dihedrals is None:
+        return failed_to_penalty(_run_energies(xyz_coords, charge, multip, method, basis,
+                                               pool, dihedrals, guesses))
+    keys = [cache.make_key(geom, method, basis, charge, multip) for geom in dihedrals]
+    known = {}
+    # index of the first geometry for each key not in the cache
+    missing = {}
+    for i, key in enumerate(keys):
+        if key in known or key in missing:
+            continue
+        energy = cache.get(key)
+        if energy is None:
+            missing[key] = i
+        else:
+            known[key] = energy
+    new_energies = _run_energies([xyz_coords[i] for i in missing.values()],
+                                 charge, multip, method, basis, pool,
+                                 [dihedrals[i] for i in missing.values()],
+                                 None if guesses is None else
+                                 [guesses[i] for i in missing.values()])
+    for key, energy in zip(missing, new_energies):
+        if np.isfinite(energy):
+            cache.put(key, energy)
+        known[key] = energy
+    return failed_to_penalty(np.array([known[key] for key in keys], float))
+
+
+def failed_to_penalty(energies):
+    """Give failed energy calculations (nan) the FAILED_ENERGY."""
+    energies = np.asarray(energies, float)
+    return np.where(np.isnan(energies), FAILED_ENERGY, energies)
+
+
+def _run_energies(xyz_coords, charge, multip, method, basis, pool,
+                  dihedrals=None, guesses=None):
+    """Run calc_energy for each geometry (on the pool if given)."""
+    orbitals, guesses = _orbital_names(len(xyz_coords), charge, multip, method, basis,
+                                       dihedrals, guesses)
+    if pool is None:
+        energies = [calc_energy(xyz, charge, multip, method, basis, orbital, guess)
+                    for xyz, orbital, guess in zip(xyz_coords, orbitals, guesses)]
+    else:
+        energies = pool.map(calc_energy, xyz_coords, repeat(charge), repeat(multip),
+                            repeat(method), repeat(basis), orbitals, guesses)
+    return np.fromiter(energies, float, len(xyz_coords))
+
+
+def _orbital_names(num_geoms, charge, multip, method, basis, dihedrals, guesses):
+    """Names of the orbital files to save and to use as guesses (see calc_energies)."""
+    if guesses is None or dihedrals is None:
+        return [None] * num_geoms, [None] * num_geoms
+    return ([orbital_name(geom, method, basis, charge, multip) for geom in dihedrals],
+            [None if guess is None else orbital_name(guess, method, basis, charge, multip)
+             for guess in guesses])
+
+
+def submit_energies(xyz_coords, charge, multip, method, basis, pool,
+                    cache=None, dihedrals=None, guesses=None):
+    """Start the energy calculation of each geometry on a pool.
+
+    Parameters
+    ----------
+    Same as calc_energies, except that pool must be given.
+
+    Returns
+    -------
+    futures : list(concurrent.futures.Future)
+        One future for each geometry. The result of
+        each future is the energy (see calc_energy,
+        nan if it failed, see failed_to_penalty).
+        Energies found in the cache are returned as
+        futures that are already done, and the other
+        energies are added to the cache when they finish
+        (unless they failed).
 
     """
-    energies = np.zeros(len(xyz_coords), float)
+    futures = []
+    orbitals, guesses = _orbital_names(len(xyz_coords), charge, multip, method, basis,
+                                       dihedrals, guesses)
     for i, xyz in enumerate(xyz_coords):
+        args = (calc_energy, xyz, charge, multip, method, basis, orbitals[i], guesses[i])
+        if cache is not None and dihedrals is not None:
+            key = cache.make_key(dihedrals[i], method, basis, charge, multip)
+            energy = cache.get(key)
+            if energy is not None:
+                future = Future()
+                future.set_result(energy)
+                futures.append(future)
+                continue
+            future = pool.submit(*args)
+            future.add_done_callback(lambda done, key=key: _put_energy(cache, key,
+                                                                       done.result()))
+        else:
+            future = pool.submit(*args)
+        futures.append(future)
+    return futures
+
+
+def _put_energy(cache, key, energy):
+    """Add an energy to the cache, unless its calculation failed."""
+    if np.isfinite(energy):
+        cache.put(key, energy)
+
+
+def calc_energy(xyz, charge, multip, method, basis, orbitals=None, guess=None):
+    """Calculate the energy of one geometry.
+
+    Parameters
+    ----------
+    xyz : list(list(str, float, float, float))
+        One geometry (see sum_energies).
+    charge, multip, method, basis
+        See sum_energies.
+    orbitals : str
+        The name of the file (see energy.orbital_name)
+        to save the converged orbitals to, if the
+        process has an orbital directory. Defaults to
+        None (do not save them).
+    guess : str
+        The name of an orbital file to start the SCF
+        from (ignored if the file does not exist).
+        Defaults to None.
+
+    Notes
+    -----
+    This function is sent to the worker processes
+    when a pool is used, so it sets up the psi4
+    geometry itself (psi4 geometries cannot be sent
+    between processes). Each process keeps one psi4
+    Molecule and only changes its coordinates (see
+    energy.get_molecule). If the calculation fails
+    with the guess, it is run again without it.
+
+    Returns
+    -------
+    energy : float
+        The energy in hartrees. If there is a
+        convergence error (atom too close), the
+        energy is nan (see failed_to_penalty).
+
+    """
+    atoms = [atom[0] for atom in xyz]
+    coords = np.array([atom[1:] for atom in xyz], float)
+    orbitals = orbital_path(orbitals)
+    guesses = [orbital_path(guess, exists=True)]
+    if guesses[0] is not None:
+        guesses.append(None)
+    for guess in guesses:
         try:
-            energies[i] = run_energy_calc(prep_psi4_geom(xyz, charge, multip), method, basis)
+            energy = run_energy_calc(get_molecule(atoms, coords, charge, multip),
+                                     method, basis, orbitals=orbitals, guess=guess)
         except Exception:
-            # if there is a convergence error (atom too close)
-            # give an energy of zero
-            print("Warning: non-convergence for molecule.")
-            energies[i] = 0
-    return abs(sum(energies))
+            continue
+        if orbitals is not None:
+            prune_orbitals()
+        return energy
+    print("Warning: non-convergence for molecule.")
+    return np.nan
 
 
 def sum_rmsds(xyz_coords):
@@ -73,18 +281,42 @@ def sum_rmsds(xyz_coords):
         Where the letters are the elements, and
         there are x,y,z coordinates for each atom
         (for a total of n atoms). The coordinates
-        are given as integers.
+        are given as integers. An array of coordinates
+        without the elements, with shape
+        (num_geoms, num_atoms, 3), can also be given.
+
+    Notes
+    -----
+    All of the pairs are calculated at once
+    (see rmsd.calc_rmsd_matrix).
+
+    """
+    rmsd_matrix = calc_rmsds(xyz_coords)
+    return rmsd_matrix[np.triu_indices(len(rmsd_matrix), 1)].sum()
+
+
+def calc_rmsds(xyz_coords, known=None):
+    """Calculate the rmsd between all pairs of geometries.
+
+    Parameters
+    ----------
+    xyz_coords : list
+        See sum_rmsds.
+    known : np.ndarray(shape=(num_geoms, num_geoms))
+        Rmsd values that do not need to be calculated
+        again (see rmsd.calc_rmsd_matrix). Defaults to
+        None (calculate every pair).
+
+    Returns
+    -------
+    rmsd_matrix : np.ndarray(shape=(num_geoms, num_geoms))
+        The rmsd for each pair of geometries. The sum
+        over all pairs (i < j) is given by sum_rmsds.
 
     """
-    num_geoms = len(xyz_coords)
-    rmsd_values = np.zeros(len(xyz_coords), float)
-    # n choose k = n!/(k!(n-k)!)
-    num_pairs = int(factorial(num_geoms)/(2*factorial(num_geoms-2)))
-    pairs = all_pairs_gen(len(xyz_coords))
-    for i in range(num_pairs):
-        ind1, ind2 = next(pairs)
-        rmsd_values[i] = calc_rmsd(xyz_coords[ind1], xyz_coords[ind2])
-    return sum(rmsd_values)
+    if not isinstance(xyz_coords, np.ndarray):
+        xyz_coords = np.array([[atom[1:] for atom in xyz] for xyz in xyz_coords], float)
+    return calc_rmsd_matrix(xyz_coords, known)
 
 
 def all_pairs_gen(num_geoms):
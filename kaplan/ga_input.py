@@ -8,6 +8,85 @@ module."""
 NUM_GA_ARGS = 12
 NUM_MOL_ARGS = 7
 
+# optional parameters and their default values
+# these are not counted in NUM_GA_ARGS
+OPTIONAL_GA_ARGS = {
+    # number of processes running energy calculations
+    "num_workers": 1,
+    # threads for each energy calculation
+    "worker_threads": 1,
+    # RAM (in GB) for each energy calculation
+    "worker_mem": 4.0,
+    # max number of children waiting for their fitness
+    # (0 waits for both children after each tournament)
+    "num_pending": 0,
+    # number of tournaments whose children are evaluated
+    # together (0 runs one tournament at a time)
+    "batch_size": 0,
+    # max number of energies to remember (0 for no cache)
+    "cache_size": 100000,
+    # 1 to save energies to kaplan_output/energies.sqlite
+    # and reuse energies saved by other runs
+    "energy_store": 0,
+    # stop if the best fitness improves by no more than
+    # stag_tol over stag_mevs mating events (0 for off)
+    "stag_mevs": 0,
+    "stag_tol": 0.0,
+    # stop if the ring diversity drops below this (0 for off)
+    "min_diversity": 0.0,
+    # stop once a pmem is at least this fit (0 for off)
+    "target_fitness": 0.0,
+    # stop after this many energy calculations (0 for off)
+    "max_evals": 0,
+    # stop after this many minutes (0 for off)
+    "max_time": 0.0,
+    # save a checkpoint every checkpoint_mevs mating events
+    # and/or every checkpoint_time minutes (0 for off)
+    "checkpoint_mevs": 0,
+    "checkpoint_time": 0.0,
+    # 1 to carry on from kaplan_output/checkpoint.npz
+    "resume": 0,
+    # 1 to start the ring from the input geometry
+    "seed_input": 0,
+    # job number in kaplan_output to start the ring
+    # from (-1 for none)
+    "seed_job": -1,
+    # 1 to only evolve the dihedrals about rotatable
+    # bonds (the rest keep their input values)
+    "rotors": 0,
+    # reject children with a geometry more than ff_window
+    # kcal/mol (force field energy) above the lowest
+    # geometry in the ring (0 for off)
+    "ff_window": 0.0,
+    # geometries with two atoms closer than clash_scale times
+    # the sum of their covalent radii are given an energy of
+    # 0 without running psi4 (0 for off)
+    "clash_scale": 0.6,
+    # 1 to skip children that a model trained on the energies
+    # predicts will not replace the pmem in their slot
+    "surrogate": 0,
+    # number of standard deviations that a child's energy
+    # could be below its predicted energy
+    "surrogate_z": 2.0,
+    # largest standard deviation (hartrees) of a child's
+    # predicted energy for it to be skipped
+    "surrogate_std": 0.005,
+    # with screen_qcm/screen_basis in the mol input file,
+    # the number of fittest pmems whose energies are
+    # calculated with qcm and basis, every refine_every
+    # mating events (0 for only at the end of the run)
+    "refine_top": 5,
+    "refine_every": 0,
+    # start the SCF of a child's geometry from the orbitals of
+    # its parent's geometry if they differ in at most this many
+    # dihedral angles (0 for off)
+    "scf_guess": 0,
+}
+# parameters that are floats (the rest are integers)
+FLOAT_GA_ARGS = {"coef_energy", "coef_rmsd", "worker_mem", "stag_tol",
+                 "min_diversity", "target_fitness", "max_time", "checkpoint_time",
+                 "ff_window", "clash_scale", "surrogate_z", "surrogate_std"}
+
 
 def read_ga_input(ga_input_file):
     """Read an input file for genetic algorithm.
@@ -28,7 +107,8 @@ def read_ga_input(ga_input_file):
         calling gac module is switched.
         This error is also raised when the number
         of arguments does not match the expected
-        value of NUM_GA_ARGS.
+        value of NUM_GA_ARGS (optional arguments are
+        not counted) or an argument is given twice.
 
     Returns
     -------
@@ -49,8 +129,11 @@ def read_ga_input(ga_input_file):
                     if line[0] != ['']:
                         print(f"Warning: line - {line} - was ignored from the ga_input_file.")
                     continue
+                if line[0] in ga_input_dict:
+                    raise ValueError(f"Param given twice in ga input file: {line[0]}")
                 ga_input_dict[line[0]] = line[1]
-                num_args += 1
+                if line[0] not in OPTIONAL_GA_ARGS:
+                    num_args += 1
                 # go through each line and pull data and key
     except FileNotFoundError:
         raise FileNotFoundError("No such ga_input_file.")
@@ -78,6 +161,11 @@ def verify_ga_input(ga_input_dict):
         Incorrect type of argument. Expects
         float or integer.
 
+    Notes
+    -----
+    Any optional parameters that are missing are
+    added to ga_input_dict with their default values.
+
     Returns
     -------
     None
@@ -96,10 +184,12 @@ def verify_ga_input(ga_input_dict):
             assert key in ga_input_dict
         except AssertionError:
             raise ValueError(f"Param missing in ga input file: {key}. Check spelling/duplicates.")
+    for key, value in OPTIONAL_GA_ARGS.items():
+        ga_input_dict.setdefault(key, value)
     # make sure the inputs are of the correct format
     try:
         for key, value in ga_input_dict.items():
-            if not key.startswith('coef'):
+            if key not in FLOAT_GA_ARGS:
                 ga_input_dict[key] = int(value)
             else:
                 ga_input_dict[key] = float(value)
@@ -127,5 +217,53 @@ def verify_ga_input(ga_input_dict):
         assert ga_input_dict["coef_rmsd"] >= 0
         # t_size must be at least 2 (for 2 parents)
         assert 2 <= ga_input_dict["t_size"] <= ga_input_dict["num_filled"]
+        # num_workers
+        assert ga_input_dict["num_workers"] > 0
+        # worker_threads
+        assert ga_input_dict["worker_threads"] > 0
+        # worker_mem
+        assert ga_input_dict["worker_mem"] > 0
+        # num_pending (needs at least 2 workers, and room
+        # for the 2 children of a tournament)
+        if ga_input_dict["num_pending"]:
+            assert ga_input_dict["num_pending"] >= 2
+            assert ga_input_dict["num_workers"] > 1
+        # batch_size (cannot be used with num_pending)
+        assert ga_input_dict["batch_size"] >= 0
+        if ga_input_dict["batch_size"]:
+            assert not ga_input_dict["num_pending"]
+        # cache_size
+        assert ga_input_dict["cache_size"] >= 0
+        # energy_store
+        assert ga_input_dict["energy_store"] in (0, 1)
+        # stopping criteria
+        assert ga_input_dict["stag_mevs"] >= 0
+        assert ga_input_dict["stag_tol"] >= 0
+        assert 0 <= ga_input_dict["min_diversity"] < 1
+        assert ga_input_dict["target_fitness"] >= 0
+        assert ga_input_dict["max_evals"] >= 0
+        assert ga_input_dict["max_time"] >= 0
+        # checkpoints
+        assert ga_input_dict["checkpoint_mevs"] >= 0
+        assert ga_input_dict["checkpoint_time"] >= 0
+        assert ga_input_dict["resume"] in (0, 1)
+        # seeds
+        assert ga_input_dict["seed_input"] in (0, 1)
+        assert ga_input_dict["seed_job"] >= -1
+        # rotors
+        assert ga_input_dict["rotors"] in (0, 1)
+        # prescreen
+        assert ga_input_dict["ff_window"] >= 0
+        # clashes
+        assert 0 <= ga_input_dict["clash_scale"] < 1
+        # surrogate
+        assert ga_input_dict["surrogate"] in (0, 1)
+        assert ga_input_dict["surrogate_z"] >= 0
+        assert ga_input_dict["surrogate_std"] > 0
+        # refinement
+        assert ga_input_dict["refine_top"] > 0
+        assert ga_input_dict["refine_every"] >= 0
+        # scf guess
+        assert ga_input_dict["scf_guess"] >= 0
     except ValueError:
         raise ValueError("GA input values should be of integer or float type.")
@@ -5,13 +5,28 @@ number of mating events.
 
 """
 
+import os
 import sys
+import shutil
+import hashlib
+import tempfile
+from concurrent.futures import wait, FIRST_COMPLETED
+
+import numpy as np
 
 from kaplan.ga_input import read_ga_input, verify_ga_input
 from kaplan.mol_input import read_mol_input, verify_mol_input
+from kaplan.pmem import Pmem
 from kaplan.ring import Ring, RingEmptyError
-from kaplan.tournament import run_tournament
-from kaplan.output import run_output
+from kaplan.tournament import run_tournament, run_batch_tournaments, make_children
+from kaplan.output import run_output, read_conformers
+from kaplan.energy import make_pool, init_worker
+from kaplan.cache import EnergyCache, EnergyStore, get_store_file
+from kaplan.stopping import StoppingCriteria
+from kaplan.checkpoint import Checkpointer, get_checkpoint_file, load_checkpoint
+from kaplan.prescreen import ForceFieldScreen
+from kaplan.surrogate import EnergySurrogate
+from kaplan.refine import Refiner
 
 
 def run_kaplan(ga_input_file, mol_input_file):
@@ -29,6 +44,10 @@ def run_kaplan(ga_input_file, mol_input_file):
     ga_input_dict = read_ga_input(ga_input_file)
     verify_ga_input(ga_input_dict)
 
+    # criteria to stop before num_mevs (this also
+    # starts the clock for max_time)
+    stopping = StoppingCriteria.from_ga_input(ga_input_dict)
+
     # read in and verify mol_input_file
     # check that initial geometry converges
     # and construct a parser object
@@ -46,13 +65,250 @@ def run_kaplan(ga_input_file, mol_input_file):
                 ga_input_dict['fit_form'],
                 ga_input_dict['coef_energy'],
                 ga_input_dict['coef_rmsd'],
-                parser)
+                parser, ga_input_dict['rotors'])
+    # there may be fewer genes than num_atoms-3
+    if ga_input_dict['num_muts'] > ring.num_genes:
+        print(f"Warning: num_muts lowered to {ring.num_genes} (the number of genes).")
+        ga_input_dict['num_muts'] = ring.num_genes
+
+    # remember energies of geometries that have been seen
+    # (optionally saved to a file shared with other runs)
+    store = None
+    if ga_input_dict['energy_store']:
+        store = EnergyStore(get_store_file(),
+                            hashlib.sha1(ring.zmatrix.encode()).hexdigest())
+    if ga_input_dict['cache_size']:
+        ring.cache = EnergyCache(ga_input_dict['cache_size'], store)
+    else:
+        ring.cache = store
+
+    # skip energy calculations for atoms on top of each other
+    ring.clash_scale = ga_input_dict['clash_scale']
+
+    # reject children with high force field energies
+    # before their energies are calculated
+    if ga_input_dict['ff_window']:
+        ring.prescreen = ForceFieldScreen(ring.zmatrix, ga_input_dict['ff_window'])
+
+    # skip children that are predicted to be less fit
+    # than the pmems they would replace
+    if ga_input_dict['surrogate']:
+        ring.surrogate = EnergySurrogate(z=ga_input_dict['surrogate_z'],
+                                         max_std=ga_input_dict['surrogate_std'])
+
+    # evolve the ring at the screen level, and only calculate
+    # the energies of the fittest pmems at the qcm/basis level
+    if mol_input_dict['screen_qcm']:
+        ring.refiner = Refiner(parser.method, parser.basis, ga_input_dict['refine_top'],
+                               ga_input_dict['refine_every'])
+        parser.method = mol_input_dict['screen_qcm']
+        parser.basis = mol_input_dict['screen_basis']
+
+    # start the SCF of children from the orbitals of their
+    # parents (saved in a directory that all workers share)
+    orbital_dir = None
+    if ga_input_dict['scf_guess']:
+        orbital_dir = tempfile.mkdtemp(prefix="kaplan_orbitals_")
+        ring.scf_guess = ga_input_dict['scf_guess']
+
+    # share energy calculations between worker processes
+    # (or use the worker settings for this process)
+    worker_mem = f"{ga_input_dict['worker_mem']} GB"
+    if ga_input_dict['num_workers'] > 1:
+        ring.pool = make_pool(ga_input_dict['num_workers'], worker_mem,
+                              ga_input_dict['worker_threads'], orbital_dir)
+    else:
+        init_worker(worker_mem, ga_input_dict['worker_threads'], orbital_dir)
 
-    # fill ring with an initial population
-    ring.fill(ga_input_dict['num_filled'], 0)
+    # save the state of the run every so often
+    checkpoint = None
+    if ga_input_dict['checkpoint_mevs'] or ga_input_dict['checkpoint_time']:
+        checkpoint = Checkpointer(get_checkpoint_file(), ga_input_dict['checkpoint_mevs'],
+                                  60*ga_input_dict['checkpoint_time'])
 
-    # run the mevs
-    for mev in range(ga_input_dict['num_mevs']):
+    # time and energy calculations used by each phase
+    phases = {}
+    record_phase(phases, "setup", stopping, ring)
+
+    try:
+        # carry on from the last checkpoint, or fill
+        # ring with an initial population
+        start_mev = 0
+        if ga_input_dict['resume'] and os.path.isfile(get_checkpoint_file()):
+            start_mev = load_checkpoint(get_checkpoint_file(), ring, stopping) + 1
+            print(f"Resuming from mating event {start_mev}.")
+        else:
+            if ga_input_dict['resume']:
+                print("Warning: no checkpoint to resume from, starting a new run.")
+            ring.fill(ga_input_dict['num_filled'], 0, make_seeds(ring, ga_input_dict))
+        record_phase(phases, "fill", stopping, ring)
+
+        # run the mevs
+        if ga_input_dict['num_pending']:
+            last_mev = run_async_mevs(ring, ga_input_dict, stopping, checkpoint, start_mev)
+        elif ga_input_dict['batch_size']:
+            last_mev = run_batch_mevs(ring, ga_input_dict, stopping, checkpoint, start_mev)
+        else:
+            last_mev = run_mevs(ring, ga_input_dict, stopping, checkpoint, start_mev)
+        # so that a run stopped early (for example by
+        # max_time) can be resumed from where it stopped
+        if checkpoint is not None:
+            checkpoint.save(ring, last_mev, stopping)
+        record_phase(phases, "mating events", stopping, ring)
+
+        # rank the output at the qcm/basis level
+        if ring.refiner is not None:
+            ring.refiner.rerank(ring)
+            record_phase(phases, "refinement", stopping, ring)
+    finally:
+        if ring.pool is not None:
+            ring.pool.shutdown()
+            ring.pool = None
+        if store is not None:
+            store.close()
+        if orbital_dir is not None:
+            shutil.rmtree(orbital_dir, ignore_errors=True)
+
+    # run output
+    if stopping.reason is None:
+        run_stats = {"stop reason": "all mating events done"}
+    else:
+        run_stats = {"stop reason": stopping.reason,
+                     "stopped at mating event": stopping.mev}
+    for phase, (seconds, evals) in phases.items():
+        run_stats[f"{phase} time (s)"] = round(seconds, 2)
+        run_stats[f"{phase} energy calculations"] = evals
+    if stopping.max_time:
+        run_stats["time budget used"] = f"{100*stopping.elapsed()/stopping.max_time:.1f}%"
+    if stopping.max_evals:
+        run_stats["energy calculation budget used"] = \
+            f"{100*ring.num_evals/stopping.max_evals:.1f}%"
+    run_output(ring, run_stats)
+
+
+def make_seeds(ring, ga_input_dict):
+    """Get the conformers to start the ring from.
+
+    Parameters
+    ----------
+    ring : object
+        The Ring object.
+    ga_input_dict : dict
+        The verified genetic algorithm inputs. If
+        seed_input is 1, the input geometry is used.
+        If seed_job is not -1, the conformers from
+        kaplan_output/job_<seed_job> are used.
+
+    Raises
+    ------
+    ValueError
+        The conformers of the earlier job are not for
+        the same molecule (same atoms in the same order).
+
+    Returns
+    -------
+    seeds : np.ndarray(shape=(num_seeds, num_atoms-3))
+        The dihedral angles of the conformers (see Ring.fill).
+
+    """
+    seeds = []
+    if ga_input_dict['seed_input']:
+        seeds.append(ring.template.dihedrals)
+    if ga_input_dict['seed_job'] != -1:
+        for xyz in read_conformers(ga_input_dict['seed_job']):
+            if [atom[0] for atom in xyz] != ring.template.atoms:
+                raise ValueError(f"Conformers in job {ga_input_dict['seed_job']} are not "
+                                 "for the same molecule.")
+            seeds.append(ring.template.to_dihedrals([atom[1:] for atom in xyz]))
+    return np.array(seeds, float).reshape(-1, ring.num_atoms-3)
+
+
+def record_phase(phases, name, stopping, ring):
+    """Record the time and energy calculations used by a phase of the run.
+
+    Parameters
+    ----------
+    phases : dict
+        Maps the name of each phase that has finished
+        to (seconds, energy calculations). The phases
+        are assumed to run one after the other.
+    name : str
+        The name of the phase that just finished.
+    stopping : object
+        The StoppingCriteria (its clock is used).
+    ring : object
+        The Ring (its num_evals is used).
+
+    Returns
+    -------
+    None
+
+    """
+    seconds = stopping.elapsed() - sum(phase[0] for phase in phases.values())
+    evals = ring.num_evals - sum(phase[1] for phase in phases.values())
+    phases[name] = (seconds, evals)
+
+
+def finish_mev(ring, mev, stopping=None, checkpoint=None):
+    """Check whether to stop, and save a checkpoint if due.
+
+    Parameters
+    ----------
+    ring : object
+        The Ring object.
+    mev : int
+        The last mating event that was done.
+    stopping : object
+        StoppingCriteria (or None).
+    checkpoint : object
+        Checkpointer (or None).
+
+    Notes
+    -----
+    If the ring has a refiner, the fittest pmems are
+    refined first when it is due (see Refiner.update).
+
+    Returns
+    -------
+    bool
+        True if the run should stop.
+
+    """
+    if ring.refiner is not None:
+        ring.refiner.update(ring, mev)
+    stop = stopping is not None and stopping.check(ring, mev)
+    if checkpoint is not None:
+        checkpoint.update(ring, mev, stopping)
+    return stop
+
+
+def run_mevs(ring, ga_input_dict, stopping=None, checkpoint=None, start_mev=0):
+    """Run the mating events one tournament at a time.
+
+    Parameters
+    ----------
+    ring : object
+        The Ring object.
+    ga_input_dict : dict
+        The verified genetic algorithm inputs.
+    stopping : object
+        StoppingCriteria checked after each mating event.
+        Defaults to None (run all of the mating events).
+    checkpoint : object
+        Checkpointer updated after each mating event.
+        Defaults to None (no checkpoints).
+    start_mev : int
+        The first mating event to run (for example,
+        when resuming from a checkpoint). Defaults to 0.
+
+    Returns
+    -------
+    last_mev : int
+        The last mating event that was done.
+
+    """
+    last_mev = start_mev - 1
+    for mev in range(start_mev, ga_input_dict['num_mevs']):
         try:
             print(mev)
             run_tournament(ga_input_dict['t_size'],
@@ -61,9 +317,136 @@ def run_kaplan(ga_input_file, mol_input_file):
                            ring, mev)
         except RingEmptyError:
             ring.fill(ga_input_dict['num_filled'], mev)
+        last_mev = mev
+        if finish_mev(ring, mev, stopping, checkpoint):
+            break
+    return last_mev
 
-    # run output
-    run_output(ring)
+
+def run_batch_mevs(ring, ga_input_dict, stopping=None, checkpoint=None, start_mev=0):
+    """Run the mating events in batches of tournaments.
+
+    Parameters
+    ----------
+    ring : object
+        The Ring object.
+    ga_input_dict : dict
+        The verified genetic algorithm inputs. Each
+        batch runs batch_size tournaments (see
+        tournament.run_batch_tournaments).
+    stopping : object
+        StoppingCriteria checked after each batch.
+        Defaults to None (run all of the mating events).
+    checkpoint : object
+        Checkpointer updated after each batch.
+        Defaults to None (no checkpoints).
+    start_mev : int
+        See run_mevs.
+
+    Returns
+    -------
+    last_mev : int
+        The last mating event that was done.
+
+    """
+    last_mev = start_mev - 1
+    for mev in range(start_mev, ga_input_dict['num_mevs'], ga_input_dict['batch_size']):
+        print(mev)
+        num_tournaments = min(ga_input_dict['batch_size'], ga_input_dict['num_mevs'] - mev)
+        try:
+            run_batch_tournaments(num_tournaments,
+                                  ga_input_dict['t_size'],
+                                  ga_input_dict['num_muts'],
+                                  ga_input_dict['num_swaps'],
+                                  ring, mev)
+        except RingEmptyError:
+            ring.fill(ga_input_dict['num_filled'], mev)
+        last_mev = mev + num_tournaments - 1
+        if finish_mev(ring, last_mev, stopping, checkpoint):
+            break
+    return last_mev
+
+
+def run_async_mevs(ring, ga_input_dict, stopping=None, checkpoint=None, start_mev=0):
+    """Run the mating events without waiting for each fitness.
+
+    Parameters
+    ----------
+    ring : object
+        The Ring object, which must have a pool.
+    ga_input_dict : dict
+        The verified genetic algorithm inputs. Up to
+        num_pending children are evaluated at once.
+    stopping : object
+        StoppingCriteria checked each time children
+        are put in the ring. Once it says to stop, no
+        new children are made, but the children that
+        are being evaluated are still put in the ring.
+        Defaults to None (run all of the mating events).
+    checkpoint : object
+        Checkpointer updated each time children are
+        put in the ring. Defaults to None (no checkpoints).
+    start_mev : int
+        See run_mevs.
+
+    Notes
+    -----
+    This is a steady-state genetic algorithm where the
+    tournaments keep picking parents while the children
+    of earlier tournaments are still being evaluated.
+    Each child is put in the ring (near its parent) as
+    soon as all of its energies are done, so the pool
+    does not wait for the slowest geometry in a batch.
+    Parents are picked from the ring as it is at that
+    moment, so the results differ from the normal mode.
+    For the same reason, a checkpoint does not include
+    the children that are still being evaluated, so a
+    resumed run does not repeat the original run exactly.
+
+    Returns
+    -------
+    last_mev : int
+        The last mating event that was started.
+
+    """
+    # each job is [parent index, slot, submission]
+    jobs = []
+    mev = start_mev
+    num_mevs = ga_input_dict['num_mevs']
+    while mev < num_mevs or jobs:
+        # keep the pool busy with new children
+        while mev < num_mevs and len(jobs) + 2 <= ga_input_dict['num_pending']:
+            print(mev)
+            try:
+                parents, children = make_children(ga_input_dict['t_size'],
+                                                  ga_input_dict['num_muts'],
+                                                  ga_input_dict['num_swaps'],
+                                                  ring)
+            except RingEmptyError:
+                ring.fill(ga_input_dict['num_filled'], mev)
+                mev += 1
+                continue
+            parent_pmems = [ring[parents[0]], ring[parents[1]]]
+            for parent, child in zip(parents, children[::-1]):
+                child = Pmem(None, ring.num_geoms, ring.num_atoms, mev, child)
+                slot = ring.choose_slot(parent)
+                jobs.append([parent, slot, ring.submit(child, parent_pmems,
+                                                       ring.fitness[slot])])
+            mev += 1
+        if not jobs:
+            continue
+        # wait for at least one energy calculation to finish
+        futures = [future for job in jobs for future in job[2][-1]]
+        if futures:
+            wait(futures, return_when=FIRST_COMPLETED)
+        # put any children that are done in the ring
+        for job in [job for job in jobs if all(future.done() for future in job[2][-1])]:
+            jobs.remove(job)
+            ring.collect(job[2])
+            ring.place(job[0], job[2][0], job[1])
+        if mev < num_mevs and finish_mev(ring, mev - 1, stopping, checkpoint):
+            num_mevs = mev
+    return mev - 1
 
 
 if __name__ == "__main__":
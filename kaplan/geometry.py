@@ -1,17 +1,262 @@
 """This module is responsible for dealing with converting
 geometries from z-matrix format to xyz format. It relies
 on the external library, Vetee, to do most of the conversions,
-along with the python wrapper for openbabel, pybel."""
+along with the python wrapper for openbabel, pybel.
+Once a z-matrix template has been made, it is parsed
+into a ZMatrixTemplate, and new geometries are built
+directly from the internal coordinates using numpy
+(see zmatrix_to_coords)."""
+
+import numpy as np
 
 import vetee
 import openbabel
 import pybel
 
+# covalent radii (Angstroms) from Cordero et al., Dalton
+# Trans., 2008, 2832 (sp3 for carbon)
+COVALENT_RADII = {"H": 0.31, "He": 0.28, "Li": 1.28, "Be": 0.96, "B": 0.84,
+                  "C": 0.76, "N": 0.71, "O": 0.66, "F": 0.57, "Ne": 0.58,
+                  "Na": 1.66, "Mg": 1.41, "Al": 1.21, "Si": 1.11, "P": 1.07,
+                  "S": 1.05, "Cl": 1.02, "Ar": 1.06, "K": 2.03, "Ca": 1.76,
+                  "Ga": 1.22, "Ge": 1.20, "As": 1.19, "Se": 1.20, "Br": 1.20,
+                  "Kr": 1.16, "I": 1.39, "Xe": 1.40}
+# radius for atoms that are not in COVALENT_RADII
+DEFAULT_RADIUS = 1.5
+# two atoms clash if they are closer than this fraction
+# of the sum of their covalent radii
+CLASH_SCALE = 0.6
+# molecules with more atoms than this are checked for
+# clashes with a grid (see find_clashes)
+GRID_MIN_ATOMS = 150
+
 
 class GeometryError(Exception):
     """Error raises when one of the geometry functions fails."""
 
 
+class ZMatrixTemplate:
+    """A zmatrix that has been parsed once for reuse."""
+
+    def __init__(self, zmatrix):
+        """Constructor for the zmatrix template.
+
+        Parameters
+        ----------
+        zmatrix : str
+            The zmatrix (gzmat format), as generated
+            by get_zmatrix_template.
+
+        Attributes
+        ----------
+        atoms : list(str)
+            The atom types, in zmatrix order.
+        connectivity : np.ndarray(shape=(num_atoms, 3), dtype=int)
+            The reference atoms for each atom (see parse_zmatrix).
+        internals : np.ndarray(shape=(num_atoms, 3), dtype=float)
+            The bond lengths, angles and dihedrals from the
+            zmatrix (see parse_zmatrix).
+        dihedral_lines : list(int)
+            The line numbers of the dihedral variables,
+            one for each of the num_atoms-3 dihedrals.
+        dihedrals : np.ndarray(shape=num_atoms-3, dtype=float)
+            The dihedral angles (degrees) of the template
+            geometry (the input geometry).
+        num_genes : int
+            The number of values that the genetic algorithm
+            evolves for each geometry (see use_rotors).
+            Starts as num_atoms-3 (one for each dihedral).
+        gene_map : np.ndarray(shape=num_atoms-3, dtype=int)
+            The gene that sets each dihedral (-1 for
+            dihedrals kept at their template value). None
+            while each dihedral is its own gene.
+        gene_dihedrals : np.ndarray(shape=num_genes, dtype=int)
+            The dihedral whose value each gene is (None
+            while each dihedral is its own gene).
+        radii : np.ndarray(shape=num_atoms, dtype=float)
+            The covalent radius of each atom (see
+            find_clashes).
+
+        Notes
+        -----
+        Making a new zmatrix string (update) only replaces
+        the dihedral lines, and making new coordinates
+        (to_coords) does not use the zmatrix string at all.
+
+        """
+        self.zmatrix = zmatrix
+        self.atoms, self.connectivity, self.internals = parse_zmatrix(zmatrix)
+        self.num_atoms = len(self.atoms)
+        self.radii = np.array([COVALENT_RADII.get(atom.capitalize(), DEFAULT_RADIUS)
+                               for atom in self.atoms])
+        self.dihedrals = self.internals[3:, 2]
+        self._lines = zmatrix.split('\n')
+        self.dihedral_lines = [i for i, line in enumerate(self._lines)
+                               if line.startswith('d') and '=' in line]
+        self._prefixes = [self._lines[i][:self._lines[i].index('=')+1]
+                          for i in self.dihedral_lines]
+        if len(self.dihedral_lines) != max(self.num_atoms - 3, 0):
+            raise GeometryError("The zmatrix should have num_atoms-3 dihedral variables.")
+        self.num_genes = len(self.dihedrals)
+        self.gene_map = None
+        self.gene_dihedrals = None
+
+    def use_rotors(self, bonds):
+        """Only evolve the dihedrals about rotatable bonds.
+
+        Parameters
+        ----------
+        bonds : list(tuple(int, int))
+            The rotatable bonds (zero-based atom indices
+            in zmatrix order), as found by
+            get_rotatable_bonds.
+
+        Notes
+        -----
+        Each rotatable bond gets one gene. The dihedrals of
+        the atoms placed about the bond from the same
+        reference atoms turn together: the first of them
+        takes the value of the gene, and the others keep
+        their template offsets from it (so, for example,
+        the hydrogens of a methyl group stay 120 degrees
+        apart). Atoms placed from an atom that moves follow
+        it without a gene of their own. All of the other
+        dihedrals (hydrogens, ring atoms, double bonds) are
+        kept at their template values.
+
+        Returns
+        -------
+        num_genes : int
+            The number of genes (0 if none of the bonds
+            sets a dihedral of the zmatrix, in which case
+            each dihedral stays its own gene).
+
+        """
+        gene_map = find_rotor_dihedrals(self.connectivity, bonds)
+        if not np.any(gene_map >= 0):
+            return 0
+        self.gene_map = gene_map
+        self.gene_dihedrals = np.array([np.flatnonzero(gene_map == gene)[0]
+                                        for gene in range(gene_map.max() + 1)])
+        self.num_genes = len(self.gene_dihedrals)
+        return self.num_genes
+
+    def expand_genes(self, genes):
+        """Turn genes into dihedral angles.
+
+        Parameters
+        ----------
+        genes : np.ndarray(shape=(..., num_genes))
+            Any number of leading dimensions can be given
+            (see zmatrix_to_coords).
+
+        Returns
+        -------
+        dihedrals : np.ndarray(shape=(..., num_atoms-3))
+            The genes unchanged if each dihedral is its
+            own gene (see use_rotors).
+
+        """
+        if self.gene_map is None:
+            return genes
+        genes = np.asarray(genes)
+        dihedrals = np.empty(genes.shape[:-1] + self.dihedrals.shape, float)
+        dihedrals[...] = self.dihedrals
+        moved = self.gene_map >= 0
+        gene_map = self.gene_map[moved]
+        dihedrals[..., moved] += genes[..., gene_map] \
+            - self.dihedrals[self.gene_dihedrals[gene_map]]
+        return dihedrals % 360
+
+    def to_genes(self, dihedrals):
+        """Pick the genes out of a set of dihedral angles.
+
+        Parameters
+        ----------
+        dihedrals : np.ndarray(shape=(..., num_atoms-3))
+
+        Returns
+        -------
+        genes : np.ndarray(shape=(..., num_genes))
+            The reverse of expand_genes for the dihedrals
+            that have a gene.
+
+        """
+        if self.gene_map is None:
+            return dihedrals
+        return np.asarray(dihedrals)[..., self.gene_dihedrals]
+
+    def update(self, dihedrals):
+        """Make a new zmatrix with given dihedral angles.
+
+        Parameters
+        ----------
+        dihedrals : list(int)
+            The num_atoms-3 dihedrals to be combined
+            with the template geometry.
+
+        Returns
+        -------
+        zmatrix : str
+            Same output as update_zmatrix.
+
+        """
+        zmatrix_list = list(self._lines)
+        for line_num, prefix, dihedral in zip(self.dihedral_lines, self._prefixes, dihedrals):
+            zmatrix_list[line_num] = prefix + str(dihedral)
+        return '\n'.join(zmatrix_list)
+
+    def to_coords(self, dihedrals=None):
+        """Make cartesian coordinates with given dihedral angles.
+
+        Parameters
+        ----------
+        dihedrals : np.ndarray(shape=(..., num_atoms-3))
+            See zmatrix_to_coords. Defaults to None (use
+            the template dihedrals).
+
+        Returns
+        -------
+        coords : np.ndarray(shape=(..., num_atoms, 3), dtype=float)
+
+        """
+        return zmatrix_to_coords(self.connectivity, self.internals, dihedrals)
+
+    def to_xyz(self, dihedrals=None):
+        """Make xyz coordinates (with atom types) for one geometry.
+
+        Parameters
+        ----------
+        dihedrals : list(int)
+            The num_atoms-3 dihedrals for the geometry.
+            Defaults to None (use the template dihedrals).
+
+        Returns
+        -------
+        xyz : list(list(str, float, float, float))
+            Same format as the output of zmatrix_to_xyz.
+
+        """
+        return coords_to_xyz(self.atoms, self.to_coords(dihedrals))
+
+    def to_dihedrals(self, coords):
+        """Measure the zmatrix dihedral angles of a geometry.
+
+        Parameters
+        ----------
+        coords : np.ndarray(shape=(..., num_atoms, 3))
+            Cartesian coordinates, with the atoms in the
+            same order as the zmatrix.
+
+        Returns
+        -------
+        dihedrals : np.ndarray(shape=(..., num_atoms-3), dtype=float)
+            See coords_to_dihedrals.
+
+        """
+        return coords_to_dihedrals(self.connectivity, coords)
+
+
 def generate_parser(mol_input_dict):
     """Returns parser object (from vetee).
 
@@ -98,6 +343,72 @@ def get_zmatrix_template(parser):
     return zmatrix
 
 
+def get_rotatable_bonds(zmatrix):
+    """Find the rotatable bonds of a molecule.
+
+    Parameters
+    ----------
+    zmatrix : str
+        A zmatrix (gzmat format), as generated by
+        get_zmatrix_template.
+
+    Notes
+    -----
+    Uses openbabel's rotor rules: single bonds that are
+    not in a ring, between two atoms that each have
+    another heavy atom attached to them.
+
+    Returns
+    -------
+    bonds : list(tuple(int, int))
+        The zero-based indices (in zmatrix order) of the
+        two atoms of each rotatable bond.
+
+    """
+    mol = pybel.readstring("gzmat", zmatrix)
+    return [(bond.GetBeginAtomIdx()-1, bond.GetEndAtomIdx()-1)
+            for bond in openbabel.OBMolBondIter(mol.OBMol) if bond.IsRotor()]
+
+
+def find_rotor_dihedrals(connectivity, bonds):
+    """Match the dihedrals of a zmatrix to rotatable bonds.
+
+    Parameters
+    ----------
+    connectivity : np.ndarray(shape=(num_atoms, 3), dtype=int)
+        Reference atoms for each atom (see parse_zmatrix).
+    bonds : list(tuple(int, int))
+        The rotatable bonds (see get_rotatable_bonds).
+
+    Returns
+    -------
+    gene_map : np.ndarray(shape=num_atoms-3, dtype=int)
+        For each dihedral, the gene that turns it (-1 for
+        dihedrals that do not turn about a rotatable bond,
+        or that follow an atom that turns). Atoms placed
+        about the same bond, in the same direction, share
+        a gene if their dihedral reference atom was placed
+        before the first of them. Genes are numbered in
+        zmatrix order.
+
+    """
+    bonds = {frozenset(bond) for bond in bonds}
+    gene_map = np.full(max(len(connectivity) - 3, 0), -1, int)
+    # (bond_ref, angle_ref): (gene, first atom)
+    axes = {}
+    for atom in range(3, len(connectivity)):
+        bond_ref, angle_ref, dihedral_ref = connectivity[atom]
+        axis = (int(bond_ref), int(angle_ref))
+        if frozenset(axis) not in bonds:
+            continue
+        if axis not in axes:
+            axes[axis] = (len(axes), atom)
+        gene, first_atom = axes[axis]
+        if atom == first_atom or dihedral_ref < first_atom:
+            gene_map[atom-3] = gene
+    return gene_map
+
+
 def update_zmatrix(zmatrix, dihedrals):
     """Make a new zmatrix with given dihedral angles.
 
@@ -151,3 +462,288 @@ def zmatrix_to_xyz(zmatrix):
         xyz.append([vetee.gaussian_options.periodic_table(atom.atomicnum),
                     atom.coords[0], atom.coords[1], atom.coords[2]])
     return xyz
+
+
+def parse_zmatrix(zmatrix):
+    """Pull the atoms and internal coordinates out of a zmatrix.
+
+    Parameters
+    ----------
+    zmatrix : str
+        A zmatrix (gzmat format), as generated by
+        get_zmatrix_template.
+
+    Raises
+    ------
+    GeometryError
+        The zmatrix does not have a Variables section
+        or a variable is referenced but not defined.
+
+    Returns
+    -------
+    atoms : list(str)
+        The atom types, in zmatrix order.
+    connectivity : np.ndarray(shape=(num_atoms, 3), dtype=int)
+        For each atom, the (zero-based) indices of the
+        atoms used to define its bond length, bond angle
+        and dihedral angle. Unused references are -1.
+    internals : np.ndarray(shape=(num_atoms, 3), dtype=float)
+        For each atom, the bond length (Angstroms), the
+        bond angle (degrees) and the dihedral angle (degrees).
+        Unused values are 0.
+
+    """
+    zmatrix_list = zmatrix.split('\n')
+    try:
+        var_start = zmatrix_list.index('Variables:')
+    except ValueError:
+        raise GeometryError("The zmatrix has no Variables section.")
+    variables = {}
+    for line in zmatrix_list[var_start+1:]:
+        if '=' in line:
+            name, value = line.split('=')
+            variables[name.strip()] = float(value)
+    # the atom lines sit directly above the variables
+    # section (the line before them is the charge and
+    # multiplicity)
+    atom_start = var_start
+    while atom_start > 0:
+        line = zmatrix_list[atom_start-1].split()
+        if not line or not line[0].isalpha():
+            break
+        atom_start -= 1
+    atom_lines = zmatrix_list[atom_start:var_start]
+    atoms = []
+    connectivity = np.full((len(atom_lines), 3), -1, dtype=int)
+    internals = np.zeros((len(atom_lines), 3), dtype=float)
+    for i, line in enumerate(atom_lines):
+        line = line.split()
+        atoms.append(line[0])
+        # pairs of (reference atom, variable name)
+        for j in range(min(i, 3)):
+            connectivity[i][j] = int(line[2*j+1]) - 1
+            value = line[2*j+2]
+            try:
+                internals[i][j] = variables[value] if value in variables else float(value)
+            except ValueError:
+                raise GeometryError(f"Undefined zmatrix variable: {value}")
+    return atoms, connectivity, internals
+
+
+def zmatrix_to_coords(connectivity, internals, dihedrals=None):
+    """Make cartesian coordinates from internal coordinates.
+
+    Parameters
+    ----------
+    connectivity : np.ndarray(shape=(num_atoms, 3), dtype=int)
+        Reference atoms for each atom (see parse_zmatrix).
+    internals : np.ndarray(shape=(num_atoms, 3), dtype=float)
+        Bond lengths, bond angles and dihedral angles
+        for each atom (see parse_zmatrix).
+    dihedrals : np.ndarray(shape=(..., num_atoms-3))
+        The dihedral angles (degrees) to use in place of
+        those in internals. Any number of leading dimensions
+        can be given, for example (num_geoms, num_atoms-3)
+        for one pmem or (num_pmems, num_geoms, num_atoms-3)
+        for many pmems at once. Defaults to None (use the
+        dihedral angles from internals).
+
+    Notes
+    -----
+    The atoms are placed one at a time using the natural
+    extension reference frame (NeRF) method. The first atom
+    sits at the origin, the second on the z-axis and the
+    third in the xz-plane. This orientation is different
+    from the one that openbabel picks, which does not
+    change energies or rmsd values. Each atom is placed for
+    all of the geometries in the batch at the same time, so
+    the python loop runs num_atoms times per call.
+
+    Returns
+    -------
+    coords : np.ndarray(shape=(..., num_atoms, 3), dtype=float)
+        The cartesian coordinates (Angstroms) of each atom,
+        with the same leading dimensions as dihedrals.
+
+    """
+    internals = np.asarray(internals, dtype=float)
+    num_atoms = len(internals)
+    bonds = internals[:, 0]
+    angles = np.radians(internals[:, 1])
+    if dihedrals is None:
+        torsions = np.radians(internals[:, 2])
+    else:
+        dihedrals = np.asarray(dihedrals, dtype=float)
+        torsions = np.empty(dihedrals.shape[:-1] + (num_atoms,), dtype=float)
+        torsions[..., :3] = np.radians(internals[:3, 2])
+        torsions[..., 3:] = np.radians(dihedrals)
+    coords = np.zeros(torsions.shape + (3,), dtype=float)
+    if num_atoms > 1:
+        coords[..., 1, 2] = bonds[1]
+    for i in range(2, num_atoms):
+        bond_ref, angle_ref, dihedral_ref = connectivity[i]
+        pos_c = coords[..., bond_ref, :]
+        pos_b = coords[..., angle_ref, :]
+        if i == 2:
+            # no dihedral for the third atom, so make up
+            # a reference that puts it in the xz-plane
+            pos_a = pos_b + [1.0, 0.0, 0.0]
+        else:
+            pos_a = coords[..., dihedral_ref, :]
+        # local frame around the bond_ref atom
+        vec_bc = pos_c - pos_b
+        vec_bc /= np.linalg.norm(vec_bc, axis=-1, keepdims=True)
+        normal = np.cross(pos_b - pos_a, vec_bc)
+        normal /= np.linalg.norm(normal, axis=-1, keepdims=True)
+        in_plane = np.cross(normal, vec_bc)
+        sin_angle = np.sin(angles[i])
+        coords[..., i, :] = pos_c + bonds[i] * (
+            -np.cos(angles[i]) * vec_bc
+            + (sin_angle * np.cos(torsions[..., i]))[..., None] * in_plane
+            + (sin_angle * np.sin(torsions[..., i]))[..., None] * normal)
+    return coords
+
+
+def coords_to_dihedrals(connectivity, coords):
+    """Measure the dihedral angles of a zmatrix from cartesian coordinates.
+
+    Parameters
+    ----------
+    connectivity : np.ndarray(shape=(num_atoms, 3), dtype=int)
+        Reference atoms for each atom (see parse_zmatrix).
+    coords : np.ndarray(shape=(..., num_atoms, 3))
+        Cartesian coordinates, with the atoms in zmatrix
+        order. Any number of leading dimensions can be given.
+
+    Notes
+    -----
+    This is the reverse of zmatrix_to_coords for the
+    dihedral angles (the bond lengths and angles are
+    not measured). The dihedral angles do not depend on
+    how the molecule is placed, so coordinates from
+    other programs can be used.
+
+    Returns
+    -------
+    dihedrals : np.ndarray(shape=(..., num_atoms-3), dtype=float)
+        The dihedral angle (degrees, from 0 to 360) for
+        each atom after the third.
+
+    """
+    coords = np.asarray(coords, dtype=float)
+    connectivity = np.asarray(connectivity)
+    pos_a = coords[..., connectivity[3:, 2], :]
+    pos_b = coords[..., connectivity[3:, 1], :]
+    pos_c = coords[..., connectivity[3:, 0], :]
+    pos_d = coords[..., 3:, :]
+    vec_bc = pos_c - pos_b
+    vec_bc /= np.linalg.norm(vec_bc, axis=-1, keepdims=True)
+    # parts of the outer bonds at right angles to the b-c bond
+    vec_ba = pos_a - pos_b
+    vec_ba -= np.sum(vec_ba * vec_bc, axis=-1, keepdims=True) * vec_bc
+    vec_cd = pos_d - pos_c
+    vec_cd -= np.sum(vec_cd * vec_bc, axis=-1, keepdims=True) * vec_bc
+    x = np.sum(vec_ba * vec_cd, axis=-1)
+    y = np.sum(np.cross(vec_bc, vec_ba) * vec_cd, axis=-1)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+
+def find_clashes(coords, radii, scale=CLASH_SCALE):
+    """Find geometries that have atoms on top of each other.
+
+    Parameters
+    ----------
+    coords : np.ndarray(shape=(..., num_atoms, 3))
+        Cartesian coordinates (Angstroms) of any number
+        of geometries (see zmatrix_to_coords).
+    radii : np.ndarray(shape=num_atoms, dtype=float)
+        The covalent radius of each atom (for example,
+        ZMatrixTemplate.radii).
+    scale : float
+        Two atoms clash if they are closer than scale
+        times the sum of their covalent radii. Bonded
+        atoms are about 1 times the sum apart.
+
+    Notes
+    -----
+    Small molecules are checked by measuring every pair
+    of atoms in every geometry at once. Molecules with
+    more than GRID_MIN_ATOMS atoms are put on a grid
+    (see _find_grid_clash), so that only atoms in
+    neighbouring cells are measured.
+
+    Returns
+    -------
+    clashes : np.ndarray(shape=coords.shape[:-2], dtype=bool)
+        True for geometries with at least one clash.
+
+    """
+    coords = np.asarray(coords, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+    num_atoms = len(radii)
+    geoms = coords.reshape(-1, num_atoms, 3)
+    if num_atoms > GRID_MIN_ATOMS:
+        clashes = np.array([_find_grid_clash(geom, radii, scale) for geom in geoms], bool)
+    else:
+        first, second = np.triu_indices(num_atoms, 1)
+        limits = (scale * (radii[first] + radii[second]))**2
+        vectors = geoms[:, first] - geoms[:, second]
+        clashes = np.any(np.einsum('gpi,gpi->gp', vectors, vectors) < limits, axis=1)
+    return clashes.reshape(coords.shape[:-2])
+
+
+def _find_grid_clash(coords, radii, scale):
+    """Check one geometry for clashes using a grid (cell list).
+
+    The cells are as wide as the largest clash distance,
+    so atoms that clash are in the same cell or in one of
+    the 26 cells around it. The atoms are sorted by cell,
+    and the atoms in each neighbouring cell are found
+    with a binary search.
+
+    """
+    cutoff = scale * 2 * radii.max()
+    cells = np.floor((coords - coords.min(axis=0)) / cutoff).astype(int) + 1
+    # one number for each cell (with room for the
+    # neighbours of the cells on the edges)
+    shape = cells.max(axis=0) + 2
+    cell_ids = np.ravel_multi_index(cells.T, shape)
+    order = np.argsort(cell_ids)
+    sorted_ids = cell_ids[order]
+    for offset in np.ndindex(3, 3, 3):
+        neighbour_ids = np.ravel_multi_index((cells + np.array(offset) - 1).T, shape)
+        start = np.searchsorted(sorted_ids, neighbour_ids, side="left")
+        counts = np.searchsorted(sorted_ids, neighbour_ids, side="right") - start
+        if not counts.any():
+            continue
+        # every (atom, atom in the neighbouring cell) pair
+        first = np.repeat(np.arange(len(coords)), counts)
+        steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        second = order[np.repeat(start, counts) + steps]
+        keep = first < second
+        first, second = first[keep], second[keep]
+        vectors = coords[first] - coords[second]
+        limits = (scale * (radii[first] + radii[second]))**2
+        if np.any(np.einsum('pi,pi->p', vectors, vectors) < limits):
+            return True
+    return False
+
+
+def coords_to_xyz(atoms, coords):
+    """Combine atom types and cartesian coordinates.
+
+    Parameters
+    ----------
+    atoms : list(str)
+        The atom types.
+    coords : np.ndarray(shape=(num_atoms, 3), dtype=float)
+        The cartesian coordinates of each atom.
+
+    Returns
+    -------
+    xyz : list(list(str, float, float, float))
+        Same format as the output of zmatrix_to_xyz.
+
+    """
+    return [[atom, float(coord[0]), float(coord[1]), float(coord[2])]
+            for atom, coord in zip(atoms, coords)]
@@ -11,6 +11,17 @@ from kaplan.energy import prep_psi4_geom, run_energy_calc, check_psi4_inputs
 NUM_MOL_ARGS = 7
 NUM_GA_ARGS = 12
 
+# optional parameters and their default values
+# these are not counted in NUM_MOL_ARGS
+OPTIONAL_MOL_ARGS = {
+    # cheaper method and basis set to evolve the ring with
+    # (the qcm and basis are then only used for the fittest
+    # pmems, see the refine module); "" for the same as
+    # qcm/basis, and if both are "" there is no screen level
+    "screen_qcm": "",
+    "screen_basis": "",
+}
+
 
 def read_mol_input(mol_input_file):
     """Read in a mol input file.
@@ -29,7 +40,8 @@ def read_mol_input(mol_input_file):
         number of arguments is the same
         as the number of ga arguments -
         the order for the input files is
-        switched).
+        switched). Optional arguments are
+        not counted.
 
     Returns
     -------
@@ -52,7 +64,8 @@ def read_mol_input(mol_input_file):
                     print(f"Warning: line - {line} - was ignored from the mol_input_file.")
                     continue
                 mol_input_dict[line[0].lower()] = line[1]
-                num_args += 1
+                if line[0].lower() not in OPTIONAL_MOL_ARGS:
+                    num_args += 1
                 # go through each line and pull data and key
     except FileNotFoundError:
         raise FileNotFoundError("No such mol_input_file.")
@@ -71,6 +84,13 @@ def verify_mol_input(mol_input_dict):
     mol_input_dict : dict
         The information gathered from the input file.
 
+    Notes
+    -----
+    Any optional parameters that are missing are
+    added to mol_input_dict with their default values.
+    If only one of screen_qcm and screen_basis is
+    given, the other is set to qcm or basis.
+
     Returns
     -------
     parser : obj
@@ -89,6 +109,8 @@ def verify_mol_input(mol_input_dict):
             assert key in mol_input_dict
         except AssertionError:
             raise ValueError(f"Misspelled/incorrectly formatted mol input parameter: {key}.")
+    for key, value in OPTIONAL_MOL_ARGS.items():
+        mol_input_dict.setdefault(key, value)
     # convert all but smiles string to lowercase
     for key in mol_input_dict:
         if key != "struct_input":
@@ -107,6 +129,18 @@ def verify_mol_input(mol_input_dict):
         basis = mol_input_dict["basis"]
         method = mol_input_dict["qcm"]
         raise ValueError(f"Invalid basis set and/or method for psi4: {basis, method}")
+    # the screen level defaults to the qcm/basis level
+    if mol_input_dict["screen_qcm"] or mol_input_dict["screen_basis"]:
+        mol_input_dict["screen_qcm"] = mol_input_dict["screen_qcm"] or mol_input_dict["qcm"]
+        mol_input_dict["screen_basis"] = mol_input_dict["screen_basis"] or \
+            mol_input_dict["basis"]
+        try:
+            check_psi4_inputs(mol_input_dict["screen_qcm"], mol_input_dict["screen_basis"])
+        except ValueError:
+            basis = mol_input_dict["screen_basis"]
+            method = mol_input_dict["screen_qcm"]
+            raise ValueError(f"Invalid screen basis set and/or method for psi4: "
+                             f"{basis, method}")
     # make sure the inputs are of the correct format
     assert mol_input_dict['struct_type'] in ('smiles', 'com', 'xyz', 'glog', "name", "cid")
     # check the structure file exists (if applicable)
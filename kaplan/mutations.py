@@ -7,114 +7,148 @@ The swap takes two pmems as input and changes
 the location of a random number (between 0
 and num_swaps) of geometries. The generate
 children function calls both mutate and
-swap for two parent pmems.
+swap for two parent pmems (or for a batch of
+pairs of parents at once).
 NOTE:
 Might want to add another mutate function
 that changes the dihedral angle by +/- a set
 value (to avoid massive angular changes).
 """
 
-from random import sample, randint
-from copy import deepcopy
+import numpy as np
 
 # values for dihedral angles in degrees
 MIN_VALUE = 0
 MAX_VALUE = 360
+# random number generator used by default
+RNG = np.random.default_rng()
 
 
-def generate_children(parent1, parent2, num_muts, num_swaps):
+def generate_children(parent1, parent2, num_muts, num_swaps, rng=None):
     """Make some new pmems for the ring.
 
     Parameters
     ----------
-    parent1 : list(list(int))
-        list of lists of dihedral angles
-    parent2 : list(list(int))
-        list of lists of dihedral angles
+    parent1 : np.ndarray(shape=(..., num_geoms, num_atoms-3), dtype=int)
+        The dihedral angles of the first parent. Extra
+        leading dimensions are a batch of parents, for
+        example (num_pairs, num_geoms, num_atoms-3).
+    parent2 : np.ndarray(shape=(..., num_geoms, num_atoms-3), dtype=int)
+        The dihedral angles of the second parent(s).
     num_muts : int
         maximum number of mutations to perform
     num_swaps : int
         maximum number of swaps to perform
+    rng : np.random.Generator
+        The random number generator to draw from.
+        Defaults to RNG.
 
     Returns
     -------
     two new sets of dihedral angles with which
-    to make pmem objects (list(list(int))x2
+    to make pmem objects (np.ndarray x2, with the
+    same shape as the parents). The parents are
+    not changed.
 
     """
+    if rng is None:
+        rng = RNG
+    parent1 = np.asarray(parent1)
+    parent2 = np.asarray(parent2)
     # check parent sizes
-    assert len(parent1) == len(parent2)
+    assert parent1.shape == parent2.shape
     # check num_swaps
-    assert num_swaps <= len(parent1)
+    assert num_swaps <= parent1.shape[-2]
     # check num_muts
-    assert num_muts <= len(parent1[0])
-    child1 = deepcopy(parent1)
-    child2 = deepcopy(parent2)
-    child1, child2 = swap(child1, child2, num_swaps)
-    child1 = mutate(child1, num_muts)
-    child2 = mutate(child2, num_muts)
+    assert num_muts <= parent1.shape[-1]
+    child1, child2 = swap(parent1, parent2, num_swaps, rng)
+    child1 = mutate(child1, num_muts, rng)
+    child2 = mutate(child2, num_muts, rng)
     return child1, child2
 
 
-def mutate(dihedrals, num_muts):
-    """Mutate a list of dihedral angles.
+def choose_mask(shape, max_num, rng):
+    """Choose random places along the last axis of an array.
 
     Parameters
     ----------
-    dihedrals : list(list (int))
-        List of lists of dihedral angles to mutate.
+    shape : tuple(int)
+        The shape of the mask.
+    max_num : int
+        For each row (last axis) of the mask, between
+        0 and max_num places are chosen (each number
+        equally likely), without picking a place twice.
+    rng : np.random.Generator
+
+    Returns
+    -------
+    mask : np.ndarray(shape=shape, dtype=bool)
+        True at the chosen places.
+
+    """
+    num_chosen = rng.integers(0, max_num, size=shape[:-1], endpoint=True)
+    # the rank of each place in a random ordering of the row
+    ranks = rng.random(shape).argsort(axis=-1).argsort(axis=-1)
+    return ranks < num_chosen[..., np.newaxis]
+
+
+def mutate(dihedrals, num_muts, rng=None):
+    """Mutate a set of dihedral angles.
+
+    Parameters
+    ----------
+    dihedrals : np.ndarray(shape=(..., num_geoms, num_atoms-3), dtype=int)
+        Dihedral angles to mutate.
     num_muts : int
-        Maximum number of mutations to perform on list.
+        Maximum number of mutations to perform on
+        each geometry.
+    rng : np.random.Generator
+        Defaults to RNG.
 
     Returns
     -------
-    dihedrals : list(list (int))
-        Dihedral angles after mutations.
+    dihedrals : np.ndarray(shape=(..., num_geoms, num_atoms-3), dtype=int)
+        Dihedral angles after mutations (a new array).
 
     """
-    rng_geoms = range(len(dihedrals))
-    rng_dihedrals = range(len(dihedrals[0]))
-    for geom in rng_geoms:
-        # choose how many mutations to do
-        num_muts = randint(0, num_muts)
-        # choose where to do the mutations
-        mut_ind = sample(rng_dihedrals, num_muts)
-        for mut in mut_ind:
-            dihedrals[geom][mut] = randint(MIN_VALUE, MAX_VALUE-1)
-    return dihedrals
-
-
-def swap(child1, child2, num_swaps):
+    if rng is None:
+        rng = RNG
+    dihedrals = np.asarray(dihedrals)
+    mask = choose_mask(dihedrals.shape, num_muts, rng)
+    new_values = rng.integers(MIN_VALUE, MAX_VALUE, size=dihedrals.shape)
+    return np.where(mask, new_values, dihedrals)
+
+
+def swap(child1, child2, num_swaps, rng=None):
     """Swap geometries between two children.
 
     Parameters
     ----------
-    child1 : list
+    child1 : np.ndarray(shape=(..., num_geoms, num_atoms-3), dtype=int)
         [[dihedrals1], [dihedrals2],
         ..., [dihedralsn]]
         Where n is the number of geometries
         in the pmem.
-    child2 : list
+    child2 : np.ndarray(shape=(..., num_geoms, num_atoms-3), dtype=int)
         Same as child1, except for a different
         pmem.
     num_swaps : int
         Maximum number of swaps to do.
+    rng : np.random.Generator
+        Defaults to RNG.
 
     Returns
     -------
-    tuple of two list of lists
-    Each list of list represents
-    sets of dihedral angles.
+    tuple of two arrays (new arrays, with the same
+    shape as child1 and child2). A swapped geometry
+    keeps its index.
 
     """
-    # choose how many swaps to do
-    num_swaps = randint(0, num_swaps)
+    if rng is None:
+        rng = RNG
+    child1 = np.asarray(child1)
+    child2 = np.asarray(child2)
     # choose where to do the swaps
-    swap_ind = sample(range(len(child1)), num_swaps)
+    mask = choose_mask(child1.shape[:-1], num_swaps, rng)[..., np.newaxis]
     # apply swaps
-    for swp in swap_ind:
-        child1_value = child1[swp]
-        child1[swp] = child2[swp]
-        child2[swp] = child1_value
-    # return updated pmems
-    return child1, child2
+    return np.where(mask, child2, child1), np.where(mask, child1, child2)
@@ -25,9 +25,9 @@ written as comments below."""
 
 import os
 
+import numpy as np
 from vetee.xyz import Xyz
 
-from kaplan.geometry import update_zmatrix, zmatrix_to_xyz
 
 # OUTPUT_FORMAT = 'xyz'
 
@@ -86,34 +86,71 @@ def get_output_dir(loc="pwd"):
                 dir_nums.append(int(val[1]))
             except ValueError:
                 pass
-    new_dir = "job_" + str(max(dir_nums) + 1)
+    # kaplan_output might exist without any jobs
+    # (for example, if it only has the energy store)
+    new_dir = "job_" + str(max(dir_nums, default=-1) + 1)
     output_dir = os.path.join(output_dir, new_dir)
     os.mkdir(output_dir)
     return output_dir
 
 
-def run_output(ring):
+def read_conformers(job_num, loc="pwd"):
+    """Read the conformers written by an earlier job.
+
+    Parameters
+    ----------
+    job_num : int
+        The number of the job (kaplan_output/job_<job_num>).
+    loc : str
+        See get_output_dir. Only "pwd" is
+        available at the moment.
+
+    Raises
+    ------
+    FileNotFoundError
+        The job directory does not exist.
+
+    Returns
+    -------
+    conformers : list(list(list(str, float, float, float)))
+        The xyz coordinates (with atom types) from each
+        conf<n>.xyz file in the job directory, in order
+        of n.
+
+    """
+    assert loc == "pwd"
+    job_dir = os.path.join(os.getcwd(), "kaplan_output", f"job_{job_num}")
+    if not os.path.isdir(job_dir):
+        raise FileNotFoundError(f"No output directory for job {job_num}.")
+    conf_nums = []
+    for val in os.scandir(job_dir):
+        name, ext = os.path.splitext(val.name)
+        if ext == ".xyz" and name.startswith("conf") and name[4:].isdigit():
+            conf_nums.append(int(name[4:]))
+    return [Xyz(os.path.join(job_dir, f"conf{num}.xyz")).coords
+            for num in sorted(conf_nums)]
+
+
+def run_output(ring, run_stats=None):
     """Run the output module.
 
     Parameters
     ----------
     ring : object
        The final ring data structure after evolution.
+    run_stats : dict
+       Extra information about the run (for example, why
+       it stopped) to write to the stats file. Each item
+       is written as "key: value". Defaults to None.
 
     """
     # find average fitness
     # find best pmem and its ring index
-    total_fit = 0
-    best_pmem = 0
-    best_fit = 0
-    for pmem in ring.pmems:
-        if pmem is not None:
-            fitg = pmem.fitness
-            total_fit += fitg
-            if fitg > best_fit:
-                best_pmem = pmem.ring_loc
-                best_fit = fitg
-    average_fit = total_fit / ring.num_filled
+    filled = np.flatnonzero(ring.occupied)
+    fit_vals = ring.fitness[filled]
+    average_fit = np.nanmean(fit_vals)
+    best_pmem = int(filled[np.nanargmax(fit_vals)])
+    best_fit = np.nanmax(fit_vals)
 
     # generate and get output directory
     output_dir = get_output_dir()
@@ -124,10 +161,42 @@ def run_output(ring):
         fout.write(f"average fitness: {average_fit}\n")
         fout.write(f"best fitness: {best_fit}\n")
         fout.write(f"final percent filled: {100*ring.num_filled/ring.num_slots}%\n")
+        fout.write(f"energy calculations: {ring.num_evals}\n")
+        fout.write(f"pmems already evaluated: {ring.num_known}\n")
+        fout.write(f"clones not added: {ring.num_clones}\n")
+        fout.write(f"geometries with clashing atoms: {ring.num_clashes}\n")
+        if ring.prescreen is not None:
+            fout.write(f"children rejected by the {ring.prescreen.forcefield} prescreen: "
+                       f"{ring.num_rejected}\n")
+        if ring.surrogate is not None:
+            surrogate = ring.surrogate
+            fout.write(f"children skipped by the surrogate: {ring.num_skipped}\n")
+            fout.write(f"surrogate training energies: {len(surrogate)}\n")
+            fout.write(f"surrogate predictions checked: {surrogate.num_predicted}\n")
+            fout.write(f"surrogate mean absolute error (hartrees): "
+                       f"{surrogate.mean_abs_error()}\n")
+            if surrogate.num_predicted:
+                fout.write(f"surrogate errors within 2 standard deviations: "
+                           f"{100*surrogate.num_within/surrogate.num_predicted:.1f}%\n")
+        if ring.refiner is not None:
+            fout.write(f"fitness level: {ring.refiner.method}/{ring.refiner.basis}\n")
+            fout.write(f"refined pmems: {len(ring.refiner.refined)}\n")
+            fout.write(f"energy calculations at that level: {ring.refiner.num_evals}\n")
+        if ring.cache is not None:
+            fout.write(f"energy cache hits: {ring.cache.hits}\n")
+            fout.write(f"energy cache misses: {ring.cache.misses}\n")
+            store = getattr(ring.cache, "store", None)
+            if store is not None:
+                fout.write(f"energy store hits: {store.hits}\n")
+                fout.write(f"energy store misses: {store.misses}\n")
+        if run_stats is not None:
+            for key, value in run_stats.items():
+                fout.write(f"{key}: {value}\n")
 
     # generate the output file for the best pmem
     for geom in range(ring.num_geoms):
-        xyz_coords = zmatrix_to_xyz(update_zmatrix(ring.zmatrix, ring[best_pmem].dihedrals[geom]))
+        xyz_coords = ring.template.to_xyz(
+            ring.template.expand_genes(ring[best_pmem].dihedrals[geom]))
         xyz = Xyz()
         xyz.coords = xyz_coords
         xyz.num_atoms = ring.num_atoms
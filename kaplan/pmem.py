@@ -19,7 +19,8 @@ class Pmem:
         Parameters
         ----------
         ring_loc : int
-            Index of the ring where the pmem lives.
+            Index of the ring where the pmem lives
+            (None if it is not in the ring yet).
         num_geoms : int
             How many conformers we are trying to find.
         num_atoms : int
@@ -37,6 +38,18 @@ class Pmem:
                              dtype=int)
             List of integers representing the dihedral angles
             connecting the molecule under optimisation.
+        energies : np.array(shape=num_geoms, dtype=float)
+            The energy of each geometry. None until the
+            pmem is evaluated by the ring.
+        coords : np.array(shape=(num_geoms, num_atoms, 3), dtype=float)
+            The cartesian coordinates of each geometry.
+            None until the pmem is evaluated by the ring.
+        rmsds : np.array(shape=(num_geoms, num_geoms), dtype=float)
+            The rmsd between each pair of geometries.
+            None until the pmem is evaluated by the ring.
+        ff_energies : np.array(shape=num_geoms, dtype=float)
+            The force field energy of each geometry. None
+            unless the ring has a prescreen.
 
         Notes
         -----
@@ -55,4 +68,116 @@ class Pmem:
         else:
             self.dihedrals = dihedrals
         self.fitness = None
+        self.energies = None
+        self.coords = None
+        self.rmsds = None
+        self.ff_energies = None
         self.birthday = current_mev
+
+
+class PmemView(Pmem):
+    """A pmem that lives in a slot of the ring.
+
+    The ring keeps the data of all of its pmems in
+    contiguous arrays (one row per slot). A PmemView
+    has the same attributes as a Pmem, but reads and
+    writes them in the ring's arrays, so it can be used
+    wherever a Pmem is expected.
+
+    Note
+    ----
+    The view belongs to the slot, not to the pmem. If
+    the pmem in the slot is replaced, the view shows
+    the new pmem.
+
+    """
+
+    def __init__(self, ring, ring_loc):
+        """Constructor for the pmem view.
+
+        Parameters
+        ----------
+        ring : object
+            The Ring that holds the pmem data.
+        ring_loc : int
+            The slot of the ring to look at.
+
+        """
+        # Pmem.__init__ is not called, all of the
+        # attributes are kept by the ring
+        self._ring = ring
+        self._ring_loc = ring_loc
+
+    @property
+    def ring_loc(self):
+        """The slot of the ring (cannot be changed)."""
+        return self._ring_loc
+
+    @property
+    def dihedrals(self):
+        """A view of the ring's dihedrals for this slot."""
+        return self._ring.dihedrals[self._ring_loc]
+
+    @dihedrals.setter
+    def dihedrals(self, value):
+        self._ring.dihedrals[self._ring_loc] = value
+
+    @property
+    def fitness(self):
+        """The fitness (None if it has not been calculated)."""
+        fitness = self._ring.fitness[self._ring_loc]
+        return None if np.isnan(fitness) else float(fitness)
+
+    @fitness.setter
+    def fitness(self, value):
+        self._ring.fitness[self._ring_loc] = np.nan if value is None else value
+
+    @property
+    def birthday(self):
+        """The mating event at which the pmem was made."""
+        return int(self._ring.birthdays[self._ring_loc])
+
+    @birthday.setter
+    def birthday(self, value):
+        self._ring.birthdays[self._ring_loc] = value
+
+    @property
+    def energies(self):
+        """Energies of the geometries (None until evaluated)."""
+        energies = self._ring.energies[self._ring_loc]
+        return None if np.isnan(energies).any() else energies
+
+    @energies.setter
+    def energies(self, value):
+        self._ring.energies[self._ring_loc] = np.nan if value is None else value
+
+    @property
+    def coords(self):
+        """Cartesian coordinates (None until evaluated)."""
+        if self.energies is None:
+            return None
+        return self._ring.coords[self._ring_loc]
+
+    @coords.setter
+    def coords(self, value):
+        self._ring.coords[self._ring_loc] = 0.0 if value is None else value
+
+    @property
+    def rmsds(self):
+        """Pairwise rmsd values (None until evaluated)."""
+        rmsds = self._ring.rmsds[self._ring_loc]
+        return None if np.isnan(rmsds).any() else rmsds
+
+    @rmsds.setter
+    def rmsds(self, value):
+        self._ring.rmsds[self._ring_loc] = np.nan if value is None else value
+
+    @property
+    def ff_energies(self):
+        """Force field energies (None without a prescreen)."""
+        ff_energies = self._ring.ff_energies[self._ring_loc]
+        return None if np.isnan(ff_energies).any() else ff_energies
+
+    @ff_energies.setter
+    def ff_energies(self, value):
+        self._ring.ff_energies[self._ring_loc] = np.nan if value is None else value
@@ -0,0 +1,115 @@
+"""This module screens new geometries with a force
+field before their (much more expensive) quantum
+chemical energies are calculated. The force fields
+come from openbabel: MMFF94 is used when it can be
+set up for the molecule, and UFF otherwise.
+
+A child whose geometries have a force field energy
+far above the lowest one in the ring (for example,
+because two atoms are on top of each other) is
+rejected without running psi4."""
+
+import numpy as np
+
+import openbabel
+import pybel
+
+# force fields to try, in order
+FORCEFIELDS = ("MMFF94", "UFF")
+# kJ/mol in one kcal/mol
+KJ_PER_KCAL = 4.184
+
+
+class ForceFieldScreen:
+    """Force field energies of geometries from a zmatrix template."""
+
+    def __init__(self, zmatrix, window):
+        """Constructor for the force field screen.
+
+        Parameters
+        ----------
+        zmatrix : str
+            The zmatrix (gzmat format) of the molecule
+            (see geometry.get_zmatrix_template). The atoms
+            of the geometries to screen must be in the same
+            order.
+        window : float
+            A geometry is rejected if its force field energy
+            is more than window (kcal/mol) above the lowest
+            force field energy in the ring.
+
+        Raises
+        ------
+        ValueError
+            None of the FORCEFIELDS can be set up for the
+            molecule.
+
+        Attributes
+        ----------
+        forcefield : str
+            The name of the force field that is used.
+
+        """
+        self.window = window
+        self._obmol = pybel.readstring("gzmat", zmatrix).OBMol
+        self._atoms = list(openbabel.OBMolAtomIter(self._obmol))
+        for name in FORCEFIELDS:
+            self._ff = openbabel.OBForceField.FindForceField(name)
+            if self._ff is not None and self._ff.Setup(self._obmol):
+                self.forcefield = name
+                break
+        else:
+            raise ValueError("Unable to set up a force field for the molecule.")
+        self._scale = 1/KJ_PER_KCAL if self._ff.GetUnit() == "kJ/mol" else 1.0
+
+    def calc_energies(self, coords):
+        """Calculate force field energies.
+
+        Parameters
+        ----------
+        coords : np.ndarray(shape=(..., num_atoms, 3))
+            Cartesian coordinates (Angstroms) of any
+            number of geometries.
+
+        Returns
+        -------
+        energies : np.ndarray(shape=coords.shape[:-2], dtype=float)
+            The force field energy (kcal/mol) of each geometry.
+
+        """
+        coords = np.asarray(coords, float)
+        geoms = coords.reshape(-1, len(self._atoms), 3)
+        energies = np.empty(len(geoms))
+        for i, geom in enumerate(geoms):
+            for atom, (x, y, z) in zip(self._atoms, geom.tolist()):
+                atom.SetVector(x, y, z)
+            self._ff.SetCoordinates(self._obmol)
+            energies[i] = self._ff.Energy(False) * self._scale
+        return energies.reshape(coords.shape[:-2])
+
+    def reject(self, energies, ring_energies):
+        """Decide which pmems to reject.
+
+        Parameters
+        ----------
+        energies : np.ndarray(shape=(num_pmems, num_geoms))
+            The force field energies of the new pmems
+            (nan for geometries that were not screened).
+        ring_energies : np.ndarray
+            The force field energies of the geometries
+            of the pmems in the ring (nan for geometries
+            that were not screened).
+
+        Returns
+        -------
+        rejected : np.ndarray(shape=num_pmems, dtype=bool)
+            True for pmems with a geometry more than window
+            above the lowest energy in the ring. Nothing is
+            rejected if the ring has no energies yet.
+
+        """
+        energies = np.asarray(energies, float)
+        if np.isnan(ring_energies).all():
+            return np.zeros(len(energies), bool)
+        limit = np.nanmin(ring_energies) + self.window
+        return np.any(np.nan_to_num(energies, nan=-np.inf) > limit, axis=-1)
@@ -0,0 +1,191 @@
+"""This module calculates the energies of the fittest
+pmems again at a higher level of theory.
+
+In the multi-fidelity mode (screen_qcm and/or
+screen_basis in the mol input file), the ring is evolved
+with a cheap method and basis set, so that the many
+conformers that are replaced a few mating events later
+only ever get cheap energies. Every so often, and once
+more at the end of the run, the fittest pmems in the ring
+have their energies calculated with the qcm and basis of
+the mol input file (the target level), and the output is
+ranked by the fitness at that level."""
+
+import numpy as np
+
+from kaplan.pmem import Pmem
+from kaplan.ring import Ring
+from kaplan.fitg import calc_energies, calc_rmsds, calc_fitness
+from kaplan.geometry import coords_to_xyz
+
+
+class Refiner:
+    """Keeps the fittest pmems with energies at the target level."""
+
+    def __init__(self, method, basis, num_top, every_mevs=0):
+        """Constructor for the refiner.
+
+        Parameters
+        ----------
+        method : str
+            The method for the target level.
+        basis : str
+            The basis set for the target level.
+        num_top : int
+            How many of the fittest pmems in the ring
+            are refined each time.
+        every_mevs : int
+            Refine the fittest pmems every this many
+            mating events (see update). Defaults to 0
+            (only at the end of the run, see rerank).
+
+        Attributes
+        ----------
+        refined : dict(bytes, object)
+            A Pmem for each refined pmem, with its energies
+            and fitness at the target level, keyed by
+            Ring.genotype_key (so no pmem is refined twice).
+            Refined pmems are kept after they leave the ring.
+        num_evals : int
+            Number of energy calculations run at the target
+            level (energies from the cache are not counted).
+        last_mev : int
+            The last mating event that update was called for.
+
+        """
+        self.method = method
+        self.basis = basis
+        self.num_top = num_top
+        self.every_mevs = every_mevs
+        self.refined = {}
+        self.num_evals = 0
+        self.last_mev = -1
+
+    def update(self, ring, mev):
+        """Refine the fittest pmems if it is due.
+
+        Parameters
+        ----------
+        ring : object
+            The Ring object.
+        mev : int
+            The last mating event that was done.
+
+        Returns
+        -------
+        bool
+            True if refining was due (once every every_mevs
+            mating events, even if the mating events are
+            done in batches).
+
+        """
+        due = self.every_mevs and \
+            (mev + 1) // self.every_mevs > (self.last_mev + 1) // self.every_mevs
+        self.last_mev = mev
+        if not due:
+            return False
+        self.refine(ring)
+        return True
+
+    def refine(self, ring):
+        """Calculate the target level energies of the fittest pmems.
+
+        Parameters
+        ----------
+        ring : object
+            The Ring object. The energies of the num_top
+            fittest pmems (that are not refined already)
+            are calculated together, on the ring's pool if
+            it has one, and with the ring's cache. They are
+            also counted in the ring's num_evals. The ring
+            itself is not changed.
+
+        Returns
+        -------
+        num_refined : int
+            The number of pmems that were refined.
+
+        """
+        filled = ring.filled_slots
+        top = filled[np.argsort(-ring.fitness[filled], kind="stable")[:self.num_top]]
+        slots = [slot for slot in top
+                 if Ring.genotype_key(ring.dihedrals[slot]) not in self.refined]
+        if not slots:
+            return 0
+        dihedrals = ring.dihedrals[slots]
+        coords = ring.get_coords(dihedrals)
+        xyz_coords = [coords_to_xyz(ring.template.atoms, geom)
+                      for geom in coords.reshape(-1, ring.num_atoms, 3)]
+        misses = getattr(ring.cache, "misses", 0)
+        energies = calc_energies(xyz_coords, ring.parser.charge, ring.parser.multip,
+                                 self.method, self.basis, ring.pool, ring.cache,
+                                 dihedrals.reshape(-1, ring.num_genes))
+        num_evals = len(xyz_coords) if ring.cache is None else ring.cache.misses - misses
+        self.num_evals += num_evals
+        ring.num_evals += num_evals
+        energies = energies.reshape(len(slots), ring.num_geoms)
+        for i, slot in enumerate(slots):
+            pmem = Pmem(None, ring.num_geoms, ring.num_atoms, int(ring.birthdays[slot]),
+                        dihedrals[i])
+            pmem.coords = coords[i]
+            pmem.energies = energies[i]
+            # the rmsds do not depend on the level of theory
+            pmem.rmsds = calc_rmsds(coords[i], ring.rmsds[slot])
+            rmsd = pmem.rmsds[np.triu_indices(ring.num_geoms, 1)].sum()
+            pmem.fitness = calc_fitness(ring.fit_form, abs(sum(energies[i])),
+                                        ring.coef_energy, rmsd, ring.coef_rmsd)
+            self.refined[Ring.genotype_key(pmem.dihedrals)] = pmem
+        return len(slots)
+
+    def rerank(self, ring):
+        """Refine the fittest pmems and put the refined pmems in the ring.
+
+        Parameters
+        ----------
+        ring : object
+            The Ring object. After the num_top fittest pmems
+            are refined, the ring is emptied and filled with
+            the refined pmems (up to num_slots of them), from
+            the fittest at the target level in slot 0, so
+            that the output is for the target level. This
+            should only be done at the end of the run.
+
+        Returns
+        -------
+        None
+
+        """
+        self.refine(ring)
+        ranked = sorted(self.refined.values(), key=lambda pmem: pmem.fitness,
+                        reverse=True)[:ring.num_slots]
+        for slot in ring.filled_slots.tolist():
+            ring[slot] = None
+        for slot, pmem in enumerate(ranked):
+            pmem.ring_loc = slot
+            ring[slot] = pmem
+
+    def get_state(self):
+        """The refined pmems and counters (see set_state)."""
+        pmems = list(self.refined.values())
+        return {"refined_dihedrals": np.array([pmem.dihedrals for pmem in pmems], int),
+                "refined_birthdays": np.array([pmem.birthday for pmem in pmems], int),
+                "refined_energies": np.array([pmem.energies for pmem in pmems], float),
+                "refined_coords": np.array([pmem.coords for pmem in pmems], float),
+                "refined_rmsds": np.array([pmem.rmsds for pmem in pmems], float),
+                "refined_fitness": np.array([pmem.fitness for pmem in pmems], float),
+                "refiner_counters": np.array([self.num_evals, self.last_mev])}
+
+    def set_state(self, state):
+        """Restore the output of get_state."""
+        self.refined = {}
+        for dihedrals, birthday, energies, coords, rmsds, fitness in zip(
+                state["refined_dihedrals"], state["refined_birthdays"],
+                state["refined_energies"], state["refined_coords"], state["refined_rmsds"],
+                state["refined_fitness"]):
+            pmem = Pmem(None, len(dihedrals), coords.shape[1], int(birthday), dihedrals)
+            pmem.energies = energies
+            pmem.coords = coords
+            pmem.rmsds = rmsds
+            pmem.fitness = float(fitness)
+            self.refined[Ring.genotype_key(dihedrals)] = pmem
+        self.num_evals, self.last_mev = (int(c) for c in state["refiner_counters"])
@@ -30,12 +30,22 @@ Important information that this object will contain:
 """
 
 from random import choice
+from itertools import compress
+from collections import Counter
 
 import numpy as np
 
-from kaplan.pmem import Pmem
-from kaplan.fitg import sum_energies, sum_rmsds, calc_fitness
-from kaplan.geometry import get_zmatrix_template, update_zmatrix, zmatrix_to_xyz
+from kaplan.pmem import Pmem, PmemView, MIN_VALUE, MAX_VALUE
+from kaplan.cache import EnergyCache
+from kaplan.fitg import calc_energies, submit_energies, calc_rmsds, calc_fitness,\
+                        failed_to_penalty, FAILED_ENERGY
+from kaplan.geometry import get_zmatrix_template, get_rotatable_bonds, coords_to_xyz,\
+                            ZMatrixTemplate, find_clashes, CLASH_SCALE
+
+# energy (hartrees) given to geometries with clashing atoms,
+# the same as for an energy calculation that fails (see
+# fitg.FAILED_ENERGY)
+CLASH_ENERGY = FAILED_ENERGY
 
 
 class RingEmptyError(Exception):
@@ -59,7 +69,7 @@ class Ring:
 
     def __init__(self, num_geoms, num_atoms, num_slots,
                  pmem_dist, fit_form, coef_energy, coef_rmsd,
-                 parser):
+                 parser, rotors=False):
         """Constructor for ring data structure.
 
         Parameters
@@ -90,6 +100,12 @@ class Ring:
             The parser object from Vetee that contains
             information about molecular structure and
             energy calculations.
+        rotors : bool
+            If True, only the dihedrals about rotatable
+            bonds are evolved, and the rest are kept at
+            their values in the input geometry (see
+            ZMatrixTemplate.use_rotors). Defaults to False
+            (evolve every dihedral).
 
         Parameters
         ----------
@@ -99,13 +115,115 @@ class Ring:
             num_slots value. This variable is dynamic and
             changes depending on how many slots are currently
             filled in on the ring. Starts with a value of 0.
+        occupied : np.ndarray(shape=num_slots, dtype=bool)
+            True for the slots that have a pmem in them.
+        filled_slots : np.ndarray(dtype=int)
+            The indices of the slots that have a pmem in
+            them (in no particular order). Kept up to date
+            as pmems are added and removed, so that pmems
+            can be sampled without searching the ring.
+        num_genes : int
+            The number of genes (dihedral angles that are
+            evolved) for each geometry. This is num_atoms-3
+            unless rotors is True.
+        dihedrals : np.ndarray(shape=(num_slots, num_geoms, num_genes),
+                               dtype=int)
+            The genes (dihedral angles) of the pmem in each
+            slot. The template turns them into the
+            num_atoms-3 dihedrals of the zmatrix.
+        fitness : np.ndarray(shape=num_slots, dtype=float)
+            The fitness of the pmem in each slot (nan for
+            empty slots and pmems that are not evaluated).
+        birthdays : np.ndarray(shape=num_slots, dtype=int)
+            The mating event at which the pmem in each slot
+            was made (-1 for empty slots).
+        energies : np.ndarray(shape=(num_slots, num_geoms))
+            The energy of each geometry of each pmem.
+        coords : np.ndarray(shape=(num_slots, num_geoms, num_atoms, 3))
+            The cartesian coordinates of each geometry.
+        rmsds : np.ndarray(shape=(num_slots, num_geoms, num_geoms))
+            The pairwise rmsd values of each pmem.
+        ff_energies : np.ndarray(shape=(num_slots, num_geoms))
+            The force field energy of each geometry (nan
+            if there is no prescreen).
         pmems : np.ndarray(dtype=object)
-            The list of pmem objects that are contained
-            within the ring.
+            A PmemView for each filled slot (None for
+            empty slots). Made each time it is used; the
+            arrays above hold the data.
+        pool : concurrent.futures.Executor
+            Used to run energy calculations at the same
+            time (see energy.make_pool). Starts as None
+            (run calculations one after the other).
+        cache : object
+            An EnergyCache, so that each geometry's energy
+            is only calculated once. Can be set to None to
+            calculate every energy.
         zmatrix : str
             The original zmatrix specification (gzmat format)
             from the input geometry. Generated using geometry
             module (which uses openbabel).
+        template : object
+            The zmatrix parsed into a ZMatrixTemplate.
+            Used with the pmem dihedrals to build
+            cartesian coordinates.
+        genotypes : dict
+            The fitness, energies and rmsds of every set of
+            dihedral angles that has been evaluated (see
+            genotype_key), so that the same pmem is never
+            evaluated twice. The energies and rmsds are for
+            the geometries in the order of the key (see
+            _recall). Can be set to None to evaluate every
+            pmem.
+        rejected_genotypes : set(bytes)
+            The genotype_key of every pmem rejected by the
+            prescreen, so that it is rejected again without
+            its force field energies. These pmems are only
+            rejected when they are screened (see _recall).
+        num_known : int
+            Number of pmems whose fitness was found in
+            genotypes instead of being calculated.
+        num_clones : int
+            Number of children that were not added to the
+            ring because the same pmem was already there.
+        num_evals : int
+            Number of energy calculations that have been
+            run (or sent to the pool). Energies taken from
+            the cache are not counted.
+        prescreen : object
+            A ForceFieldScreen that rejects children with
+            high force field energies before their energies
+            are calculated (see evaluate_pmems). Starts as
+            None (no prescreen).
+        num_rejected : int
+            Number of children rejected by the prescreen.
+        clash_scale : float
+            Geometries with two atoms closer than clash_scale
+            times the sum of their covalent radii get the
+            CLASH_ENERGY without an energy calculation (see
+            geometry.find_clashes). Set to 0 to turn off.
+        num_clashes : int
+            Number of geometries that had clashing atoms.
+        surrogate : object
+            An EnergySurrogate that is trained on every
+            energy that is calculated, and used to skip
+            children that are unlikely to replace the pmem
+            in their slot (see evaluate_pmems). Starts as
+            None (no surrogate).
+        num_skipped : int
+            Number of children skipped because of the
+            surrogate's predictions.
+        refiner : object
+            A Refiner that calculates the energies of the
+            fittest pmems at a higher level of theory than
+            the parser's method and basis (see the refine
+            module). Starts as None (no refinement).
+        scf_guess : int
+            If this is not 0, the SCF of a new geometry
+            starts from the orbitals of the most similar
+            geometry of its parents, as long as they differ
+            in at most scf_guess genes (see _guesses). This
+            needs an orbital directory (see energy.init_worker).
+            Starts as 0 (psi4's usual guess).
 
         Returns
         -------
@@ -127,23 +245,141 @@ class Ring:
         self.coef_energy = coef_energy
         self.coef_rmsd = coef_rmsd
         self.parser = parser
-        # make an empty ring
-        self.num_filled = 0
-        self.pmems = np.full(self.num_slots, None)
+        # make an empty ring, with the data for all of the
+        # pmems kept in contiguous arrays (one row per slot)
+        self.occupied = np.zeros(num_slots, bool)
+        # the first num_filled entries of _slots are the
+        # filled slots; _slot_pos is where each slot is in
+        # _slots (so slots can be removed in constant time)
+        self._slots = np.zeros(num_slots, int)
+        self._slot_pos = np.full(num_slots, -1, int)
+        self._num_filled = 0
+        # the genotype_key of each filled slot, and how many
+        # filled slots have each key (see in_ring)
+        self._slot_keys = [None] * num_slots
+        self._ring_keys = Counter()
         # TODO: make sure zmatrix has charge and multip correctly set
         self.zmatrix = get_zmatrix_template(self.parser)
+        # parse the zmatrix once so that new geometries
+        # do not have to go through openbabel
+        self.template = ZMatrixTemplate(self.zmatrix)
+        if rotors and not self.template.use_rotors(get_rotatable_bonds(self.zmatrix)):
+            print("Warning: no rotatable bonds found, all dihedrals will be evolved.")
+        self.num_genes = self.template.num_genes
+        self.dihedrals = np.zeros((num_slots, num_geoms, self.num_genes), int)
+        self.fitness = np.full(num_slots, np.nan)
+        self.birthdays = np.full(num_slots, -1, int)
+        self.energies = np.full((num_slots, num_geoms), np.nan)
+        self.coords = np.zeros((num_slots, num_geoms, num_atoms, 3))
+        self.rmsds = np.full((num_slots, num_geoms, num_geoms), np.nan)
+        self.ff_energies = np.full((num_slots, num_geoms), np.nan)
+        self.pool = None
+        self.cache = EnergyCache()
+        self.genotypes = {}
+        self.rejected_genotypes = set()
+        self.num_known = 0
+        self.num_clones = 0
+        self.num_evals = 0
+        self.prescreen = None
+        self.num_rejected = 0
+        self.clash_scale = CLASH_SCALE
+        self.num_clashes = 0
+        self.surrogate = None
+        self.num_skipped = 0
+        self.refiner = None
+        self.scf_guess = 0
+
+    @property
+    def num_filled(self):
+        """Number of slots that have a pmem in them."""
+        return self._num_filled
+
+    @property
+    def filled_slots(self):
+        """Indices of the slots that have a pmem in them."""
+        return self._slots[:self._num_filled]
+
+    def _add_slot(self, key):
+        """Mark a slot as filled (or update the genotype key of a filled slot)."""
+        self._set_slot_key(key, self.genotype_key(self.dihedrals[key]))
+        if self.occupied[key]:
+            return None
+        self.occupied[key] = True
+        self._slots[self._num_filled] = key
+        self._slot_pos[key] = self._num_filled
+        self._num_filled += 1
+
+    def _remove_slot(self, key):
+        """Mark a slot as empty."""
+        if not self.occupied[key]:
+            return None
+        self._set_slot_key(key, None)
+        self.occupied[key] = False
+        # move the last filled slot into the gap
+        self._num_filled -= 1
+        pos = self._slot_pos[key]
+        last = self._slots[self._num_filled]
+        self._slots[pos] = last
+        self._slot_pos[last] = pos
+        self._slot_pos[key] = -1
+
+    def _set_slot_key(self, key, genotype):
+        """Change the genotype key counted for a slot (None for empty)."""
+        old = self._slot_keys[key]
+        if old is not None:
+            self._ring_keys[old] -= 1
+            if not self._ring_keys[old]:
+                del self._ring_keys[old]
+        self._slot_keys[key] = genotype
+        if genotype is not None:
+            self._ring_keys[genotype] += 1
+
+    def sample(self, number):
+        """Choose random pmems from the ring.
+
+        Parameters
+        ----------
+        number : int
+            How many pmems to choose.
+
+        Raises
+        ------
+        RingEmptyError
+            There are fewer than number pmems in the ring.
+
+        Returns
+        -------
+        slots : np.ndarray(shape=number, dtype=int)
+            The slots of the chosen pmems. No pmem is
+            chosen twice. The time taken does not depend
+            on how many empty slots the ring has.
+
+        """
+        if number > self._num_filled:
+            raise RingEmptyError("Not enough pmems in the ring to choose from.")
+        return self.filled_slots[np.random.choice(self._num_filled, number, replace=False)]
+
+    @property
+    def pmems(self):
+        """The pmems in the ring (None for empty slots)."""
+        pmems = np.full(self.num_slots, None)
+        for i in np.flatnonzero(self.occupied):
+            pmems[i] = PmemView(self, int(i))
+        return pmems
 
     def __getitem__(self, key):
         """What happens when ring[integer] is called."""
-        if not isinstance(key, int):
+        if not isinstance(key, (int, np.integer)):
             raise KeyError("The ring cannot be indexed by non-integer values.")
         if key >= self.num_slots:
             raise KeyError("Given slot is larger than number of slots in ring.")
-        return self.pmems[key]
+        if not self.occupied[key]:
+            return None
+        return PmemView(self, int(key))
 
     def __setitem__(self, key, value):
         """How to set ring[integer] = pmem."""
-        if not isinstance(key, int):
+        if not isinstance(key, (int, np.integer)):
             raise KeyError("The ring cannot be indexed by non-integer values.")
         if key >= self.num_slots:
             raise KeyError("Given slot is larger than number of slots in ring.")
@@ -151,19 +387,213 @@ class Ring:
             raise KeyError("Ring should be filled with Pmem objects or None.")
         # in this case we are deleting a pmem
         if value is None:
-            if self.pmems[key] is not None:
-                self.num_filled -= 1
-                self.pmems[key] = value
+            self._remove_slot(key)
+            self.fitness[key] = np.nan
+            self.birthdays[key] = -1
+            self.energies[key] = np.nan
+            self.rmsds[key] = np.nan
+            self.ff_energies[key] = np.nan
             return None
         # check that the pmem is being added to the same slot as ring_loc
         assert value.ring_loc == key
         # check that the pmem has the same num geoms and num atoms
         assert len(value.dihedrals) == self.num_geoms
-        assert len(value.dihedrals[0]) == self.num_atoms - 3
-        # if not overwriting pmem slot, need to increment num_filled
-        if self.pmems[key] is None:
-            self.num_filled += 1
-        self.pmems[key] = value
+        assert len(value.dihedrals[0]) == self.num_genes
+        # copy the pmem data into the slot
+        view = PmemView(self, int(key))
+        view.dihedrals = value.dihedrals
+        view.fitness = value.fitness
+        view.birthday = value.birthday
+        view.energies = value.energies
+        view.coords = value.coords
+        view.rmsds = value.rmsds
+        view.ff_energies = value.ff_energies
+        self._add_slot(key)
+
+    @staticmethod
+    def genotype_key(dihedrals):
+        """Make the genotypes key for a set of dihedral angles.
+
+        Parameters
+        ----------
+        dihedrals : pmem.dihedrals
+
+        Returns
+        -------
+        key : bytes
+            The dihedral angles as integers from 0 to 359,
+            with the geometries sorted. The fitness does not
+            depend on the order of the geometries, so pmems
+            with the same geometries in a different order
+            have the same key.
+
+        """
+        return Ring._genotype_order(dihedrals)[0]
+
+    @staticmethod
+    def _genotype_order(dihedrals):
+        """The genotype_key and the order of the geometries in it."""
+        dihedrals = np.rint(dihedrals).astype(int) % 360
+        order = np.lexsort(dihedrals.T[::-1])
+        return dihedrals[order].astype(np.int16).tobytes(), order
+
+    def in_ring(self, dihedrals):
+        """Check if a pmem with these dihedral angles is in the ring.
+
+        Parameters
+        ----------
+        dihedrals : pmem.dihedrals
+
+        Returns
+        -------
+        bool
+            True if a filled slot has the same genotype_key
+            (the same geometries, in any order). The keys of
+            the filled slots are counted as pmems are added
+            and removed, so this is one look up.
+
+        """
+        return self.genotype_key(dihedrals) in self._ring_keys
+
+    def _recall(self, pmem, screen=True):
+        """Set the fitness of a pmem from genotypes if it is known.
+
+        Parameters
+        ----------
+        pmem : object
+            The Pmem to look up.
+        screen : bool
+            If True, a pmem that the prescreen rejected
+            before is given a fitness of nan. Otherwise
+            (see evaluate_pmems) it is not known, so it is
+            evaluated. Defaults to True.
+
+        Notes
+        -----
+        A known pmem also gets its energies and rmsds (in
+        the order of its own geometries), its coords and
+        (if the ring has a prescreen) its ff_energies, so
+        that it is the same as if it had been evaluated.
+
+        Returns
+        -------
+        bool
+            True if the fitness was found.
+
+        """
+        if self.genotypes is None:
+            return False
+        key, order = self._genotype_order(pmem.dihedrals)
+        if screen and key in self.rejected_genotypes:
+            pmem.fitness = np.nan
+            self.num_known += 1
+            return True
+        known = self.genotypes.get(key)
+        if known is None:
+            return False
+        fitness, known_energies, known_rmsds = known
+        energies = np.empty(self.num_geoms)
+        energies[order] = known_energies
+        rmsds = np.empty((self.num_geoms, self.num_geoms))
+        rmsds[np.ix_(order, order)] = known_rmsds
+        pmem.fitness = fitness
+        pmem.energies = energies
+        pmem.rmsds = rmsds
+        pmem.coords = self.get_coords(np.asarray(pmem.dihedrals))
+        if self.prescreen is not None:
+            pmem.ff_energies = self.prescreen.calc_energies(pmem.coords)
+        self.num_known += 1
+        return True
+
+    def get_state(self):
+        """Get the data needed to restore the ring.
+
+        Returns
+        -------
+        state : dict(str, np.ndarray)
+            The pmem arrays, the order of the filled slots
+            (used when sampling pmems), the genotypes, the
+            counters, and the state of the surrogate, refiner
+            and cache (if the ring has them). See set_state.
+
+        """
+        state = {"dihedrals": self.dihedrals, "fitness": self.fitness,
+                 "birthdays": self.birthdays, "energies": self.energies,
+                 "coords": self.coords, "rmsds": self.rmsds,
+                 "ff_energies": self.ff_energies, "filled_slots": self.filled_slots,
+                 "counters": np.array([self.num_known, self.num_clones, self.num_evals,
+                                       self.num_rejected, self.num_clashes,
+                                       self.num_skipped])}
+        if self.genotypes is not None:
+            key_size = self.num_geoms * self.num_genes * np.dtype(np.int16).itemsize
+            keys = np.frombuffer(b"".join(self.genotypes), np.uint8)
+            state["genotype_keys"] = keys.reshape(-1, key_size)
+            known = list(self.genotypes.values())
+            state["genotype_fitness"] = np.array([fitness for fitness, _, _ in known], float)
+            state["genotype_energies"] = np.array([energies for _, energies, _ in known],
+                                                  float).reshape(-1, self.num_geoms)
+            state["genotype_rmsds"] = np.array([rmsds for _, _, rmsds in known],
+                                               float).reshape(-1, self.num_geoms,
+                                                              self.num_geoms)
+            keys = np.frombuffer(b"".join(self.rejected_genotypes), np.uint8)
+            state["rejected_keys"] = keys.reshape(-1, key_size)
+        if self.surrogate is not None:
+            state.update(self.surrogate.get_state())
+        if self.refiner is not None:
+            state.update(self.refiner.get_state())
+        # an EnergyStore (without a cache) keeps its
+        # energies in its own file
+        if isinstance(self.cache, EnergyCache):
+            state.update(self.cache.get_state())
+        return state
+
+    def set_state(self, state):
+        """Restore the ring from the output of get_state.
+
+        Parameters
+        ----------
+        state : dict(str, np.ndarray)
+
+        Raises
+        ------
+        ValueError
+            The state is for a ring of a different size.
+
+        Returns
+        -------
+        None
+
+        """
+        if state["dihedrals"].shape != self.dihedrals.shape:
+            raise ValueError("The saved ring has a different number of slots, "
+                             "geometries or genes.")
+        for name in ("dihedrals", "fitness", "birthdays", "energies", "coords", "rmsds",
+                     "ff_energies"):
+            getattr(self, name)[:] = state[name]
+        # the filled slots are added in the same order,
+        # so that sampling gives the same pmems
+        self.occupied[:] = False
+        self._slot_pos[:] = -1
+        self._num_filled = 0
+        self._slot_keys = [None] * self.num_slots
+        self._ring_keys = Counter()
+        for slot in state["filled_slots"]:
+            self._add_slot(int(slot))
+        self.num_known, self.num_clones, self.num_evals, self.num_rejected, \
+            self.num_clashes, self.num_skipped = (int(c) for c in state["counters"])
+        if self.genotypes is not None and "genotype_energies" in state:
+            self.genotypes = {key.tobytes(): (float(fitness), energies, rmsds)
+                              for key, fitness, energies, rmsds in zip(
+                                  state["genotype_keys"], state["genotype_fitness"],
+                                  state["genotype_energies"], state["genotype_rmsds"])}
+            self.rejected_genotypes = {key.tobytes()
+                                       for key in state.get("rejected_keys", ())}
+        if self.surrogate is not None and "surrogate_energies" in state:
+            self.surrogate.set_state(state)
+        if self.refiner is not None and "refined_fitness" in state:
+            self.refiner.set_state(state)
+        if isinstance(self.cache, EnergyCache) and "cache_energies" in state:
+            self.cache.set_state(state)
 
     def set_fitness(self, pmem_index):
         """Set the fitness value for a pmem.
@@ -175,7 +605,8 @@ class Ring:
 
         Notes
         -----
-        Sets the value of pmem.fitness
+        Sets the value of pmem.fitness (along with
+        pmem.energies and pmem.coords).
 
         Raises
         ------
@@ -187,20 +618,458 @@ class Ring:
         None
 
         """
-        if self.pmems[pmem_index] is None:
+        if not self.occupied[pmem_index]:
             raise ValueError(f"Empty slot: {pmem_index}.")
-        # construct zmatrices
-        zmatrices = [update_zmatrix(self.zmatrix, self.pmems[pmem_index].dihedrals[i])
-                     for i in range(self.num_geoms)]
-        xyz_coords = [zmatrix_to_xyz(zmatrix) for zmatrix in zmatrices]
-        # get fitness
-        energy = sum_energies(xyz_coords, self.parser.charge, self.parser.multip,
-                              self.parser.method, self.parser.basis)
-        rmsd = sum_rmsds(xyz_coords)
-        fitness = calc_fitness(self.fit_form, energy, self.coef_energy, rmsd, self.coef_rmsd)
-        self.pmems[pmem_index].fitness = fitness
-
-    def update(self, parent_index, child, current_mev):
+        self.evaluate_pmems([self[pmem_index]], screen=False)
+
+    def get_coords(self, dihedrals):
+        """Build cartesian coordinates for sets of dihedral angles.
+
+        Parameters
+        ----------
+        dihedrals : np.ndarray(shape=(..., num_genes))
+            For example, one pmem (num_geoms, num_genes)
+            or a batch of pmems (num_pmems, num_geoms, num_genes).
+
+        Returns
+        -------
+        coords : np.ndarray(shape=(..., num_atoms, 3))
+            All of the geometries are built in one vectorised
+            pass (see ZMatrixTemplate.to_coords).
+
+        """
+        return self.template.to_coords(self.template.expand_genes(dihedrals))
+
+    def evaluate(self, dihedrals):
+        """Calculate the fitness for a set of dihedral angles.
+
+        Parameters
+        ----------
+        dihedrals : pmem.dihedrals
+            One list of num_genes dihedral angles
+            for each of the num_geoms geometries.
+
+        Returns
+        -------
+        fitness : float
+
+        """
+        return self.evaluate_batch([dihedrals])[0]
+
+    def evaluate_batch(self, dihedrals):
+        """Calculate the fitness for several sets of dihedral angles.
+
+        Parameters
+        ----------
+        dihedrals : list(pmem.dihedrals)
+            The dihedral angles for each of num_pmems
+            population members.
+
+        Returns
+        -------
+        fitness : np.ndarray(shape=num_pmems, dtype=float)
+
+        """
+        pmems = [Pmem(None, self.num_geoms, self.num_atoms, None, pmem_dihedrals)
+                 for pmem_dihedrals in dihedrals]
+        return self.evaluate_pmems(pmems)
+
+    def evaluate_pmems(self, pmems, parents=(), screen=True, targets=None):
+        """Calculate the fitness of several pmems.
+
+        Parameters
+        ----------
+        pmems : list(object)
+            The Pmem objects to evaluate. Their fitness,
+            energies, coords, rmsds and ff_energies
+            attributes are set.
+        parents : list(object)
+            Pmems (that have already been evaluated) from
+            which the pmems were made. Defaults to no parents.
+        screen : bool
+            If the ring has a prescreen, reject pmems whose
+            force field energies are too high (see
+            ForceFieldScreen.reject). A rejected pmem's
+            fitness is nan, its energies are not calculated,
+            and place does not add it to the ring. Defaults
+            to True (pmems that are already in the ring are
+            evaluated with screen=False).
+        targets : list(float)
+            The fitness that each pmem has to reach to get
+            into the ring (the fitness of the pmem in the
+            slot chosen for it, nan for an empty slot). If
+            the ring has a surrogate and screen is True, a
+            pmem that is unlikely to reach its target is
+            skipped: its fitness is nan and its energies
+            are not calculated (see _skip). Defaults to None
+            (no pmems are skipped).
+
+        Notes
+        -----
+        Pmems whose dihedral angles have been evaluated
+        before get their fitness, energies, coords and rmsds
+        from genotypes (see _recall). For the rest,
+        geometries that were copied unchanged from a parent
+        (at the same index, as done by the mutations module)
+        keep the parent's energy and coordinates, and pairs of
+        geometries from the same parent keep the parent's rmsd.
+        The other geometries are built in one batch, and their energy
+        calculations are sent off together, so that a pool
+        (if the ring has one) can run them at the same time.
+        Geometries with clashing atoms get the CLASH_ENERGY
+        instead of an energy calculation (see clash_scale).
+        The calculated energies are added to the surrogate.
+
+        Returns
+        -------
+        fitness : np.ndarray(shape=num_pmems, dtype=float)
+
+        """
+        if targets is None:
+            targets = np.full(len(pmems), np.nan)
+        new = [not self._recall(pmem, screen) for pmem in pmems]
+        new_pmems = list(compress(pmems, new))
+        if not new_pmems:
+            return np.array([pmem.fitness for pmem in pmems], float)
+        targets = np.asarray(targets, float)[new]
+        dihedrals, coords, energies, rmsds, new_geoms = self._inherit(new_pmems, parents)
+        prediction = None
+        if new_geoms.any():
+            coords[new_geoms] = self.get_coords(dihedrals[new_geoms])
+            new_pmems, dihedrals, coords, energies, rmsds, new_geoms, targets = self._screen(
+                new_pmems, dihedrals, coords, energies, rmsds, new_geoms, targets, screen)
+            new_geoms = self._clash(coords, energies, new_geoms)
+            if screen:
+                new_pmems, dihedrals, coords, energies, rmsds, new_geoms, prediction = \
+                    self._skip(new_pmems, dihedrals, coords, energies, rmsds, new_geoms,
+                               targets)
+        if new_geoms.any():
+            xyz_coords = [coords_to_xyz(self.template.atoms, geom)
+                          for geom in coords[new_geoms]]
+            misses = self._cache_misses()
+            energies[new_geoms] = calc_energies(xyz_coords, self.parser.charge,
+                                                self.parser.multip, self.parser.method,
+                                                self.parser.basis, self.pool, self.cache,
+                                                dihedrals[new_geoms],
+                                                self._guesses(dihedrals[new_geoms], parents))
+            self._count_evals(misses, len(xyz_coords))
+            self._learn(dihedrals[new_geoms], energies[new_geoms], prediction)
+        for i, pmem in enumerate(new_pmems):
+            self._set_results(pmem, coords[i], energies[i], rmsds[i])
+        return np.array([pmem.fitness for pmem in pmems], float)
+
+    def submit(self, pmem, parents=(), target=np.nan):
+        """Start the energy calculations for a pmem.
+
+        Parameters
+        ----------
+        pmem : object
+            The Pmem to evaluate.
+        parents : list(object)
+            See evaluate_pmems.
+        target : float
+            The fitness the pmem has to reach to get into
+            the ring (see the targets of evaluate_pmems).
+            Defaults to nan (the pmem is not skipped).
+
+        Raises
+        ------
+        ValueError
+            The ring does not have a pool.
+
+        Returns
+        -------
+        submission : tuple
+            The pmem, its coordinates, energies and rmsds, the
+            surrogate's prediction of its new energies (or None),
+            and the energy calculations (futures) running on the
+            pool for its new geometries. Give this to the collect
+            method once all of the futures are done. If the
+            pmem's fitness is already known, or the pmem is rejected
+            by the prescreen or skipped (see evaluate_pmems), there
+            are no futures and coords is None.
+
+        """
+        if self.pool is None:
+            raise ValueError("The ring needs a pool to submit energy calculations.")
+        if self._recall(pmem):
+            return pmem, None, None, None, None, []
+        dihedrals, coords, energies, rmsds, new_geoms = self._inherit([pmem], parents)
+        prediction = None
+        if new_geoms.any():
+            coords[new_geoms] = self.get_coords(dihedrals[new_geoms])
+            targets = np.array([target], float)
+            if not self._screen([pmem], dihedrals, coords, energies, rmsds, new_geoms,
+                                targets)[0]:
+                return pmem, None, None, None, None, []
+            new_geoms = self._clash(coords, energies, new_geoms)
+            pmems, _, _, _, _, _, prediction = self._skip(
+                [pmem], dihedrals, coords, energies, rmsds, new_geoms, targets)
+            if not pmems:
+                return pmem, None, None, None, None, []
+        xyz_coords = [coords_to_xyz(self.template.atoms, geom) for geom in coords[new_geoms]]
+        misses = self._cache_misses()
+        futures = submit_energies(xyz_coords, self.parser.charge, self.parser.multip,
+                                  self.parser.method, self.parser.basis, self.pool,
+                                  self.cache, dihedrals[new_geoms],
+                                  self._guesses(dihedrals[new_geoms], parents))
+        self._count_evals(misses, len(xyz_coords))
+        return pmem, coords[0], energies[0], rmsds[0], prediction, futures
+
+    def collect(self, submission):
+        """Calculate the fitness from submitted energy calculations.
+
+        Parameters
+        ----------
+        submission : tuple
+            The output of the submit method. Waits for
+            any energy calculations that are not done.
+
+        Returns
+        -------
+        fitness : float
+            Also sets the fitness, energies, coords and
+            rmsds attributes of the submitted pmem.
+
+        """
+        pmem, coords, energies, rmsds, prediction, futures = submission
+        if coords is None:
+            return pmem.fitness
+        new_geoms = np.isnan(energies)
+        energies[new_geoms] = failed_to_penalty([future.result() for future in futures])
+        self._learn(np.asarray(pmem.dihedrals)[new_geoms], energies[new_geoms], prediction)
+        self._set_results(pmem, coords, energies, rmsds)
+        return pmem.fitness
+
+    def _cache_misses(self):
+        """Number of energies not found in the cache so far."""
+        return getattr(self.cache, "misses", 0)
+
+    def _count_evals(self, misses, num_geoms):
+        """Add the energy calculations that were just run to num_evals.
+
+        Parameters
+        ----------
+        misses : int
+            The value of _cache_misses before the energies
+            were looked up.
+        num_geoms : int
+            The number of geometries (used if there is
+            no cache).
+
+        """
+        if self.cache is None:
+            self.num_evals += num_geoms
+        else:
+            self.num_evals += self._cache_misses() - misses
+
+    def _inherit(self, pmems, parents):
+        """Find the geometries that need to be calculated.
+
+        Returns
+        -------
+        dihedrals : np.ndarray(shape=(num_pmems, num_geoms, num_genes))
+        coords : np.ndarray(shape=(num_pmems, num_geoms, num_atoms, 3))
+            Coordinates copied from the parents.
+        energies : np.ndarray(shape=(num_pmems, num_geoms))
+            Energies copied from the parents (nan otherwise).
+        rmsds : np.ndarray(shape=(num_pmems, num_geoms, num_geoms))
+            Rmsd values copied from the parents, for pairs of
+            geometries that both came from the same parent
+            (nan otherwise).
+        new_geoms : np.ndarray(shape=(num_pmems, num_geoms), dtype=bool)
+            True for geometries that were not in a parent.
+
+        """
+        dihedrals = np.array([pmem.dihedrals for pmem in pmems])
+        coords = np.zeros(dihedrals.shape[:2] + (self.num_atoms, 3), float)
+        energies = np.full(dihedrals.shape[:2], np.nan)
+        rmsds = np.full(dihedrals.shape[:2] + (self.num_geoms,), np.nan)
+        new_geoms = np.ones(dihedrals.shape[:2], bool)
+        for parent in parents:
+            if parent is None or parent.energies is None:
+                continue
+            same = np.all(dihedrals == np.asarray(parent.dihedrals), axis=2) & new_geoms
+            coords[same] = np.broadcast_to(parent.coords, coords.shape)[same]
+            energies[same] = np.broadcast_to(parent.energies, energies.shape)[same]
+            new_geoms &= ~same
+            if parent.rmsds is not None:
+                for pmem_rmsds, pmem_same in zip(rmsds, same):
+                    pairs = np.ix_(pmem_same, pmem_same)
+                    pmem_rmsds[pairs] = parent.rmsds[pairs]
+        return dihedrals, coords, energies, rmsds, new_geoms
+
+    def _screen(self, pmems, dihedrals, coords, energies, rmsds, new_geoms, targets,
+                screen=True):
+        """Run the prescreen on pmems from _inherit.
+
+        Sets the ff_energies of the pmems, and the fitness
+        of the rejected pmems (see evaluate_pmems).
+
+        Returns
+        -------
+        pmems, dihedrals, coords, energies, rmsds, new_geoms, targets
+            The same as the inputs, without the rejected
+            pmems.
+
+        """
+        if self.prescreen is None:
+            return pmems, dihedrals, coords, energies, rmsds, new_geoms, targets
+        # the geometries copied from a parent have their
+        # coordinates, so every geometry is done (force
+        # field energies are cheap)
+        ff_energies = self.prescreen.calc_energies(coords)
+        for pmem, pmem_ff_energies in zip(pmems, ff_energies):
+            pmem.ff_energies = pmem_ff_energies
+        if not screen:
+            return pmems, dihedrals, coords, energies, rmsds, new_geoms, targets
+        # only the new geometries can be rejected
+        rejected = self.prescreen.reject(np.where(new_geoms, ff_energies, np.nan),
+                                         self.ff_energies[self.filled_slots])
+        for pmem in compress(pmems, rejected):
+            pmem.fitness = np.nan
+            self.num_rejected += 1
+            if self.genotypes is not None:
+                self.rejected_genotypes.add(self.genotype_key(pmem.dihedrals))
+        kept = ~rejected
+        return (list(compress(pmems, kept)), dihedrals[kept], coords[kept], energies[kept],
+                rmsds[kept], new_geoms[kept], targets[kept])
+
+    def _clash(self, coords, energies, new_geoms):
+        """Give new geometries with clashing atoms the CLASH_ENERGY.
+
+        Returns
+        -------
+        new_geoms : np.ndarray(dtype=bool)
+            The new geometries that still need an energy
+            calculation.
+
+        """
+        if not self.clash_scale or not new_geoms.any():
+            return new_geoms
+        clashes = np.zeros_like(new_geoms)
+        clashes[new_geoms] = find_clashes(coords[new_geoms], self.template.radii,
+                                          self.clash_scale)
+        energies[clashes] = CLASH_ENERGY
+        self.num_clashes += int(clashes.sum())
+        return new_geoms & ~clashes
+
+    def _skip(self, pmems, dihedrals, coords, energies, rmsds, new_geoms, targets):
+        """Skip pmems that the surrogate predicts will not reach their targets.
+
+        A pmem is skipped if its fitness, with the sum of its
+        energies surrogate.z standard deviations below the
+        prediction, is still less than its target, and that
+        standard deviation is less than surrogate.max_std.
+        Skipped pmems get a fitness of nan. They are not added
+        to genotypes, since the surrogate may predict them
+        differently once it has more energies.
+
+        Returns
+        -------
+        pmems, dihedrals, coords, energies, rmsds, new_geoms
+            The same as the inputs, without the skipped pmems.
+        prediction : tuple(np.ndarray, np.ndarray)
+            The predicted energies, and their standard
+            deviations, of the new geometries of the pmems
+            that were not skipped (in the same order as
+            energies[new_geoms]), or None if the surrogate
+            cannot make predictions yet.
+
+        """
+        if self.surrogate is None or not self.surrogate.ready or not new_geoms.any():
+            return pmems, dihedrals, coords, energies, rmsds, new_geoms, None
+        mean = np.full(new_geoms.shape, np.nan)
+        std = np.full(new_geoms.shape, np.nan)
+        mean[new_geoms], std[new_geoms] = self.surrogate.predict(dihedrals[new_geoms])
+        predicted = np.where(new_geoms, mean, energies)
+        sum_std = np.sqrt(np.sum(np.where(new_geoms, std, 0)**2, axis=1))
+        skipped = np.zeros(len(pmems), bool)
+        # an empty slot (nan target) is always taken
+        for i in np.flatnonzero((sum_std < self.surrogate.max_std) & ~np.isnan(targets)):
+            rmsd = calc_rmsds(coords[i], rmsds[i])[np.triu_indices(self.num_geoms, 1)].sum()
+            energy = abs(sum(predicted[i])) + self.surrogate.z*sum_std[i]
+            skipped[i] = calc_fitness(self.fit_form, energy, self.coef_energy,
+                                      rmsd, self.coef_rmsd) < targets[i]
+        for pmem in compress(pmems, skipped):
+            pmem.fitness = np.nan
+            self.num_skipped += 1
+        kept = ~skipped
+        kept_geoms = new_geoms & kept[:, None]
+        return (list(compress(pmems, kept)), dihedrals[kept], coords[kept], energies[kept],
+                rmsds[kept], new_geoms[kept], (mean[kept_geoms], std[kept_geoms]))
+
+    def _learn(self, dihedrals, energies, prediction=None):
+        """Add calculated energies to the surrogate.
+
+        Parameters
+        ----------
+        dihedrals : np.ndarray(shape=(num_points, num_genes))
+            The genes of the calculated geometries.
+        energies : np.ndarray(shape=num_points)
+            Their energies. Failed calculations (an energy
+            of 0) are left out.
+        prediction : tuple(np.ndarray, np.ndarray)
+            The surrogate's prediction of the energies (see
+            _skip), which is recorded to keep track of its
+            accuracy. Defaults to None (no prediction).
+
+        """
+        if self.surrogate is None:
+            return None
+        done = energies != 0
+        if prediction is not None:
+            self.surrogate.record(prediction[0][done], prediction[1][done], energies[done])
+        self.surrogate.add(dihedrals[done], energies[done])
+
+    def _guesses(self, dihedrals, parents):
+        """Choose the parent geometries to take SCF guesses from.
+
+        Parameters
+        ----------
+        dihedrals : np.ndarray(shape=(num_new, num_genes))
+            The genes of the geometries to calculate.
+        parents : list(object)
+            See evaluate_pmems.
+
+        Returns
+        -------
+        guesses : list(np.ndarray)
+            For each geometry, the genes of the parent
+            geometry with the fewest different genes, or
+            None if there is none with at most scf_guess
+            different genes (see fitg.calc_energies). None
+            instead of a list if scf_guess is 0.
+
+        """
+        if not self.scf_guess:
+            return None
+        parent_geoms = [np.asarray(parent.dihedrals) for parent in parents
+                        if parent is not None]
+        if not parent_geoms:
+            return [None] * len(dihedrals)
+        parent_geoms = np.concatenate(parent_geoms)
+        num_diffs = np.sum(dihedrals[:, None] % 360 != parent_geoms[None] % 360, axis=2)
+        closest = np.argmin(num_diffs, axis=1)
+        return [parent_geoms[j] if num_diffs[i, j] <= self.scf_guess else None
+                for i, j in enumerate(closest)]
+
+    def _set_results(self, pmem, coords, energies, rmsds=None):
+        """Store the coordinates, energies, rmsds and fitness of a pmem."""
+        pmem.coords = coords
+        pmem.energies = energies
+        pmem.rmsds = calc_rmsds(coords, rmsds)
+        energy = abs(sum(energies))
+        rmsd = pmem.rmsds[np.triu_indices(self.num_geoms, 1)].sum()
+        pmem.fitness = calc_fitness(self.fit_form, energy, self.coef_energy,
+                                    rmsd, self.coef_rmsd)
+        if self.genotypes is not None:
+            key, order = self._genotype_order(pmem.dihedrals)
+            self.genotypes[key] = (pmem.fitness, np.array(pmem.energies)[order],
+                                   np.array(pmem.rmsds)[np.ix_(order, order)])
+            self.rejected_genotypes.discard(key)
+
+    def update(self, parent_index, child, current_mev, fitness=None):
         """Add child to ring based on parent location.
 
         Parameters
@@ -216,6 +1085,81 @@ class Ring:
             is called by the tournament. This value
             is used to set the birthday of new pmems
             (if the child is added to the ring).
+        fitness : float
+            The fitness of the child, if it has already
+            been calculated. Defaults to None (calculate
+            it here).
+
+        Notes
+        -----
+        If the same pmem is already in the ring, the
+        child is dropped without being evaluated. The
+        child's slot is chosen before it is evaluated,
+        so that the surrogate (if the ring has one) can
+        skip a child that will not replace the pmem there.
+
+        Returns
+        -------
+        None
+
+        """
+        if self.in_ring(child):
+            self.num_clones += 1
+            return None
+        pmem = Pmem(None, self.num_geoms, self.num_atoms, current_mev, child)
+        slot = self.choose_slot(parent_index)
+        # determine fitness value for the child
+        if fitness is None:
+            self.evaluate_pmems([pmem], targets=[self.fitness[slot]])
+        else:
+            pmem.fitness = fitness
+        self.place(parent_index, pmem, slot)
+
+    def place(self, parent_index, pmem, slot=None):
+        """Put an evaluated pmem in the ring near its parent.
+
+        Parameters
+        ----------
+        parent_index : int
+            The location of the parent from which
+            the pmem's location will be chosen.
+        pmem : object
+            The Pmem to add (its fitness must be set).
+            It replaces the current occupant of the
+            chosen slot if it is at least as fit. It is
+            not added if its fitness is nan, or if the
+            same pmem is already in the ring.
+        slot : int
+            The slot to put the pmem in, if it has already
+            been chosen (see choose_slot). Defaults to None
+            (choose it here).
+
+        Returns
+        -------
+        None
+
+        """
+        if np.isnan(pmem.fitness):
+            # rejected by the prescreen or skipped
+            return None
+        if self.in_ring(pmem.dihedrals):
+            self.num_clones += 1
+            return None
+        if slot is None:
+            slot = self.choose_slot(parent_index)
+        # check fitness vs current occupant (or empty slot)
+        if not self.occupied[slot] or self.fitness[slot] <= pmem.fitness:
+            # add it there
+            pmem.ring_loc = slot
+            self[slot] = pmem
+
+    def choose_slot(self, parent_index):
+        """Choose a slot for a child near its parent.
+
+        Parameters
+        ----------
+        parent_index : int
+            The location of the parent.
 
         Notes
         -----
@@ -224,23 +1168,14 @@ class Ring:
 
         Returns
         -------
-        None
+        slot : int
+            A random slot within pmem_dist slots of the
+            parent (either side, looping round the ring).
 
         """
         print('parent at:', parent_index)
         print('pmem dist:', self.pmem_dist)
         print('num slots:', self.num_slots)
-        # determine fitness value for the child
-        # construct zmatrices
-        # TODO: since this is a repeat of the code from
-        # set_fitness, it should be written as its own method
-        zmatrices = [update_zmatrix(self.zmatrix, child[i]) for i in range(self.num_geoms)]
-        xyz_coords = [zmatrix_to_xyz(zmatrix) for zmatrix in zmatrices]
-        # get fitness
-        energy = sum_energies(xyz_coords, self.parser.charge, self.parser.multip,
-                              self.parser.method, self.parser.basis)
-        rmsd = sum_rmsds(xyz_coords)
-        fitness = calc_fitness(self.fit_form, energy, self.coef_energy, rmsd, self.coef_rmsd)
 
         # TODO: see if this code should be replaced with negative
         # indices (since python lists are doubly-linked)
@@ -248,7 +1183,7 @@ class Ring:
         # pick random index within +/-self.pmem_dist of parent
         possible_slots = []
         # first check if the range loops round the ring
-        if parent_index + self.pmem_dist > self.num_slots:
+        if parent_index + self.pmem_dist >= self.num_slots:
             possible_slots.extend(range(parent_index, self.num_slots))
             overflow = parent_index + self.pmem_dist - self.num_slots
             possible_slots.extend(range(overflow+1))
@@ -266,19 +1201,12 @@ class Ring:
         # print(possible_slots)
         print(possible_slots)
         print(self.pmem_dist)
-        print(parent_index, child, current_mev)
         assert len(possible_slots) == 2*self.pmem_dist+1
 
         # select new child location
-        chosen_slot = choice(possible_slots)
-        # check fitness vs current occupant (or empty slot)
-        if self[chosen_slot] is None or self[chosen_slot].fitness <= fitness:
-            # add it there
-            self[chosen_slot] = Pmem(chosen_slot, self.num_geoms,
-                                     self.num_atoms, current_mev, child)
-            self[chosen_slot].fitness = fitness
+        return choice(possible_slots)
 
-    def fill(self, num_pmems, current_mev):
+    def fill(self, num_pmems, current_mev, seeds=None):
         """Fill the ring with additional pmems.
 
         Notes
@@ -296,6 +1224,14 @@ class Ring:
         current_mev : int
             The current mating event (used to determine
             pmem age).
+        seeds : np.ndarray(shape=(num_seeds, num_atoms-3))
+            Dihedral angles of known conformers (for example,
+            the input geometry) to start from. They are put
+            into the new pmems num_geoms at a time, and the
+            last seeded pmem is topped up with random
+            geometries. The other new pmems are random.
+            Only the genes of the seeds are used.
+            Defaults to None (all random).
 
         Raises
         ------
@@ -310,24 +1246,25 @@ class Ring:
             assert num_avail >= num_pmems
         except AssertionError:
             raise RingOverflowError("Cannot add more pmems than space available in the ring.")
-        # if there are no pmems in the ring, add a contiguous segment
-        if self.num_filled == 0:
-            for i in range(0, num_pmems):
-                self.pmems[i] = Pmem(i, self.num_geoms,
-                                     self.num_atoms, current_mev)
-                self.set_fitness(i)
-            self.num_filled += num_pmems
+        # if there are no pmems in the ring, this is a contiguous
+        # segment; otherwise the pmems present might not represent
+        # a contiguous segment, so use the first empty slots
+        new_slots = np.flatnonzero(~self.occupied)[:num_pmems]
+        if not new_slots.size:
             return None
-        # if there are some pmems in the ring
-        # they might not represent a contiguous segment
-        # so go over each slot first and check that
-        # it is empty
-        total = self.num_filled + num_pmems
-        for i in range(self.num_slots):
-            if self.num_filled == total:
-                return None
-            if self.pmems[i] is None:
-                self.pmems[i] = Pmem(i, self.num_geoms, self.num_atoms,
-                                     current_mev)
-                self.set_fitness(i)
-                self.num_filled += 1
+        # generate random dihedral angles (degrees) for
+        # every geometry of every new pmem
+        self.dihedrals[new_slots] = np.random.randint(MIN_VALUE, MAX_VALUE,
+                                                      size=(len(new_slots), self.num_geoms,
+                                                            self.num_genes))
+        if seeds is not None and len(seeds):
+            seeds = np.rint(self.template.to_genes(seeds)).astype(int) % 360
+            seeds = seeds[:len(new_slots) * self.num_geoms]
+            new_geoms = self.dihedrals[new_slots].reshape(-1, self.num_genes)
+            new_geoms[:len(seeds)] = seeds
+            self.dihedrals[new_slots] = new_geoms.reshape(len(new_slots), self.num_geoms, -1)
+        self.birthdays[new_slots] = current_mev
+        for i in new_slots:
+            self._add_slot(i)
+        # build and evaluate every conformer of every new pmem in one batch
+        self.evaluate_pmems([self[i] for i in new_slots], screen=False)
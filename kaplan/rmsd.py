@@ -1,7 +1,10 @@
 """This module is repsonsible for calculating the rmsd
 (root-mean square deviation) between two sets of
 coordinates. It uses the rmsd library, which can
-be found here: https://github.com/charnley/rmsd."""
+be found here: https://github.com/charnley/rmsd.
+The rmsd values between all pairs of geometries in
+a pmem can also be calculated at once using numpy
+(see calc_rmsd_matrix)."""
 
 import numpy as np
 import rmsd
@@ -53,3 +56,78 @@ def calc_rmsd(coords1, coords2):
     mol1 = np.dot(mol1, rot_matrix)
     # finally get the rmsd
     return rmsd.rmsd(mol1, mol2)
+
+
+def calc_rmsd_matrix(coords, known=None):
+    """Calculate the rmsd between all pairs of geometries.
+
+    Parameters
+    ----------
+    coords : np.ndarray(shape=(num_geoms, num_atoms, 3))
+        The cartesian coordinates of each geometry
+        (in Angstroms), without atom names.
+    known : np.ndarray(shape=(num_geoms, num_geoms))
+        Rmsd values that are already known (for example,
+        copied from a parent pmem), with nan for the pairs
+        that need to be calculated. Defaults to None
+        (calculate every pair).
+
+    Notes
+    -----
+    Gives the same values as calc_rmsd (centering,
+    then the Kabsch rotation), but each geometry is
+    centered once and the singular value decompositions
+    for all of the num_geoms*(num_geoms-1)/2 pairs are
+    done together. The rmsd comes from the singular
+    values directly, so no rotation is applied.
+
+    Returns
+    -------
+    rmsd_matrix : np.ndarray(shape=(num_geoms, num_geoms))
+        Symmetric matrix where rmsd_matrix[i][j] is the
+        rmsd between geometries i and j. The diagonal
+        is zero.
+
+    """
+    coords = np.asarray(coords, dtype=float)
+    num_geoms = len(coords)
+    rmsd_matrix = np.zeros((num_geoms, num_geoms), float)
+    if num_geoms < 2:
+        return rmsd_matrix
+    # center each geometry once
+    coords = coords - coords.mean(axis=1, keepdims=True)
+    inds1, inds2 = np.triu_indices(num_geoms, 1)
+    if known is not None:
+        rmsd_matrix[inds1, inds2] = known[inds1, inds2]
+        missing = np.isnan(rmsd_matrix[inds1, inds2])
+        inds1, inds2 = inds1[missing], inds2[missing]
+    if len(inds1):
+        rmsd_matrix[inds1, inds2] = _kabsch_rmsds(coords[inds1], coords[inds2])
+    inds1, inds2 = np.triu_indices(num_geoms, 1)
+    rmsd_matrix[inds2, inds1] = rmsd_matrix[inds1, inds2]
+    return rmsd_matrix
+
+
+def _kabsch_rmsds(coords1, coords2):
+    """Rmsd after optimal rotation for stacks of centered geometries.
+
+    Parameters
+    ----------
+    coords1, coords2 : np.ndarray(shape=(num_pairs, num_atoms, 3))
+        Centered geometries to compare (pair by pair).
+
+    Returns
+    -------
+    rmsds : np.ndarray(shape=num_pairs)
+
+    """
+    # covariance matrix for each pair
+    covariance = np.einsum('pai,paj->pij', coords1, coords2)
+    rot1, singular, rot2 = np.linalg.svd(covariance)
+    # correct for reflections (so that only proper
+    # rotations are used)
+    sign = np.sign(np.linalg.det(rot1) * np.linalg.det(rot2))
+    singular[:, -1] *= sign
+    squared = (np.sum(coords1**2, axis=(1, 2)) + np.sum(coords2**2, axis=(1, 2))
+               - 2*np.sum(singular, axis=1)) / coords1.shape[1]
+    return np.sqrt(np.maximum(squared, 0.0))
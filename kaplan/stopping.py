@@ -0,0 +1,159 @@
+"""This module decides when to stop the genetic
+algorithm before all num_mevs mating events are
+done. A run can stop when:
+
+* the best fitness has not improved over a window
+  of mating events (stagnation)
+* the population has lost its diversity
+* a pmem reaches a target fitness
+* a maximum number of energy calculations is reached
+* a maximum (wall-clock) run time is reached
+
+Each criterion is turned off by default (value 0)."""
+
+import time
+from collections import deque
+
+import numpy as np
+
+
+def calc_diversity(dihedrals):
+    """Measure how different the pmems are from each other.
+
+    Parameters
+    ----------
+    dihedrals : np.ndarray(shape=(num_pmems, num_geoms, num_atoms-3))
+        The dihedral angles (degrees) of the pmems
+        (for example, ring.dihedrals[ring.filled_slots]).
+
+    Returns
+    -------
+    diversity : float
+        The circular variance of each dihedral angle over
+        the pmems, averaged over all of the dihedral angles.
+        It is 0 when all pmems are the same, and close to
+        1 when the angles are spread evenly around the circle.
+
+    """
+    if len(dihedrals) < 2:
+        return 0.0
+    angles = np.radians(dihedrals)
+    mean_vector = np.hypot(np.cos(angles).mean(axis=0), np.sin(angles).mean(axis=0))
+    return float(1 - mean_vector.mean())
+
+
+class StoppingCriteria:
+    """Checks whether the genetic algorithm should stop early."""
+
+    def __init__(self, stag_mevs=0, stag_tol=0.0, min_diversity=0.0,
+                 target_fitness=0.0, max_evals=0, max_time=0.0):
+        """Constructor for the stopping criteria.
+
+        Parameters
+        ----------
+        stag_mevs : int
+            Stop if the best fitness has not improved by
+            more than stag_tol over this many mating events.
+        stag_tol : float
+            See stag_mevs.
+        min_diversity : float
+            Stop if the diversity of the ring (see
+            calc_diversity) drops below this value.
+        target_fitness : float
+            Stop once a pmem in the ring is at least this fit.
+        max_evals : int
+            Stop once the ring has run this many energy
+            calculations (ring.num_evals).
+        max_time : float
+            Stop once this many seconds have passed since
+            the stopping criteria were made.
+
+        Attributes
+        ----------
+        reason : str
+            Why the run stopped (None until it stops).
+        mev : int
+            The mating event at which the run stopped.
+        start_time : float
+            When the stopping criteria were made (from
+            time.monotonic).
+
+        """
+        self.stag_mevs = stag_mevs
+        self.stag_tol = stag_tol
+        self.min_diversity = min_diversity
+        self.target_fitness = target_fitness
+        self.max_evals = max_evals
+        self.max_time = max_time
+        self.start_time = time.monotonic()
+        self.reason = None
+        self.mev = None
+        # (mev, best fitness) for the stagnation window
+        self._history = deque()
+
+    @classmethod
+    def from_ga_input(cls, ga_input_dict):
+        """Make the stopping criteria from the verified ga inputs."""
+        return cls(ga_input_dict['stag_mevs'], ga_input_dict['stag_tol'],
+                   ga_input_dict['min_diversity'], ga_input_dict['target_fitness'],
+                   ga_input_dict['max_evals'], 60*ga_input_dict['max_time'])
+
+    def elapsed(self):
+        """Seconds since the stopping criteria were made."""
+        return time.monotonic() - self.start_time
+
+    def check(self, ring, mev):
+        """Check the ring after a mating event.
+
+        Parameters
+        ----------
+        ring : object
+            The Ring object.
+        mev : int
+            The number of the mating event that just
+            finished.
+
+        Returns
+        -------
+        bool
+            True if the run should stop (the reason
+            attribute says why).
+
+        """
+        if self.reason is not None:
+            return True
+        fitness = ring.fitness[ring.filled_slots]
+        best = np.nanmax(fitness) if np.any(~np.isnan(fitness)) else np.nan
+        if self.max_time and self.elapsed() >= self.max_time:
+            self._stop(f"reached the time limit of {self.max_time} s", mev)
+        elif self.max_evals and ring.num_evals >= self.max_evals:
+            self._stop(f"reached {ring.num_evals} energy calculations", mev)
+        elif self.target_fitness and best >= self.target_fitness:
+            self._stop(f"best fitness {best} reached the target fitness", mev)
+        elif self.min_diversity and \
+                calc_diversity(ring.dihedrals[ring.filled_slots]) < self.min_diversity:
+            self._stop("the diversity of the ring dropped below min_diversity", mev)
+        elif self.stag_mevs:
+            self._history.append((mev, best))
+            # keep one entry from at least stag_mevs ago
+            while len(self._history) > 1 and self._history[1][0] <= mev - self.stag_mevs:
+                self._history.popleft()
+            old_mev, old_best = self._history[0]
+            if old_mev <= mev - self.stag_mevs and not best - old_best > self.stag_tol:
+                self._stop(f"best fitness did not improve over {mev - old_mev} mating events",
+                           mev)
+        return self.reason is not None
+
+    def get_history(self):
+        """The (mev, best fitness) values kept for the stagnation check."""
+        return np.array(self._history, float).reshape(-1, 2)
+
+    def set_history(self, history):
+        """Restore the output of get_history (for example, from a checkpoint)."""
+        self._history = deque((int(mev), best) for mev, best in history)
+
+    def _stop(self, reason, mev):
+        """Record why and when the run stopped."""
+        self.reason = reason
+        self.mev = mev
+        print(f"Stopping at mating event {mev}: {reason}.")
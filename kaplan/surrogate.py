@@ -0,0 +1,253 @@
+"""This module predicts the energies of geometries
+from their dihedral angles, so that children that are
+unlikely to get into the ring can be dropped before
+their energies are calculated.
+
+The EnergySurrogate is a Gaussian process (kernel
+ridge regression with error bars) that is trained on
+every energy the ring calculates. Each dihedral angle
+is turned into its cosine and sine, so that 0 and 359
+degrees are close together. Only numpy is needed."""
+
+import numpy as np
+
+# default number of energies needed before predictions are made
+MIN_POINTS = 50
+# default maximum number of energies to train on (the
+# most recent ones are kept)
+MAX_POINTS = 1000
+# default number of new energies between refits
+REFIT_EVERY = 25
+# noise variance, as a fraction of the energy variance
+NOISE = 1e-3
+# default number of standard deviations that a child's
+# summed energy could be below its prediction
+Z_SCORE = 2.0
+# default largest standard deviation (hartrees) of a
+# child's summed energy for the prediction to be trusted
+MAX_STD = 0.005
+
+
+def make_features(dihedrals):
+    """Turn dihedral angles into periodic features.
+
+    Parameters
+    ----------
+    dihedrals : np.ndarray(shape=(..., num_dihedrals))
+        Dihedral angles (degrees).
+
+    Returns
+    -------
+    features : np.ndarray(shape=(..., 2*num_dihedrals), dtype=float)
+        The cosine and sine of each dihedral angle.
+
+    """
+    angles = np.radians(np.asarray(dihedrals, float))
+    return np.concatenate([np.cos(angles), np.sin(angles)], axis=-1)
+
+
+class EnergySurrogate:
+    """Gaussian process model of the energy of a geometry."""
+
+    def __init__(self, min_points=MIN_POINTS, max_points=MAX_POINTS,
+                 refit_every=REFIT_EVERY, z=Z_SCORE, max_std=MAX_STD):
+        """Constructor for the energy surrogate.
+
+        Parameters
+        ----------
+        min_points : int
+            No predictions are made until the model has
+            been trained on this many energies.
+        max_points : int
+            The model is trained on (at most) this many of
+            the most recent energies. Fitting takes
+            max_points**3 time.
+        refit_every : int
+            The model is fit again after this many new
+            energies are added.
+        z : float
+            A child is only skipped if it would still be
+            less fit than the pmem it has to replace with
+            its summed energy z standard deviations lower
+            than predicted (see Ring.evaluate_pmems).
+        max_std : float
+            A child is never skipped if the standard
+            deviation (hartrees) of its summed energy is
+            larger than this; its energies are calculated
+            instead.
+
+        Attributes
+        ----------
+        num_predicted : int
+            Number of predicted energies that were later
+            calculated (see record).
+        abs_error : float
+            Sum of the absolute errors (hartrees) of those
+            predictions.
+        num_within : int
+            Number of those predictions whose error was
+            less than twice their standard deviation (about
+            95% for a well calibrated model).
+
+        """
+        self.min_points = min_points
+        self.max_points = max_points
+        self.refit_every = refit_every
+        self.z = z
+        self.max_std = max_std
+        self.num_predicted = 0
+        self.abs_error = 0.0
+        self.num_within = 0
+        self._features = None
+        self._energies = np.empty(0)
+        self._num_new = 0
+        self._fit = None
+
+    def __len__(self):
+        """Number of energies the model is trained on."""
+        return len(self._energies)
+
+    @property
+    def ready(self):
+        """True if the model can make predictions."""
+        return len(self) >= self.min_points
+
+    def add(self, dihedrals, energies):
+        """Add calculated energies to the training data.
+
+        Parameters
+        ----------
+        dihedrals : np.ndarray(shape=(num_points, num_dihedrals))
+            The dihedral angles of each geometry.
+        energies : np.ndarray(shape=num_points)
+            The energy (hartrees) of each geometry.
+
+        Returns
+        -------
+        None
+
+        """
+        features = make_features(dihedrals)
+        if self._features is None:
+            self._features = features
+        else:
+            self._features = np.concatenate([self._features, features])[-self.max_points:]
+        self._energies = np.concatenate([self._energies, energies])[-self.max_points:]
+        self._num_new += len(energies)
+        if self._num_new >= self.refit_every:
+            self._fit = None
+
+    def predict(self, dihedrals):
+        """Predict the energies of geometries.
+
+        Parameters
+        ----------
+        dihedrals : np.ndarray(shape=(..., num_dihedrals))
+
+        Raises
+        ------
+        ValueError
+            The model has fewer than min_points energies.
+
+        Returns
+        -------
+        mean : np.ndarray(shape=dihedrals.shape[:-1])
+            The predicted energy (hartrees) of each geometry.
+        std : np.ndarray(shape=dihedrals.shape[:-1])
+            The standard deviation of each prediction.
+
+        """
+        if not self.ready:
+            raise ValueError("The surrogate needs more energies to make predictions.")
+        if self._fit is None:
+            self._refit()
+        train_features, _, length, offset, scale, inverse, weights = self._fit
+        features = make_features(dihedrals)
+        shape = features.shape[:-1]
+        features = features.reshape(-1, train_features.shape[1])
+        kernel = self._kernel(features, train_features, length)
+        mean = offset + scale * kernel @ weights
+        var = 1 + NOISE - np.einsum('ij,jk,ik->i', kernel, inverse, kernel)
+        std = scale * np.sqrt(np.clip(var, 0, None))
+        return mean.reshape(shape), std.reshape(shape)
+
+    def record(self, mean, std, energies):
+        """Keep track of how good the predictions are.
+
+        Parameters
+        ----------
+        mean, std : np.ndarray
+            Predictions (see predict).
+        energies : np.ndarray
+            The calculated energies of the same geometries.
+
+        Returns
+        -------
+        None
+
+        """
+        errors = np.abs(np.asarray(energies) - mean)
+        self.num_predicted += errors.size
+        self.abs_error += float(errors.sum())
+        self.num_within += int(np.sum(errors < 2*np.asarray(std)))
+
+    def mean_abs_error(self):
+        """Mean absolute error (hartrees) of the recorded predictions."""
+        return self.abs_error / self.num_predicted if self.num_predicted else 0.0
+
+    def get_state(self):
+        """The training data and accuracy counters (see set_state).
+
+        The data that the model was last fit to is saved
+        as well, since the model is only fit again every
+        refit_every energies.
+
+        """
+        empty = np.empty((0, 0))
+        features = self._features if self._features is not None else empty
+        fit_features, fit_energies = self._fit[:2] if self._fit is not None \
+            else (empty, np.empty(0))
+        return {"surrogate_features": features, "surrogate_energies": self._energies,
+                "surrogate_fit_features": fit_features, "surrogate_fit_energies": fit_energies,
+                "surrogate_counters": np.array([self.num_predicted, self.abs_error,
+                                                self.num_within, self._num_new])}
+
+    def set_state(self, state):
+        """Restore the output of get_state."""
+        self._features = state["surrogate_features"] if state["surrogate_features"].size \
+            else None
+        self._energies = state["surrogate_energies"]
+        num_predicted, self.abs_error, num_within, num_new = state["surrogate_counters"]
+        self.num_predicted = int(num_predicted)
+        self.num_within = int(num_within)
+        self._fit = None
+        if state["surrogate_fit_energies"].size:
+            self._refit(state["surrogate_fit_features"], state["surrogate_fit_energies"])
+        self._num_new = int(num_new)
+
+    @staticmethod
+    def _sq_dists(features1, features2):
+        """Squared distances between two sets of features."""
+        sq_dists = np.sum(features1**2, axis=1)[:, None] + np.sum(features2**2, axis=1) \
+            - 2 * features1 @ features2.T
+        return np.clip(sq_dists, 0, None)
+
+    def _kernel(self, features1, features2, length):
+        """Squared exponential kernel between two sets of features."""
+        return np.exp(-self._sq_dists(features1, features2) / (2 * length**2))
+
+    def _refit(self, features=None, energies=None):
+        """Fit the model to the training data (or to the given data)."""
+        if features is None:
+            features, energies = self._features, self._energies
+        offset = energies.mean()
+        scale = energies.std() or 1.0
+        targets = (energies - offset) / scale
+        # length scale from the median distance between points
+        sq_dists = self._sq_dists(features, features)
+        length = np.sqrt(np.median(sq_dists[np.triu_indices(len(features), 1)]) / 2) or 1.0
+        kernel = self._kernel(features, features, length) + NOISE * np.eye(len(features))
+        inverse = np.linalg.inv(np.linalg.cholesky(kernel))
+        inverse = inverse.T @ inverse
+        self._fit = (features, energies, length, offset, scale, inverse, inverse @ targets)
+        self._num_new = 0
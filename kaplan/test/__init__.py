@@ -1,11 +1,28 @@
 """Test functions available in Kaplan."""
 
-from kaplan.test.test_gac import test_run_kaplan
+from kaplan.test.test_cache import test_energy_cache, test_calc_energies_cache,\
+                                   test_energy_store
+from kaplan.test.test_checkpoint import test_checkpoint, test_checkpointer,\
+                                        test_checkpoint_store
+from kaplan.test.test_gac import test_run_kaplan, test_record_phase
 from kaplan.test.test_ga_input import test_read_ga_input, test_verify_ga_input
 from kaplan.test.test_geometry import test_generate_parser, test_get_zmatrix_template,\
-                                      test_update_zmatrix, test_zmatrix_to_xyz
+                                      test_update_zmatrix, test_zmatrix_to_xyz,\
+                                      test_parse_zmatrix, test_zmatrix_to_coords,\
+                                      test_zmatrix_template, test_coords_to_dihedrals,\
+                                      test_get_rotatable_bonds, test_rotor_genes,\
+                                      test_find_clashes
 from kaplan.test.test_mol_input import test_read_mol_input, test_verify_mol_input
-from kaplan.test.test_mutations import test_generate_children
-from kaplan.test.test_ring import test_ring, test_ring_fill, test_ring_getitem
-from kaplan.test.test_rmsd import test_calc_rmsd
-from kaplan.test.test_tournament import test_run_tournament, test_select_pmems, test_select_parents
+from kaplan.test.test_mutations import test_generate_children, test_mutate, test_swap
+from kaplan.test.test_prescreen import test_force_field_screen
+from kaplan.test.test_refine import test_refiner
+from kaplan.test.test_ring import test_ring, test_ring_fill, test_ring_getitem,\
+                                  test_ring_evaluate_pmems, test_ring_arrays,\
+                                  test_ring_genotypes, test_ring_rotors,\
+                                  test_ring_prescreen, test_ring_clashes,\
+                                  test_ring_surrogate, test_ring_scf_guess
+from kaplan.test.test_rmsd import test_calc_rmsd, test_calc_rmsd_matrix
+from kaplan.test.test_stopping import test_calc_diversity, test_stopping_criteria
+from kaplan.test.test_surrogate import test_make_features, test_energy_surrogate
+from kaplan.test.test_tournament import test_run_tournament, test_select_pmems,\
+                                        test_select_parents, test_run_batch_tournaments
@@ -0,0 +1,95 @@
+"""Test the cache module of Kaplan."""
+
+import os
+import tempfile
+
+from numpy.testing import assert_raises
+
+from kaplan.cache import EnergyCache, EnergyStore
+from kaplan.fitg import calc_energies, FAILED_ENERGY
+
+
+def test_energy_cache():
+    """Test the EnergyCache object from the cache module."""
+    assert_raises(ValueError, EnergyCache, 0)
+    cache = EnergyCache(2)
+    key1 = cache.make_key([1, 2, 3], "hf", "sto-3g", 0, 1)
+    # same geometry, written differently
+    assert key1 == cache.make_key([361, 2.2, -357], "hf", "sto-3g", 0, 1)
+    # different level of theory, charge or multiplicity
+    assert key1 != cache.make_key([1, 2, 3], "hf", "6-31g", 0, 1)
+    assert key1 != cache.make_key([1, 2, 3], "hf", "sto-3g", 1, 2)
+    assert cache.get(key1) is None
+    assert cache.misses == 1
+    cache.put(key1, -1.5)
+    assert cache.get(key1) == -1.5
+    assert cache.hits == 1
+    assert cache.hit_rate() == 0.5
+    # least recently used key is removed when full
+    key2 = cache.make_key([4, 5, 6], "hf", "sto-3g", 0, 1)
+    key3 = cache.make_key([7, 8, 9], "hf", "sto-3g", 0, 1)
+    cache.put(key2, -2.5)
+    cache.get(key1)
+    cache.put(key3, -3.5)
+    assert len(cache) == 2
+    assert key1 in cache
+    assert key2 not in cache
+    assert key3 in cache
+    # the energies, their order and the counters are restored
+    new_cache = EnergyCache(2)
+    new_cache.set_state(cache.get_state())
+    assert list(new_cache._energies.items()) == list(cache._energies.items())
+    assert (new_cache.hits, new_cache.misses) == (cache.hits, cache.misses)
+    new_cache.set_state(EnergyCache().get_state())
+    assert len(new_cache) == 0
+
+
+def test_calc_energies_cache():
+    """Test that calc_energies uses the cache."""
+    cache = EnergyCache()
+    dihedrals = [[1, 2, 3], [4, 5, 6], [1, 2, 3]]
+    cache.put(cache.make_key(dihedrals[0], "hf", "sto-3g", 0, 1), -1.0)
+    cache.put(cache.make_key(dihedrals[1], "hf", "sto-3g", 0, 1), -2.0)
+    # all energies are known, so the geometries are not used
+    energies = calc_energies([None, None, None], 0, 1, "hf", "sto-3g",
+                             cache=cache, dihedrals=dihedrals)
+    assert list(energies) == [-1.0, -2.0, -1.0]
+    assert cache.hits == 2
+    assert cache.misses == 0
+    # a failed calculation gets the FAILED_ENERGY, but is not cached
+    energies = calc_energies([[["Xx", 0.0, 0.0, 0.0]]], 0, 1, "hf", "sto-3g",
+                             cache=cache, dihedrals=[[7, 8, 9]])
+    assert list(energies) == [FAILED_ENERGY]
+    assert cache.make_key([7, 8, 9], "hf", "sto-3g", 0, 1) not in cache
+
+
+def test_energy_store():
+    """Test the EnergyStore object from the cache module."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "energies.sqlite")
+        store1 = EnergyStore(filename, "mol1")
+        # second connection, like another Kaplan process
+        store2 = EnergyStore(filename, "mol1")
+        other_mol = EnergyStore(filename, "mol2")
+        key = store1.make_key([1, 2, 3], "hf", "sto-3g", 0, 1)
+        assert store1.get(key) is None
+        store1.put(key, -1.25)
+        assert store2.get(key) == -1.25
+        assert len(store2) == 1
+        # same dihedrals for another molecule
+        assert other_mol.get(key) is None
+        assert len(other_mol) == 0
+        # store sits behind an in-memory cache
+        cache = EnergyCache(10, store2)
+        assert cache.get(key) == -1.25
+        assert cache.hits == 1
+        assert key in cache
+        key2 = cache.make_key([4, 5, 6], "hf", "sto-3g", 0, 1)
+        cache.put(key2, -2.5)
+        assert store1.get(key2) == -2.5
+        for store in (store1, store2, other_mol):
+            store.close()
+        # energies are still there in a new run
+        store3 = EnergyStore(filename, "mol1")
+        assert len(store3) == 2
+        store3.close()
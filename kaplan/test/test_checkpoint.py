@@ -0,0 +1,100 @@
+"""Test the checkpoint module of Kaplan."""
+
+import os
+import random
+import tempfile
+
+from vetee.xyz import Xyz
+from numpy.testing import assert_raises
+
+import numpy as np
+
+from kaplan import mutations
+from kaplan.ring import Ring
+from kaplan.cache import EnergyStore
+from kaplan.stopping import StoppingCriteria
+from kaplan.checkpoint import save_checkpoint, load_checkpoint, Checkpointer
+
+# directory for this test file
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'testfiles')
+
+
+def make_ring(num_slots=15):
+    """Make an empty ring for 1,3-butadiene."""
+    parser = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    parser.charge = 0
+    parser.multip = 1
+    return Ring(3, 10, num_slots, 2, 0, 0.5, 0.5, parser)
+
+
+def random_draws():
+    """Draw from each of the random number generators."""
+    return (np.random.randint(0, 360, 5).tolist(), mutations.RNG.integers(0, 360, 5).tolist(),
+            [random.randint(0, 359) for _ in range(5)])
+
+
+def test_checkpoint():
+    """Test the save_checkpoint and load_checkpoint functions."""
+    ring = make_ring()
+    ring.fill(6, 0)
+    ring[2] = None
+    stopping = StoppingCriteria(stag_mevs=3)
+    stopping.check(ring, 0)
+    stopping.check(ring, 1)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, "checkpoint.npz")
+        save_checkpoint(filename, ring, 7, stopping)
+        assert os.listdir(temp_dir) == ["checkpoint.npz"]
+        draws = random_draws()
+        new_ring = make_ring()
+        new_stopping = StoppingCriteria(stag_mevs=3)
+        assert load_checkpoint(filename, new_ring, new_stopping) == 7
+        # the random number generators are restored
+        assert random_draws() == draws
+        # and so is the ring
+        for name in ("dihedrals", "fitness", "birthdays", "energies", "occupied"):
+            assert np.array_equal(getattr(ring, name), getattr(new_ring, name), equal_nan=True)
+        assert np.array_equal(ring.filled_slots, new_ring.filled_slots)
+        assert new_ring.num_filled == 5
+        assert new_ring.num_evals == ring.num_evals
+        assert new_ring.genotypes.keys() == ring.genotypes.keys()
+        for key, (fitness, energies, rmsds) in ring.genotypes.items():
+            assert new_ring.genotypes[key][0] == fitness
+            assert np.array_equal(new_ring.genotypes[key][1], energies)
+            assert np.array_equal(new_ring.genotypes[key][2], rmsds)
+        assert np.array_equal(new_stopping.get_history(), stopping.get_history())
+        # a ring of a different size cannot be restored
+        assert_raises(ValueError, load_checkpoint, filename, make_ring(20))
+
+
+def test_checkpoint_store():
+    """Test a checkpoint of a ring with an energy store and no cache."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # cache_size 0 and energy_store 1 in the ga input file
+        store = EnergyStore(os.path.join(temp_dir, "energies.sqlite"), "butadiene")
+        ring = make_ring()
+        ring.cache = store
+        ring.fill(3, 0)
+        filename = os.path.join(temp_dir, "checkpoint.npz")
+        save_checkpoint(filename, ring, 2)
+        new_ring = make_ring()
+        new_ring.cache = store
+        assert load_checkpoint(filename, new_ring) == 2
+        assert new_ring.cache is store
+        assert np.array_equal(ring.fitness, new_ring.fitness, equal_nan=True)
+        store.close()
+
+
+def test_checkpointer():
+    """Test the Checkpointer object from the checkpoint module."""
+    ring = make_ring()
+    ring.fill(3, 0)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, "checkpoint.npz")
+        checkpoint = Checkpointer(filename, every_mevs=3)
+        saved = [mev for mev in range(10) if checkpoint.update(ring, mev)]
+        assert saved == [2, 5, 8]
+        assert load_checkpoint(filename, make_ring()) == 8
+        # never saves if both are 0
+        checkpoint = Checkpointer(filename)
+        assert not any(checkpoint.update(ring, mev) for mev in range(10))
@@ -105,3 +105,54 @@ def test_verify_ga_input():
 
     ga_input_dict["t_size"] = 25
     assert_raises(AssertionError, verify_ga_input, ga_input_dict)
+    ga_input_dict["t_size"] = 7
+
+    # optional parameters get their default values
+    assert ga_input_dict["num_workers"] == 1
+    assert ga_input_dict["worker_threads"] == 1
+    assert ga_input_dict["worker_mem"] == 4.0
+
+    ga_input_dict["num_workers"] = 0
+    assert_raises(AssertionError, verify_ga_input, ga_input_dict)
+    ga_input_dict["num_workers"] = 4
+
+    assert ga_input_dict["num_pending"] == 0
+    ga_input_dict["num_pending"] = 1
+    assert_raises(AssertionError, verify_ga_input, ga_input_dict)
+    ga_input_dict["num_pending"] = 8
+    verify_ga_input(ga_input_dict)
+    ga_input_dict["num_workers"] = 1
+    assert_raises(AssertionError, verify_ga_input, ga_input_dict)
+    ga_input_dict["num_workers"] = 4
+
+    assert ga_input_dict["batch_size"] == 0
+    # cannot batch and run asynchronously at the same time
+    ga_input_dict["batch_size"] = 4
+    assert_raises(AssertionError, verify_ga_input, ga_input_dict)
+    ga_input_dict["num_pending"] = 0
+    verify_ga_input(ga_input_dict)
+    ga_input_dict["batch_size"] = -1
+    assert_raises(AssertionError, verify_ga_input, ga_input_dict)
+    ga_input_dict["batch_size"] = 0
+
+    # stopping criteria are off by default
+    assert ga_input_dict["stag_mevs"] == 0
+    assert ga_input_dict["max_evals"] == 0
+    ga_input_dict["stag_tol"] = "0.5"
+    verify_ga_input(ga_input_dict)
+    assert ga_input_dict["stag_tol"] == 0.5
+    ga_input_dict["min_diversity"] = 1.0
+    assert_raises(AssertionError, verify_ga_input, ga_input_dict)
+    ga_input_dict["min_diversity"] = 0.0
+    assert ga_input_dict["max_time"] == 0.0
+    ga_input_dict["max_time"] = -1
+    assert_raises(AssertionError, verify_ga_input, ga_input_dict)
+    ga_input_dict["max_time"] = 0.0
+    assert ga_input_dict["resume"] == 0
+    ga_input_dict["resume"] = 2
+    assert_raises(AssertionError, verify_ga_input, ga_input_dict)
+    ga_input_dict["resume"] = 0
+
+    ga_input_dict["worker_mem"] = "0.5"
+    verify_ga_input(ga_input_dict)
+    assert ga_input_dict["worker_mem"] == 0.5
@@ -2,8 +2,10 @@
 with some dummy input files."""
 
 import os
+from types import SimpleNamespace
 
-from kaplan.gac import run_kaplan
+from kaplan.gac import run_kaplan, record_phase
+from kaplan.stopping import StoppingCriteria
 
 # directory for this test file
 TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'testfiles')
@@ -17,3 +19,17 @@ def test_run_kaplan():
     test_ga2 = os.path.join(TEST_DIR, "example2_ga_input_file.txt")
     test_mol2 = os.path.join(TEST_DIR, "example2_mol_input_file.txt")
     run_kaplan(test_ga2, test_mol2)
+
+
+def test_record_phase():
+    """Test record_phase function from gac module."""
+    stopping = StoppingCriteria()
+    ring = SimpleNamespace(num_evals=5)
+    phases = {}
+    record_phase(phases, "fill", stopping, ring)
+    ring.num_evals = 12
+    record_phase(phases, "mating events", stopping, ring)
+    assert list(phases) == ["fill", "mating events"]
+    assert phases["fill"][1] == 5
+    assert phases["mating events"][1] == 7
+    assert sum(phase[0] for phase in phases.values()) <= stopping.elapsed()
@@ -2,10 +2,18 @@
 
 import os
 
-# from numpy.testing import assert_raises
+import numpy as np
+from numpy.testing import assert_raises
 
-from kaplan.geometry import generate_parser
+from kaplan.geometry import generate_parser, GeometryError, parse_zmatrix,\
+                            zmatrix_to_coords, coords_to_xyz, update_zmatrix,\
+                            ZMatrixTemplate, coords_to_dihedrals, get_rotatable_bonds,\
+                            find_rotor_dihedrals, get_zmatrix_template, find_clashes
 # get_zmatrix_template, update_zmatrix, zmatrix_to_xyz
+from vetee.xyz import Xyz
+
+import kaplan.geometry
+from kaplan.test.test_ring import CAFFEINE_ZMATRIX
 
 
 # directory for this test file
@@ -45,3 +53,190 @@ def test_update_zmatrix():
 
 def test_zmatrix_to_xyz():
     """Test zmatrix_to_xyz function from geometry module."""
+
+
+def calc_dihedral(coords1, coords2, coords3, coords4):
+    """Measure a dihedral angle (degrees, 0 to 360)."""
+    bond1 = coords1 - coords2
+    bond2 = (coords3 - coords2) / np.linalg.norm(coords3 - coords2)
+    bond3 = coords4 - coords3
+    vec1 = bond1 - np.dot(bond1, bond2)*bond2
+    vec2 = bond3 - np.dot(bond3, bond2)*bond2
+    angle = np.arctan2(np.dot(np.cross(bond2, vec1), vec2), np.dot(vec1, vec2))
+    return np.degrees(angle) % 360
+
+
+def test_parse_zmatrix():
+    """Test parse_zmatrix function from geometry module."""
+    atoms, connectivity, internals = parse_zmatrix(CAFFEINE_ZMATRIX)
+    assert len(atoms) == 24
+    assert atoms[:3] == ['O', 'O', 'N']
+    assert atoms[-1] == 'H'
+    assert connectivity.shape == (24, 3)
+    assert internals.shape == (24, 3)
+    # first atom has no references, second has a bond only
+    assert all(connectivity[0] == [-1, -1, -1])
+    assert all(connectivity[1] == [0, -1, -1])
+    # N  1  r4  2  a4  3  d4 (zero-based indices)
+    assert all(connectivity[3] == [0, 1, 2])
+    assert np.allclose(internals[3], [2.9916, 85.81, 0.02])
+    assert np.allclose(internals[23], [1.0947, 108.59, 301.39])
+    assert_raises(GeometryError, parse_zmatrix, "O\nO  1  r2\n")
+
+
+def test_zmatrix_to_coords():
+    """Test zmatrix_to_coords function from geometry module."""
+    atoms, connectivity, internals = parse_zmatrix(CAFFEINE_ZMATRIX)
+    coords = zmatrix_to_coords(connectivity, internals)
+    assert coords.shape == (24, 3)
+    # check the internal coordinates are reproduced
+    for i in range(1, 24):
+        bond_ref, angle_ref, dihedral_ref = connectivity[i]
+        assert np.isclose(np.linalg.norm(coords[i] - coords[bond_ref]), internals[i][0])
+        if i > 1:
+            vec1 = coords[i] - coords[bond_ref]
+            vec2 = coords[angle_ref] - coords[bond_ref]
+            angle = np.degrees(np.arccos(np.dot(vec1, vec2) /
+                                         (np.linalg.norm(vec1)*np.linalg.norm(vec2))))
+            assert np.isclose(angle, internals[i][1])
+        if i > 2:
+            dihedral = calc_dihedral(coords[i], coords[bond_ref],
+                                     coords[angle_ref], coords[dihedral_ref])
+            assert np.isclose((dihedral - internals[i][2] + 180) % 360, 180)
+    # now use new dihedral angles
+    dihedrals = np.arange(21) * 15
+    coords = zmatrix_to_coords(connectivity, internals, dihedrals)
+    for i in range(3, 24):
+        bond_ref, angle_ref, dihedral_ref = connectivity[i]
+        dihedral = calc_dihedral(coords[i], coords[bond_ref],
+                                 coords[angle_ref], coords[dihedral_ref])
+        assert np.isclose((dihedral - dihedrals[i-3] + 180) % 360, 180)
+    # a batch of pmems gives the same geometries as one at a time
+    batch = np.random.randint(0, 360, size=(4, 3, 21))
+    batch_coords = zmatrix_to_coords(connectivity, internals, batch)
+    assert batch_coords.shape == (4, 3, 24, 3)
+    for i in range(4):
+        assert np.allclose(batch_coords[i], zmatrix_to_coords(connectivity, internals, batch[i]))
+        for j in range(3):
+            assert np.allclose(batch_coords[i][j],
+                               zmatrix_to_coords(connectivity, internals, batch[i][j]))
+    # internals should not be changed by the new dihedrals
+    assert np.isclose(internals[3][2], 0.02)
+    xyz = coords_to_xyz(atoms, coords)
+    assert len(xyz) == 24
+    assert xyz[0] == ['O', 0.0, 0.0, 0.0]
+    assert xyz[5][1:] == list(coords[5])
+
+
+def test_zmatrix_template():
+    """Test the ZMatrixTemplate object from geometry module."""
+    template = ZMatrixTemplate(CAFFEINE_ZMATRIX)
+    assert template.num_atoms == 24
+    assert len(template.dihedral_lines) == 21
+    # no changes if the dihedrals are the same as the template
+    assert template.update(template.internals[3:, 2]) == \
+        update_zmatrix(CAFFEINE_ZMATRIX, template.internals[3:, 2])
+    dihedrals = np.random.randint(0, 360, size=21)
+    new_zmatrix = template.update(dihedrals)
+    assert new_zmatrix == update_zmatrix(CAFFEINE_ZMATRIX, dihedrals)
+    assert f"d4={dihedrals[0]}" in new_zmatrix.split('\n')
+    # template is unchanged by update
+    assert template.zmatrix == CAFFEINE_ZMATRIX
+    assert template.update(template.internals[3:, 2]) == \
+        update_zmatrix(CAFFEINE_ZMATRIX, template.internals[3:, 2])
+    # coordinates from template match coordinates from new zmatrix
+    assert np.allclose(template.to_coords(dihedrals),
+                       zmatrix_to_coords(*parse_zmatrix(new_zmatrix)[1:]))
+    xyz = template.to_xyz(dihedrals)
+    assert [atom[0] for atom in xyz] == template.atoms
+
+
+def test_coords_to_dihedrals():
+    """Test coords_to_dihedrals function from geometry module."""
+    template = ZMatrixTemplate(CAFFEINE_ZMATRIX)
+    # the template geometry gives back the template dihedrals
+    measured = template.to_dihedrals(template.to_coords())
+    assert np.allclose((measured - template.dihedrals + 180) % 360, 180)
+    # batch of geometries, moved and rotated
+    dihedrals = np.random.randint(0, 360, size=(4, 21))
+    coords = template.to_coords(dihedrals)
+    rotation = np.array([[0.0, -1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+    coords = coords @ rotation.T + [1.0, -2.0, 3.0]
+    measured = coords_to_dihedrals(template.connectivity, coords)
+    assert measured.shape == (4, 21)
+    assert np.allclose((measured - dihedrals + 180) % 360, 180)
+    assert np.all((measured >= 0) & (measured < 360))
+
+
+def test_get_rotatable_bonds():
+    """Test get_rotatable_bonds function from geometry module."""
+    parser = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    parser.charge = 0
+    parser.multip = 1
+    template = ZMatrixTemplate(get_zmatrix_template(parser))
+    # only the single bond between the two double bonds
+    bonds = get_rotatable_bonds(template.zmatrix)
+    assert len(bonds) == 1
+    assert [template.atoms[atom] for atom in bonds[0]] == ['C', 'C']
+    # the caffeine rings and methyl groups do not rotate
+    assert get_rotatable_bonds(CAFFEINE_ZMATRIX) == []
+
+
+def test_rotor_genes():
+    """Test the genes of the ZMatrixTemplate from geometry module."""
+    template = ZMatrixTemplate(CAFFEINE_ZMATRIX)
+    # each dihedral is its own gene by default
+    assert template.num_genes == 21
+    dihedrals = np.random.randint(0, 360, size=(2, 21))
+    assert template.expand_genes(dihedrals) is dihedrals
+    # atoms 6 and 7 (and 13, from the same references)
+    # turn about the bond between atoms 4 and 1; atom 11
+    # turns about the bond between atoms 6 and 4
+    bonds = [(0, 3), (5, 3)]
+    gene_map = find_rotor_dihedrals(template.connectivity, bonds)
+    assert np.flatnonzero(gene_map == 0).tolist() == [2, 3, 9]
+    assert np.flatnonzero(gene_map == 1).tolist() == [7]
+    assert template.use_rotors(bonds) == 2
+    assert template.gene_dihedrals.tolist() == [2, 7]
+    genes = np.random.randint(0, 360, size=(4, 3, 2))
+    dihedrals = template.expand_genes(genes)
+    assert dihedrals.shape == (4, 3, 21)
+    assert np.allclose(template.to_genes(dihedrals), genes)
+    # the other dihedrals keep their template values
+    fixed = gene_map < 0
+    assert np.allclose(dihedrals[..., fixed], template.dihedrals[fixed] % 360)
+    # atoms that turn together keep their offsets
+    offset = (template.dihedrals[3] - template.dihedrals[2]) % 360
+    assert np.allclose((dihedrals[..., 3] - dihedrals[..., 2]) % 360, offset)
+    # no rotatable bonds in the zmatrix
+    assert ZMatrixTemplate(CAFFEINE_ZMATRIX).use_rotors([(20, 21)]) == 0
+
+
+def test_find_clashes():
+    """Test find_clashes function from geometry module."""
+    template = ZMatrixTemplate(CAFFEINE_ZMATRIX)
+    assert template.radii[0] == 0.66
+    assert template.radii[-1] == 0.31
+    # the input geometry has no clashes
+    assert not find_clashes(template.to_coords(), template.radii)
+    # two hydrogens 0.3 Angstroms apart clash
+    assert find_clashes([[0.0, 0.0, 0.0], [0.0, 0.0, 0.3]], [0.31, 0.31])
+    assert not find_clashes([[0.0, 0.0, 0.0], [0.0, 0.0, 0.4]], [0.31, 0.31])
+    assert not find_clashes([[0.0, 0.0, 0.0], [0.0, 0.0, 0.3]], [0.31, 0.31], 0.4)
+    # batch of geometries
+    coords = template.to_coords(np.random.randint(0, 360, size=(2, 50, 21)))
+    clashes = find_clashes(coords, template.radii)
+    assert clashes.shape == (2, 50)
+    # the grid gives the same answers
+    grid_min_atoms = kaplan.geometry.GRID_MIN_ATOMS
+    try:
+        kaplan.geometry.GRID_MIN_ATOMS = 0
+        assert np.array_equal(find_clashes(coords, template.radii), clashes)
+        # including a large random molecule
+        radii = np.random.choice([0.31, 0.76], size=300)
+        coords = 10 * np.random.random((10, 300, 3))
+        grid_clashes = find_clashes(coords, radii)
+        kaplan.geometry.GRID_MIN_ATOMS = 1000
+        assert np.array_equal(find_clashes(coords, radii), grid_clashes)
+    finally:
+        kaplan.geometry.GRID_MIN_ATOMS = grid_min_atoms
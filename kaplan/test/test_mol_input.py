@@ -76,6 +76,19 @@ def test_verify_mol_input():
     mol_input_dict["charge"] = '0'
     mol_input_dict["multip"] = '1'
 
+    # the screen level defaults to the qcm/basis level
+    assert mol_input_dict["screen_qcm"] == mol_input_dict["screen_basis"] == ""
+    mol_input_dict["screen_basis"] = "3-21g"
+    verify_mol_input(mol_input_dict)
+    assert mol_input_dict["screen_qcm"] == "hf"
+    mol_input_dict["screen_basis"] = "not-a-basis"
+    mol_input_dict["charge"] = '0'
+    mol_input_dict["multip"] = '1'
+    assert_raises(ValueError, verify_mol_input, mol_input_dict)
+    mol_input_dict["screen_qcm"] = mol_input_dict["screen_basis"] = ""
+    mol_input_dict["charge"] = '0'
+    mol_input_dict["multip"] = '1'
+
     mol_input_dict["struct_input"] = "very-bad-smiles-string"
     assert_raises(ValueError, verify_mol_input, mol_input_dict)
     mol_input_dict["struct_input"] = "C=CC=C"
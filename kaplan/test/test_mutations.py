@@ -2,7 +2,9 @@
 
 from numpy.testing import assert_raises
 
-from kaplan.mutations import generate_children
+import numpy as np
+
+from kaplan.mutations import generate_children, mutate, swap
 
 # num muts num swaps
 
@@ -13,8 +15,8 @@ def test_generate_children():
     parent2 = [[-6, -7, -8, -9, -10], [-6, -7, -8, -9, -10], [-6, -7, -8, -9, -10]]
     # no changes are applied
     child1, child2 = generate_children(parent1, parent2, 0, 0)
-    assert child1 == parent1
-    assert child2 == parent2
+    assert np.array_equal(child1, parent1)
+    assert np.array_equal(child2, parent2)
     # make maximum of one mutation (to each child, for each geom)
     child1, child2 = generate_children(parent1, parent2, 1, 0)
     # go through changes and assert maximum 6 changes were made
@@ -33,11 +35,11 @@ def test_generate_children():
     child1, child2 = generate_children(parent1, parent2, 0, 1)
     num_changes1 = 0
     for i, geom in enumerate(child1):
-        if geom != parent1[i]:
+        if np.any(geom != parent1[i]):
             num_changes1 += 1
     num_changes2 = 0
     for i, geom in enumerate(child2):
-        if geom != parent2[i]:
+        if np.any(geom != parent2[i]):
             num_changes2 += 1
     assert num_changes1 == num_changes2
     assert num_changes1 <= 1
@@ -53,3 +55,41 @@ def test_generate_children():
     generate_children(parent1, parent2, 4, 3)
     generate_children(parent1, parent2, 5, 2)
     generate_children(parent1, parent2, 3, 2)
+    # the parents are not changed
+    assert parent1[0] == [-1, -2, -3, -4, -5]
+    # batch of 4 pairs of parents
+    parents1 = np.array([parent1]*4)
+    parents2 = np.array([parent2]*4)
+    children1, children2 = generate_children(parents1, parents2, 0, 3)
+    assert children1.shape == (4, 3, 5)
+    # swapped geometries keep their index
+    assert np.all((children1 == parents1) | (children1 == parents2))
+    assert np.all((children1 == parents1) == (children2 == parents2))
+
+
+def test_mutate():
+    """Test the mutate function from the mutations module."""
+    rng = np.random.default_rng(42)
+    dihedrals = np.full((100, 3, 5), -1)
+    mutated = mutate(dihedrals, 2, rng)
+    assert np.all(dihedrals == -1)
+    num_changes = (mutated != -1).sum(axis=-1)
+    assert num_changes.max() == 2
+    assert num_changes.min() == 0
+    assert np.all(mutated[mutated != -1] < 360)
+    assert np.all(mutated[mutated != -1] >= 0)
+    # same generator state gives the same mutations
+    assert np.array_equal(mutate(dihedrals, 2, np.random.default_rng(42)), mutated)
+
+
+def test_swap():
+    """Test the swap function from the mutations module."""
+    rng = np.random.default_rng(7)
+    child1 = np.zeros((50, 4, 2), int)
+    child2 = np.ones((50, 4, 2), int)
+    new1, new2 = swap(child1, child2, 4, rng)
+    # whole geometries are swapped
+    assert np.all(new1.min(axis=-1) == new1.max(axis=-1))
+    assert np.array_equal(new1 + new2, child1 + child2)
+    assert new1.sum(axis=(1, 2)).max() <= 8
+    assert new1.sum() > 0
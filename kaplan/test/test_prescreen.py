@@ -0,0 +1,38 @@
+"""Test the prescreen module of Kaplan."""
+
+import os
+
+from vetee.xyz import Xyz
+
+import numpy as np
+
+from kaplan.geometry import get_zmatrix_template, ZMatrixTemplate
+from kaplan.prescreen import ForceFieldScreen
+
+# directory for this test file
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'testfiles')
+
+
+def test_force_field_screen():
+    """Test the ForceFieldScreen object from the prescreen module."""
+    parser = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    parser.charge = 0
+    parser.multip = 1
+    template = ZMatrixTemplate(get_zmatrix_template(parser))
+    screen = ForceFieldScreen(template.zmatrix, 10.0)
+    assert screen.forcefield in ("MMFF94", "UFF")
+    coords = template.to_coords()
+    energy = screen.calc_energies(coords)
+    assert energy.shape == ()
+    # the energy does not depend on where the molecule is
+    assert np.isclose(screen.calc_energies(coords + 5.0), energy)
+    # squashing the molecule costs a lot of energy
+    energies = screen.calc_energies([coords, 0.5*coords])
+    assert energies.shape == (2,)
+    assert np.isclose(energies[0], energy)
+    assert energies[1] > energy + 100
+    # nothing is rejected until the ring has energies
+    assert not screen.reject([[energies[1]]], np.full((3, 2), np.nan)).any()
+    ring_energies = np.array([[energy, np.nan], [energy + 1.0, energy + 2.0]])
+    rejected = screen.reject([[energy + 5.0, np.nan], [energy, energy + 11.0]], ring_energies)
+    assert rejected.tolist() == [False, True]
@@ -0,0 +1,53 @@
+"""Test the refine module of Kaplan."""
+
+import os
+
+from vetee.xyz import Xyz
+
+import numpy as np
+
+from kaplan.ring import Ring
+from kaplan.refine import Refiner
+
+# directory for this test file
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'testfiles')
+
+
+def test_refiner():
+    """Test the Refiner object from the refine module."""
+    parser = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    parser.charge = 0
+    parser.multip = 1
+    parser.method = "hf"
+    parser.basis = "sto-3g"
+    ring = Ring(3, 10, 15, 2, 0, 0.5, 0.5, parser)
+    ring.clash_scale = 0.0
+    ring.fill(4, 0)
+    # with the same level as the ring, the fitness is the same
+    refiner = Refiner("hf", "sto-3g", 2, every_mevs=3)
+    assert refiner.refine(ring) == 2
+    best = sorted(ring.fitness[ring.filled_slots])[-2:]
+    assert np.allclose(sorted(pmem.fitness for pmem in refiner.refined.values()), best)
+    # and the energies come from the cache
+    assert refiner.num_evals == 0
+    # pmems are only refined once
+    assert refiner.refine(ring) == 0
+    # every 3 mating events
+    assert [refiner.update(ring, mev) for mev in range(6)] == \
+        [False, False, True, False, False, True]
+    ring.fill(2, 6)
+    assert refiner.update(ring, 8)
+    # batches that pass a multiple of 3 also refine
+    assert not refiner.update(ring, 10)
+    assert refiner.update(ring, 12)
+    # the state gives the same refined pmems
+    new_refiner = Refiner("hf", "sto-3g", 2, every_mevs=3)
+    new_refiner.set_state(refiner.get_state())
+    assert new_refiner.refined.keys() == refiner.refined.keys()
+    assert new_refiner.last_mev == 12
+    # the ring ends up with the refined pmems, fittest first
+    num_refined = len(refiner.refined)
+    refiner.rerank(ring)
+    assert ring.num_filled == num_refined
+    assert np.array_equal(np.sort(ring.filled_slots), np.arange(num_refined))
+    assert ring.fitness[0] == np.nanmax(ring.fitness)
@@ -1,12 +1,19 @@
 """Test the ring module from Kaplan."""
 
 import os
+import tempfile
 
 from vetee.xyz import Xyz
 from numpy.testing import assert_raises
 
-from kaplan.ring import Ring, RingEmptyError, RingOverflowError
-from kaplan.pmem import Pmem
+import numpy as np
+
+from kaplan.ring import Ring, RingEmptyError, RingOverflowError, CLASH_ENERGY
+from kaplan.pmem import Pmem, PmemView
+from kaplan.mutations import generate_children
+from kaplan.prescreen import ForceFieldScreen
+from kaplan.surrogate import EnergySurrogate
+from kaplan import energy
 
 
 # directory for this test file
@@ -73,6 +80,14 @@ def test_ring_fill():
     assert ring[11] is not None
     assert ring[12] is None
     assert ring[8].birthday == 3
+    # start from known conformers
+    ring = Ring(3, 10, 15, 2, 0, 0.5, 0.5, parser)
+    seeds = np.array([[10, 20, 30, 40, 50, 60, 70], [11, 21, 31, 41, 51, 61, 71],
+                      [12, 22, 32, 42, 52, 62, 72], [-1, 0, 0, 0, 0, 0, 360.2]])
+    ring.fill(3, 0, seeds)
+    assert np.array_equal(ring[0].dihedrals, seeds[:3])
+    assert np.array_equal(ring[1].dihedrals[0], [359, 0, 0, 0, 0, 0, 0])
+    assert ring.num_filled == 3
 
 
 def test_ring_getitem():
@@ -110,6 +125,39 @@ def test_ring_setitem():
     assert ring.num_filled == 0
 
 
+def test_ring_arrays():
+    """Test that the ring keeps pmem data in its arrays."""
+    parser = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    parser.charge = 0
+    parser.multip = 1
+    ring = Ring(3, 10, 15, 2, 0, 0.5, 0.5, parser)
+    assert ring.dihedrals.shape == (15, 3, 7)
+    assert ring.fitness.shape == (15,)
+    assert ring.birthdays.shape == (15,)
+    assert not ring.occupied.any()
+    ring.fill(4, 2)
+    assert np.array_equal(ring.occupied, np.arange(15) < 4)
+    assert np.all(ring.birthdays[:4] == 2)
+    assert not np.isnan(ring.fitness[:4]).any()
+    assert np.isnan(ring.fitness[4:]).all()
+    # pmems in the ring are views of the arrays
+    pmem = ring[1]
+    assert isinstance(pmem, PmemView)
+    assert pmem.ring_loc == 1
+    assert pmem.fitness == ring.fitness[1]
+    pmem.dihedrals[0][0] = 17
+    assert ring.dihedrals[1][0][0] == 17
+    # adding a pmem copies its data
+    new_pmem = Pmem(6, 3, 10, 5)
+    ring[6] = new_pmem
+    assert np.array_equal(ring.dihedrals[6], new_pmem.dihedrals)
+    assert ring.birthdays[6] == 5
+    assert ring[6].fitness is None
+    ring[6] = None
+    assert not ring.occupied[6]
+    assert ring.num_filled == 4
+
+
 def test_ring_update():
     """Test the Ring.update method."""
     # parent_index, child, current_mev
@@ -168,13 +216,212 @@ def test_ring_update():
     ring.update(0, [[132, 272, 40, 226, 44, 154, 339],
                     [182, 119, 106, 157, 194, 244, 168],
                     [95, 81, 202, 261, 197, 166, 161]], 1)
-    assert ring[0].dihedrals == [[239, 278, 5, 248, 40, 67, 299],
-                                 [36, 123, 295, 111, 322, 267, 170],
-                                 [61, 130, 26, 139, 290, 238, 331]]
+    assert np.array_equal(ring[0].dihedrals, [[239, 278, 5, 248, 40, 67, 299],
+                                              [36, 123, 295, 111, 322, 267, 170],
+                                              [61, 130, 26, 139, 290, 238, 331]])
     assert ring.num_filled == 1
     assert ring[0].birthday == 0
 
 
+def test_ring_evaluate_pmems():
+    """Test the Ring.evaluate_pmems method."""
+    parser = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    parser.charge = 0
+    parser.multip = 1
+    ring = Ring(3, 10, 15, 2, 0, 0.5, 0.5, parser)
+    ring.fill(2, 0)
+    parent1 = ring[0]
+    parent2 = ring[1]
+    assert parent1.energies.shape == (3,)
+    assert parent1.coords.shape == (3, 10, 3)
+    # children made only by swapping geometries keep the
+    # parents' energies and coordinates
+    children = [Pmem(None, 3, 10, 1, child)
+                for child in generate_children(parent1.dihedrals, parent2.dihedrals, 0, 1)]
+    fitness = ring.evaluate_pmems(children, [parent1, parent2])
+    for child in children:
+        for i in range(3):
+            parent = parent1 if np.all(child.dihedrals[i] == parent1.dihedrals[i]) else parent2
+            assert child.energies[i] == parent.energies[i]
+            assert np.allclose(child.coords[i], parent.coords[i])
+    # same fitness as evaluating from scratch
+    assert np.allclose(fitness, ring.evaluate_batch([children[0].dihedrals,
+                                                     children[1].dihedrals]))
+
+
+def test_ring_genotypes():
+    """Test that the ring does not evaluate the same pmem twice."""
+    parser = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    parser.charge = 0
+    parser.multip = 1
+    ring = Ring(3, 10, 15, 2, 0, 0.5, 0.5, parser)
+    ring.fill(2, 0)
+    dihedrals = ring[0].dihedrals.copy()
+    assert len(ring.genotypes) == 2
+    # the order of the geometries does not change the key
+    assert ring.genotype_key(dihedrals) == ring.genotype_key(dihedrals[::-1])
+    assert ring.genotype_key(dihedrals) == ring.genotype_key(dihedrals + 360)
+    assert ring.evaluate(dihedrals[::-1]) == ring[0].fitness
+    assert ring.num_known == 1
+    # a known pmem gets the energies, coords and rmsds too
+    pmem = Pmem(None, 3, 10, 1, dihedrals[::-1])
+    ring.evaluate_pmems([pmem])
+    assert ring.num_known == 2
+    assert np.array_equal(pmem.energies, ring[0].energies[::-1])
+    assert np.allclose(pmem.coords, ring[0].coords[::-1])
+    assert np.allclose(pmem.rmsds, ring[0].rmsds[::-1, ::-1])
+    # a clone of a pmem in the ring is not added
+    assert ring.in_ring(dihedrals)
+    assert ring.in_ring(dihedrals[::-1])
+    assert not ring.in_ring(dihedrals[::-1] + 1)
+    ring.update(0, dihedrals, 1)
+    assert ring.num_clones == 1
+    assert ring.num_known == 2
+    assert ring.num_filled == 2
+    # an emptied slot is no longer counted
+    ring[0] = None
+    assert not ring.in_ring(dihedrals)
+
+
+def test_ring_rotors():
+    """Test a ring that only evolves the rotatable dihedrals."""
+    parser = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    parser.charge = 0
+    parser.multip = 1
+    ring = Ring(3, 10, 15, 2, 0, 0.5, 0.5, parser, rotors=True)
+    assert ring.num_genes == 1
+    assert ring.dihedrals.shape == (15, 3, 1)
+    # the input geometry is kept as a seed
+    ring.fill(4, 0, [ring.template.dihedrals])
+    assert ring.num_filled == 4
+    assert ring[0].dihedrals[0][0] == \
+        round(ring.template.dihedrals[ring.template.gene_dihedrals[0]]) % 360
+    assert ring[0].coords.shape == (3, 10, 3)
+    assert not np.isnan(ring.fitness[ring.filled_slots]).any()
+    # children have the same number of genes
+    child = generate_children(ring[0].dihedrals, ring[1].dihedrals, 1, 1)[0]
+    ring.update(0, child, 1)
+    assert ring.dihedrals.shape == (15, 3, 1)
+
+
+def test_ring_prescreen():
+    """Test a ring with a force field prescreen."""
+    parser = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    parser.charge = 0
+    parser.multip = 1
+    ring = Ring(3, 10, 15, 2, 0, 0.5, 0.5, parser)
+    # with a negative window every child is rejected
+    ring.prescreen = ForceFieldScreen(ring.zmatrix, -1e6)
+    # but the pmems that fill the ring are not screened
+    ring.fill(4, 0)
+    assert ring.num_filled == 4
+    assert not np.isnan(ring.ff_energies[ring.filled_slots]).any()
+    assert ring[0].ff_energies.shape == (3,)
+    num_evals = ring.num_evals
+    child = generate_children(ring[0].dihedrals, ring[1].dihedrals, 2, 0)[0]
+    while ring.in_ring(child):
+        child = generate_children(ring[0].dihedrals, ring[1].dihedrals, 2, 0)[0]
+    ring.update(0, child, 1)
+    assert ring.num_rejected == 1
+    assert ring.num_evals == num_evals
+    assert ring.num_filled == 4
+    # the rejected child is remembered
+    assert np.isnan(ring.evaluate(child))
+    assert ring.num_rejected == 1
+    assert ring.genotype_key(child) not in ring.genotypes
+    # but it is evaluated if it is put in the ring
+    ring[5] = Pmem(5, 3, 10, 1, child)
+    ring.set_fitness(5)
+    assert not np.isnan(ring.fitness[5])
+    assert ring.genotype_key(child) in ring.genotypes
+
+
+def test_ring_clashes():
+    """Test that geometries with clashing atoms are not calculated."""
+    parser = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    parser.charge = 0
+    parser.multip = 1
+    ring = Ring(3, 10, 15, 2, 0, 0.5, 0.5, parser)
+    # the bonded carbon atoms clash
+    ring.clash_scale = 0.99
+    ring.fill(2, 0)
+    assert ring.num_clashes == 6
+    assert ring.num_evals == 0
+    assert np.all(ring.energies[ring.filled_slots] == CLASH_ENERGY)
+    # no clash check
+    ring.clash_scale = 0.0
+    ring.fill(1, 1)
+    assert ring.num_clashes == 6
+    assert ring.num_evals == 3
+
+
+def test_ring_surrogate():
+    """Test a ring that skips children with a surrogate."""
+    parser = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    parser.charge = 0
+    parser.multip = 1
+    ring = Ring(3, 10, 15, 2, 0, 0.5, 0.5, parser)
+    ring.clash_scale = 0.0
+    # trust every prediction
+    ring.surrogate = EnergySurrogate(min_points=6, z=0.0, max_std=1e6)
+    # the pmems that fill the ring are calculated, and
+    # their energies are used to train the surrogate
+    ring.fill(4, 0)
+    assert len(ring.surrogate) == 12
+    assert ring.num_evals == 12
+    children = [Pmem(None, 3, 10, 1, generate_children(ring[0].dihedrals,
+                                                       ring[1].dihedrals, 2, 0)[0])
+                for _ in range(2)]
+    children = [child for child in children if not ring.in_ring(child.dihedrals)]
+    # no child can reach an infinite fitness
+    parents = [ring[0], ring[1]]
+    fitness = ring.evaluate_pmems(children, parents, targets=np.full(len(children), np.inf))
+    assert np.isnan(fitness).all()
+    assert ring.num_skipped == len(children)
+    assert ring.num_evals == 12
+    # but every child gets into an empty slot
+    fitness = ring.evaluate_pmems(children, parents, targets=np.full(len(children), np.nan))
+    assert not np.isnan(fitness).any()
+    assert ring.num_skipped == len(children)
+    # the predictions are checked against the new energies
+    assert ring.surrogate.num_predicted == ring.num_evals - 12
+    assert len(ring.surrogate) == ring.num_evals
+    assert "surrogate_energies" in ring.get_state()
+
+
+def test_ring_scf_guess():
+    """Test a ring that starts the SCF from the parents' orbitals."""
+    parser = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    parser.charge = 0
+    parser.multip = 1
+    ring = Ring(3, 10, 15, 2, 0, 0.5, 0.5, parser)
+    ring.clash_scale = 0.0
+    # the worker settings are module globals, so put them back afterwards
+    settings = (energy.RAM, energy.NUM_THREADS, energy.ORBITAL_DIR)
+    with tempfile.TemporaryDirectory() as orbital_dir:
+        energy.init_worker("1 GB", 1, orbital_dir)
+        try:
+            ring.fill(2, 0)
+            assert ring._guesses(ring.dihedrals[0], [ring[0]]) is None
+            ring.scf_guess = 1
+            children = [Pmem(None, 3, 10, 1, ring[0].dihedrals.copy())]
+            children[0].dihedrals[0][0] += 10
+            guesses = ring._guesses(children[0].dihedrals, [ring[0], ring[1]])
+            # only the changed geometry differs from its parent
+            assert all(np.array_equal(guess, ring[0].dihedrals[i])
+                       for i, guess in enumerate(guesses))
+            ring.evaluate_pmems(children, [ring[0], ring[1]])
+            # the same energies as with the usual guess
+            ring.scf_guess = 0
+            ring.cache = None
+            ring.genotypes = None
+            energies = children[0].energies.copy()
+            ring.evaluate_pmems(children, [ring[0], ring[1]])
+            assert np.allclose(children[0].energies, energies, atol=1e-6)
+        finally:
+            energy.RAM, energy.NUM_THREADS, energy.ORBITAL_DIR = settings
+
+
 CAFFEINE_ZMATRIX = """#Put Keywords Here, check Charge and Multiplicity.
 
  caffeine from pubchem
@@ -2,8 +2,9 @@
 
 import os
 
+import numpy as np
 from vetee.xyz import Xyz
-from kaplan.rmsd import calc_rmsd
+from kaplan.rmsd import calc_rmsd, calc_rmsd_matrix
 
 
 # directory for this test file
@@ -21,3 +22,26 @@ def test_calc_rmsd():
     assert calc_rmsd(mol1.coords, mol1tr.coords) == 0.0
     # test same molecule twice
     assert calc_rmsd(mol1.coords, mol1.coords) == 0.0
+
+
+def test_calc_rmsd_matrix():
+    """Test the calc_rmsd_matrix function from the rmsd module."""
+    names = ["H2-1A.xyz", "H2-2A.xyz", "H2-3A.xyz", "H2-1A-transrot.xyz"]
+    mols = [Xyz(os.path.join(TEST_DIR, name)).coords for name in names]
+    coords = np.array([[atom[1:] for atom in mol] for mol in mols], float)
+    rmsd_matrix = calc_rmsd_matrix(coords)
+    assert rmsd_matrix.shape == (4, 4)
+    assert np.allclose(rmsd_matrix, rmsd_matrix.T)
+    assert np.allclose(np.diag(rmsd_matrix), 0.0)
+    # same values as one pair at a time
+    for i in range(4):
+        for j in range(4):
+            assert np.isclose(rmsd_matrix[i][j], calc_rmsd(mols[i], mols[j]))
+    # a single geometry has no pairs
+    assert calc_rmsd_matrix(coords[:1]).shape == (1, 1)
+    # known values are kept and only the missing pairs are calculated
+    known = np.full((4, 4), np.nan)
+    known[:2, :2] = rmsd_matrix[:2, :2]
+    assert np.allclose(calc_rmsd_matrix(coords, known), rmsd_matrix)
+    known[0][1] = known[1][0] = 5.0
+    assert calc_rmsd_matrix(coords, known)[0][1] == 5.0
@@ -0,0 +1,70 @@
+"""Test the stopping module of Kaplan."""
+
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from kaplan.stopping import StoppingCriteria, calc_diversity
+
+
+def make_ring(fitness, dihedrals=None, num_evals=0):
+    """Make an object with the ring attributes used by StoppingCriteria."""
+    fitness = np.array(fitness, float)
+    if dihedrals is None:
+        dihedrals = np.random.randint(0, 360, size=(len(fitness), 3, 5))
+    return SimpleNamespace(fitness=fitness, filled_slots=np.arange(len(fitness)),
+                           dihedrals=np.asarray(dihedrals), num_evals=num_evals)
+
+
+def test_calc_diversity():
+    """Test the calc_diversity function from the stopping module."""
+    same = np.full((4, 3, 5), 120)
+    assert np.isclose(calc_diversity(same), 0.0)
+    # angles are periodic
+    assert np.isclose(calc_diversity([[[0]], [[360]]]), 0.0)
+    # opposite angles cancel out
+    assert np.isclose(calc_diversity([[[10]], [[190]]]), 1.0)
+    assert 0 < calc_diversity([[[10]], [[100]]]) < 1
+    assert calc_diversity(same[:1]) == 0.0
+
+
+def test_stopping_criteria():
+    """Test the StoppingCriteria object from the stopping module."""
+    # nothing is checked by default
+    stopping = StoppingCriteria()
+    ring = make_ring([1.0, 2.0], np.zeros((2, 3, 5)), 10**6)
+    for mev in range(100):
+        assert not stopping.check(ring, mev)
+    assert stopping.reason is None
+    # target fitness
+    stopping = StoppingCriteria(target_fitness=5.0)
+    assert not stopping.check(make_ring([1.0, 4.9]), 0)
+    assert stopping.check(make_ring([1.0, 5.0]), 1)
+    assert stopping.mev == 1
+    assert "target" in stopping.reason
+    # once stopped, stays stopped
+    assert stopping.check(make_ring([1.0]), 2)
+    assert stopping.mev == 1
+    # max evals
+    stopping = StoppingCriteria(max_evals=50)
+    assert not stopping.check(make_ring([1.0, 2.0], num_evals=49), 0)
+    assert stopping.check(make_ring([1.0, 2.0], num_evals=50), 1)
+    # diversity floor
+    stopping = StoppingCriteria(min_diversity=0.1)
+    assert not stopping.check(make_ring([1.0, 2.0], [[[0]], [[180]]]), 0)
+    assert stopping.check(make_ring([1.0, 2.0], [[[0]], [[1]]]), 1)
+    # stagnation over 3 mating events
+    stopping = StoppingCriteria(stag_mevs=3, stag_tol=0.5)
+    for mev, best in enumerate([1.0, 2.0, 3.0, 4.0, 4.2, 4.4]):
+        assert not stopping.check(make_ring([0.0, best]), mev)
+    assert stopping.check(make_ring([0.0, 4.4]), 6)
+    assert stopping.mev == 6
+    assert "3 mating events" in stopping.reason
+    # time limit
+    stopping = StoppingCriteria(max_time=0.01)
+    assert not stopping.check(make_ring([1.0, 2.0]), 0)
+    time.sleep(0.02)
+    assert stopping.elapsed() >= 0.01
+    assert stopping.check(make_ring([1.0, 2.0]), 1)
+    assert "time limit" in stopping.reason
@@ -0,0 +1,53 @@
+"""Test the surrogate module of Kaplan."""
+
+from numpy.testing import assert_raises
+
+import numpy as np
+
+from kaplan.surrogate import EnergySurrogate, make_features
+
+
+def torsion_energy(dihedrals):
+    """A smooth, periodic energy (hartrees) of some dihedral angles."""
+    angles = np.radians(dihedrals)
+    return -100 + 0.002*np.cos(angles).sum(axis=-1) + 0.001*np.sin(2*angles[..., 0])
+
+
+def test_make_features():
+    """Test the make_features function from the surrogate module."""
+    features = make_features([[0, 90], [180, 270]])
+    assert features.shape == (2, 4)
+    assert np.allclose(features, [[1, 0, 0, 1], [-1, 0, 0, -1]])
+    # 0 and 360 degrees are the same angle
+    assert np.allclose(make_features([0, 359]), make_features([360, -1]))
+
+
+def test_energy_surrogate():
+    """Test the EnergySurrogate object from the surrogate module."""
+    rng = np.random.default_rng(0)
+    surrogate = EnergySurrogate(min_points=10, max_points=300, refit_every=10)
+    assert not surrogate.ready
+    assert_raises(ValueError, surrogate.predict, [[0, 0, 0]])
+    for _ in range(40):
+        dihedrals = rng.integers(0, 360, (10, 3))
+        surrogate.add(dihedrals, torsion_energy(dihedrals))
+    # only the most recent max_points energies are kept
+    assert len(surrogate) == 300
+    assert surrogate.ready
+    dihedrals = rng.integers(0, 360, (4, 5, 3))
+    mean, std = surrogate.predict(dihedrals)
+    assert mean.shape == std.shape == (4, 5)
+    energies = torsion_energy(dihedrals)
+    assert np.abs(mean - energies).max() < 5e-4
+    assert np.all(std > 0)
+    surrogate.record(mean, std, energies)
+    assert surrogate.num_predicted == 20
+    assert np.isclose(surrogate.mean_abs_error(), np.abs(mean - energies).mean())
+    assert surrogate.num_within >= 15
+    # the state gives the same predictions (and counters)
+    surrogate.add([[1, 2, 3]], torsion_energy(np.array([[1, 2, 3]])))
+    restored = EnergySurrogate(min_points=10, max_points=300, refit_every=10)
+    restored.set_state(surrogate.get_state())
+    assert np.array_equal(restored.predict(dihedrals)[0], surrogate.predict(dihedrals)[0])
+    assert restored.num_predicted == 20
+    assert len(restored) == 300
@@ -5,8 +5,10 @@ import os
 from vetee.xyz import Xyz
 from numpy.testing import assert_raises
 
-from kaplan.tournament import run_tournament
-# , select_pmems, select_parents
+import numpy as np
+
+from kaplan.tournament import run_tournament, select_pmems, run_batch_tournaments
+# , select_parents
 from kaplan.ring import Ring, RingEmptyError
 
 # directory for this test file
@@ -37,8 +39,34 @@ def test_run_tournament():
 #    run_tournament(4, 3, 1, ring, 0)
 
 
+def test_run_batch_tournaments():
+    """Test run_batch_tournaments function from tournament module."""
+    mol = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    mol.charge = 0
+    mol.multip = 1
+    ring = Ring(3, 10, 20, 2, 0, 0.5, 0.5, mol)
+    ring.fill(3, 0)
+    assert_raises(RingEmptyError, run_batch_tournaments, 2, 7, 0, 0, ring, 1)
+    run_batch_tournaments(4, 2, 1, 1, ring, 1)
+    # children have the birthdays of their own tournament
+    assert set(ring.birthdays[ring.occupied]) <= {0, 1, 2, 3, 4}
+    assert not np.isnan(ring.fitness[ring.occupied]).any()
+
+
 def test_select_pmems():
     """Test select_pmems function from tournament module."""
+    mol = Xyz(os.path.join(TEST_DIR, "1,3-butadiene.xyz"))
+    mol.charge = 0
+    mol.multip = 1
+    ring = Ring(3, 10, 100, 2, 0, 0.5, 0.5, mol)
+    ring.fill(4, 0)
+    # make the ring sparse
+    ring[1] = None
+    ring[2] = None
+    assert sorted(ring.filled_slots) == [0, 3]
+    for _ in range(10):
+        assert sorted(select_pmems(2, ring)) == [0, 3]
+    assert_raises(RingEmptyError, select_pmems, 3, ring)
 
 
 def test_select_parents():
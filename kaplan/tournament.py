@@ -3,6 +3,7 @@ pick from the ring in order to apply updates
 to the population."""
 
 import numpy as np
+from kaplan.pmem import Pmem
 from kaplan.ring import RingEmptyError
 from kaplan.mutations import generate_children
 
@@ -32,6 +33,109 @@ def run_tournament(t_size, num_muts, num_swaps, ring,
     -------
     None
 
+    """
+    parents, children = make_children(t_size, num_muts, num_swaps, ring)
+    children = [Pmem(None, ring.num_geoms, ring.num_atoms, current_mev, child)
+                for child in children]
+
+    # choose the children's slots first, so that the ring's
+    # surrogate (if it has one) can skip a child that would
+    # not replace the pmem in its slot
+    slot1 = ring.choose_slot(parents[0])
+    slot0 = ring.choose_slot(parents[1])
+    # evaluate both children together (only the geometries
+    # that differ from the parents), then put them in ring
+    ring.evaluate_pmems(children, [ring[parents[0]], ring[parents[1]]],
+                        targets=ring.fitness[[slot0, slot1]])
+    ring.place(parents[0], children[1], slot1)
+    ring.place(parents[1], children[0], slot0)
+
+
+def run_batch_tournaments(num_tournaments, t_size, num_muts,
+                          num_swaps, ring, current_mev):
+    """Run several tournaments and evaluate the children together.
+
+    Parameters
+    ----------
+    num_tournaments : int
+        How many tournaments (mating events) to run.
+    t_size, num_muts, num_swaps, ring
+        See run_tournament.
+    current_mev : int
+        The mating event number of the first tournament.
+        The children of the other tournaments get the
+        following numbers as birthdays.
+
+    Notes
+    -----
+    All of the tournaments pick their parents from the
+    ring as it is before the batch, so the results
+    differ from running the tournaments one at a time.
+    The slot of each child is chosen before the batch is
+    evaluated (see Ring.evaluate_pmems for how the ring's
+    surrogate uses it).
+    The 2*num_tournaments children are evaluated with
+    one call to ring.evaluate_pmems (so that a pool can
+    run all of their energy calculations at once). The
+    children are then placed in the ring from the fittest
+    to the least fit; a child that picks a slot already
+    taken by a fitter child from the same batch is dropped.
+
+    Returns
+    -------
+    None
+
+    """
+    # pick the parents for every tournament, then
+    # generate all of the children in one go
+    parents = np.array([select_parents(select_pmems(t_size, ring), ring)
+                        for _ in range(num_tournaments)])
+    children1, children2 = generate_children(ring.dihedrals[parents[:, 0]],
+                                             ring.dihedrals[parents[:, 1]],
+                                             num_muts, num_swaps)
+    placements = []
+    parent_pmems = []
+    for i, (parent1, parent2) in enumerate(parents.tolist()):
+        for parent, child in ((parent2, children1[i]), (parent1, children2[i])):
+            placements.append((parent, Pmem(None, ring.num_geoms, ring.num_atoms,
+                                            current_mev + i, child), ring.choose_slot(parent)))
+        parent_pmems.extend([ring[parent1], ring[parent2]])
+
+    # evaluate all of the children in one go (only the
+    # geometries that differ from the parents)
+    ring.evaluate_pmems([child for _, child, _ in placements], parent_pmems,
+                        targets=ring.fitness[[slot for _, _, slot in placements]])
+    # children rejected by the prescreen or skipped (nan
+    # fitness) are dropped
+    placements = [placement for placement in placements
+                  if not np.isnan(placement[1].fitness)]
+    placements.sort(key=lambda placement: placement[1].fitness, reverse=True)
+    for parent, child, slot in placements:
+        ring.place(parent, child, slot)
+
+
+def make_children(t_size, num_muts, num_swaps, ring):
+    """Pick parents from the ring and generate their children.
+
+    Parameters
+    ----------
+    t_size, num_muts, num_swaps, ring
+        See run_tournament.
+
+    Raises
+    ------
+    RingEmptyError
+        Not enough pmems in the ring for a tournament.
+
+    Returns
+    -------
+    parents : list(int)
+        The ring indices of the two parents.
+    children : tuple
+        The dihedrals for the two children. The
+        first child should be placed near the
+        second parent, and vice versa.
+
     """
     # check ring has enough pmems for a tournament
     if t_size > ring.num_filled:
@@ -50,10 +154,7 @@ def run_tournament(t_size, num_muts, num_swaps, ring,
 
     # generate children
     children = generate_children(parent1, parent2, num_muts, num_swaps)
-
-    # put children in ring
-    ring.update(parents[0], children[1], current_mev)
-    ring.update(parents[1], children[0], current_mev)
+    return parents, children
 
 
 def select_pmems(number, ring):
@@ -65,21 +166,15 @@ def select_pmems(number, ring):
         How many pmems to pick.
     ring : object
 
-    Note
-    ----
-    Maybe move this to the ring as a method. Or turn
-    into a generator (calling next on the ring returns
-    a random pmem).
+    Returns
+    -------
+    selection : list(int)
+        The ring indices of the chosen pmems. They
+        are drawn in one go from the ring's filled
+        slots, so no pmem is picked twice.
 
     """
-    selection = []
-    while len(selection) < number:
-        # choose random slot
-        choice = np.random.randint(0, ring.num_slots)
-        # add slot to selection if its non-empty
-        if ring[choice]:
-            selection.append(choice)
-    return selection
+    return ring.sample(number).tolist()
 
 
 def select_parents(selected_pmems, ring):
@@ -99,7 +194,7 @@ def select_parents(selected_pmems, ring):
         Indices of two best pmems to be used as parents.
 
     """
-    fit_vals = np.array([ring[i].fitness for i in selected_pmems])
+    fit_vals = ring.fitness[selected_pmems]
     print(fit_vals)
     # from here:
     # https://stackoverflow.com/questions/6910641/how-do-i-get-indices-of-n-maximum-values-in-a-numpy-array